@@ -1,4 +1,11 @@
+import pytest
+
+from moa import ast, compact, testing
+from moa.compiler import compiler
+from moa.shape import calculate_shapes
+from moa.dnf import reduce_to_dnf
 from moa.frontend import LazyArray
+from moa.stats import CompileStats
 
 
 def test_moa_compile_simple(benchmark):
@@ -8,7 +15,7 @@ def test_moa_compile_simple(benchmark):
     expression = A + B
 
     def _test():
-        expression.compile(backend='python', use_numba=True)
+        expression.compile(backend='python', use_numba=True, use_cache=False)
 
     benchmark(_test)
 
@@ -21,6 +28,76 @@ def test_moa_compile_complex(benchmark):
     expression = (A.inner('+', '*', B)).T[0] + C.reduce('+')
 
     def _test():
-        expression.compile(backend='python', use_numba=True)
+        expression.compile(backend='python', use_numba=True, use_cache=False)
 
     benchmark(_test)
+
+
+@pytest.mark.benchmark(group="compile_depth")
+@pytest.mark.parametrize('num_terms', [250, 500, 1000, 2000])
+def test_moa_compile_depth(benchmark, num_terms):
+    context = testing.chain_context(num_terms)
+
+    def _test():
+        compiler(context, use_cache=False)
+
+    benchmark.pedantic(_test, rounds=1, iterations=1)
+
+
+def _compile_stats(num_terms):
+    stats = CompileStats()
+    compiler(testing.chain_context(num_terms), use_cache=False, stats=stats)
+    return stats
+
+
+def test_moa_compile_depth_linear():
+    """Compile work and time grow linearly with the depth of the chain"""
+    small_stats = [_compile_stats(1000) for _ in range(3)]
+    large_stats = [_compile_stats(2000) for _ in range(3)]
+
+    # doubling the terms doubles the nodes and rewrites of every stage
+    for stage, small_stage_stats in small_stats[0].stages.items():
+        large_stage_stats = large_stats[0][stage]
+        if small_stage_stats.num_nodes is not None:
+            assert large_stage_stats.num_nodes <= 2.1 * small_stage_stats.num_nodes
+        assert large_stage_stats.num_rewrites <= 2.1 * small_stage_stats.num_rewrites
+
+    # best of three against timing noise, quadratic scaling has a ratio of 4
+    ratio = min(stats.wall_time for stats in large_stats) / min(stats.wall_time for stats in small_stats)
+    assert ratio < 3, f'compile time ratio {ratio:.2f} between 2000 and 1000 terms is not linear'
+
+
+@pytest.mark.benchmark(group="compact")
+@pytest.mark.parametrize('encoding', ['node', 'compact'])
+def test_moa_shape_dnf_large(benchmark, encoding):
+    """Shape and DNF passes on 10^5 nodes"""
+    context = testing.chain_context(50000)
+
+    def _test():
+        if encoding == 'compact':
+            compact.reduce_to_dnf(compact.calculate_shapes(compact.from_context(context)))
+        else:
+            reduce_to_dnf(calculate_shapes(context))
+
+    benchmark.pedantic(_test, rounds=1, iterations=1)
+
+
+def _balanced_context(num_terms):
+    """Balanced tree of (+-*/) operations over A0 ... An"""
+    operations = (ast.NodeSymbol.PLUS, ast.NodeSymbol.MINUS, ast.NodeSymbol.TIMES, ast.NodeSymbol.DIVIDE)
+    symbol_table = {f'A{i}': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3, 4), None, None) for i in range(num_terms)}
+    nodes = [ast.Node((ast.NodeSymbol.ARRAY,), None, (f'A{i}',), ()) for i in range(num_terms)]
+    while len(nodes) > 1:
+        nodes = [ast.Node((operations[i % 4],), None, (), tuple(nodes[i:i+2])) if i + 1 < len(nodes) else nodes[i] for i in range(0, len(nodes), 2)]
+    return ast.create_context(ast=nodes[0], symbol_table=symbol_table)
+
+
+@pytest.mark.benchmark(group="compile_throughput")
+@pytest.mark.parametrize('num_terms', [256, 1024])
+def test_moa_compile_throughput(benchmark, num_terms):
+    context = _balanced_context(num_terms)
+
+    def _test():
+        compiler(context, use_cache=False)
+
+    benchmark.pedantic(_test, rounds=3, iterations=1)
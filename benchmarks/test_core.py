@@ -5,6 +5,12 @@ import torch
 import tensorflow
 
 from moa.frontend import LazyArray
+from moa.backend import NumbaOptions, LLVMOptions, load_c_function, load_llvm_function
+from moa.backend.c import DEFAULT_CFLAGS
+from moa.backend.llvm import LLVMFunction
+from moa.backend.python import generate_python_source, generate_python_function
+from moa.optimize import optimize
+from moa.compiler import compile_function
 
 
 @pytest.mark.benchmark(group="addition", warmup=True)
@@ -202,14 +208,15 @@ def test_tensorflow_double_addition(benchmark):
 
 
 @pytest.mark.benchmark(group="outer_product", warmup=True)
-def test_moa_numba_outer_product(benchmark):
+@pytest.mark.parametrize('optimize', [True, False])
+def test_moa_numba_outer_product(benchmark, optimize):
     n = 100
     m = 100
 
     expression = LazyArray(name='A', shape=('n', 'm')).outer('*', LazyArray(name='B', shape=('n', 'm')))
 
     local_dict = {}
-    exec(expression.compile(backend='python', use_numba=True), globals(), local_dict)
+    exec(expression.compile(backend='python', use_numba=True, optimize=optimize), globals(), local_dict)
 
     A = numpy.random.random((n, m))
     B = numpy.random.random((n, m))
@@ -291,7 +298,8 @@ def test_tensorflow_reduce(benchmark):
 
 
 @pytest.mark.benchmark(group="inner_product", warmup=True)
-def test_moa_numba_inner_product(benchmark):
+@pytest.mark.parametrize('optimize', [True, False])
+def test_moa_numba_inner_product(benchmark, optimize):
     n = 1000
     m = 1000
 
@@ -300,7 +308,7 @@ def test_moa_numba_inner_product(benchmark):
     expression = _A.inner('+', '*', _B)
 
     local_dict = {}
-    exec(expression.compile(backend='python', use_numba=True), globals(), local_dict)
+    exec(expression.compile(backend='python', use_numba=True, optimize=optimize), globals(), local_dict)
 
     A = numpy.random.random((n, m))
     B = numpy.random.random((n, m))
@@ -353,3 +361,331 @@ def test_tensorflow_inner_product(benchmark):
         session.run(result)
 
     benchmark(_test)
+
+
+def _multiple_reduction_expression():
+    # (B + +red A) + *red (A + A)
+    _A = LazyArray(name='A', shape=('n', 'm'))
+    _B = LazyArray(name='B', shape=('m',))
+    return (_B + LazyArray(name='A', shape=('n', 'm')).reduce('+')) + (_A + LazyArray(name='A', shape=('n', 'm'))).reduce('*')
+
+
+@pytest.mark.benchmark(group="multiple_reduction", warmup=True)
+@pytest.mark.parametrize('optimize', [True, False])
+def test_moa_numba_multiple_reduction(benchmark, optimize):
+    n = 1000
+    m = 1000
+
+    expression = _multiple_reduction_expression()
+
+    local_dict = {}
+    exec(expression.compile(backend='python', use_numba=True, optimize=optimize), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((m,))
+
+    benchmark(local_dict['f'], A, B)
+
+
+@pytest.mark.benchmark(group="multiple_reduction")
+def test_numpy_multiple_reduction(benchmark):
+    n = 1000
+    m = 1000
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((m,))
+
+    def _test():
+        (B + A.sum(axis=0)) + (A + A).prod(axis=0)
+
+    benchmark(_test)
+
+
+@pytest.mark.benchmark(group="loop_interchange", warmup=True)
+@pytest.mark.parametrize('optimize', [True, False])
+def test_moa_numba_loop_interchange_reduce(benchmark, optimize):
+    n = 1000
+    m = 1000
+
+    expression = LazyArray(name='A', shape=('n', 'm')).reduce('+')
+
+    local_dict = {}
+    exec(expression.compile(backend='python', use_numba=True, optimize=optimize), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+
+    benchmark(local_dict['f'], A)
+
+
+@pytest.mark.benchmark(group="loop_interchange", warmup=True)
+@pytest.mark.parametrize('optimize', [True, False])
+def test_moa_numba_loop_interchange_inner_product(benchmark, optimize):
+    n = 1000
+    m = 1000
+
+    _A = LazyArray(name='A', shape=('n', 'm'))
+    _B = LazyArray(name='B', shape=('m', 'k'))
+    expression = _A.inner('+', '*', _B)
+
+    local_dict = {}
+    exec(expression.compile(backend='python', use_numba=True, optimize=optimize), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((n, m))
+
+    benchmark(local_dict['f'], A, B)
+
+
+@pytest.mark.benchmark(group="addition")
+def test_moa_numpy_addition(benchmark):
+    n = 1000
+    m = 1000
+
+    expression = LazyArray(name='A', shape=('n', 'm')) + LazyArray(name='B', shape=('n', 'm'))
+
+    local_dict = {}
+    exec(expression.compile(backend='numpy'), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((n, m))
+
+    benchmark(local_dict['f'], A, B)
+
+
+@pytest.mark.benchmark(group="reduce")
+def test_moa_numpy_reduce(benchmark):
+    n = 1000
+    m = 1000
+
+    expression = LazyArray(name='A', shape=('n', 'm')).reduce('+')
+
+    local_dict = {}
+    exec(expression.compile(backend='numpy'), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+
+    benchmark(local_dict['f'], A)
+
+
+@pytest.mark.benchmark(group="inner_product")
+def test_moa_numpy_inner_product(benchmark):
+    n = 1000
+    m = 1000
+
+    _A = LazyArray(name='A', shape=('n', 'm'))
+    _B = LazyArray(name='B', shape=('m', 'k'))
+    expression = _A.inner('+', '*', _B)
+
+    local_dict = {}
+    exec(expression.compile(backend='numpy'), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((n, m))
+
+    benchmark(local_dict['f'], A, B)
+
+
+@pytest.mark.benchmark(group="reduce", warmup=True)
+@pytest.mark.parametrize('fastmath', [True, False])
+def test_moa_numba_backend_reduce(benchmark, fastmath):
+    n = 1000
+    m = 1000
+
+    expression = LazyArray(name='A', shape=('n', 'm')).reduce('+')
+
+    local_dict = {}
+    exec(expression.compile(backend='numba', numba_options=NumbaOptions(fastmath=fastmath)), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+
+    benchmark(local_dict['f'], A)
+
+
+@pytest.mark.benchmark(group="inner_product", warmup=True)
+@pytest.mark.parametrize('dtype', ['float32', 'float64'])
+def test_moa_numba_backend_inner_product(benchmark, dtype):
+    n = 1000
+    m = 1000
+
+    _A = LazyArray(name='A', shape=('n', 'm'))
+    _B = LazyArray(name='B', shape=('m', 'k'))
+    expression = _A.inner('+', '*', _B)
+
+    local_dict = {}
+    exec(expression.compile(backend='numba', numba_options=NumbaOptions(fastmath=True, nogil=True)), globals(), local_dict)
+
+    A = numpy.random.random((n, m)).astype(dtype)
+    B = numpy.random.random((n, m)).astype(dtype)
+
+    benchmark(local_dict['f'], A, B)
+
+
+@pytest.mark.benchmark(group="addition", warmup=True)
+@pytest.mark.parametrize('parallel', [True, False])
+def test_moa_numba_backend_addition(benchmark, parallel):
+    n = 1000
+    m = 1000
+
+    expression = LazyArray(name='A', shape=('n', 'm')) + LazyArray(name='B', shape=('n', 'm'))
+
+    local_dict = {}
+    exec(expression.compile(backend='numba', numba_options=NumbaOptions(parallel=parallel)), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((n, m))
+
+    benchmark(local_dict['f'], A, B)
+
+
+@pytest.mark.benchmark(group="outer_product", warmup=True)
+@pytest.mark.parametrize('parallel', [True, False])
+def test_moa_numba_backend_outer_product(benchmark, parallel):
+    n = 100
+    m = 100
+
+    expression = LazyArray(name='A', shape=('n', 'm')).outer('*', LazyArray(name='B', shape=('n', 'm')))
+
+    local_dict = {}
+    exec(expression.compile(backend='numba', numba_options=NumbaOptions(parallel=parallel)), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((n, m))
+
+    benchmark(local_dict['f'], A, B)
+
+
+@pytest.mark.benchmark(group="inner_product", warmup=True)
+@pytest.mark.parametrize('parallel', [True, False])
+def test_moa_numba_backend_parallel_inner_product(benchmark, parallel):
+    n = 1000
+    m = 1000
+
+    _A = LazyArray(name='A', shape=('n', 'm'))
+    _B = LazyArray(name='B', shape=('m', 'k'))
+    expression = _A.inner('+', '*', _B)
+
+    local_dict = {}
+    exec(expression.compile(backend='numba', numba_options=NumbaOptions(fastmath=True, parallel=parallel)), globals(), local_dict)
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((n, m))
+
+    benchmark(local_dict['f'], A, B)
+
+
+@pytest.mark.benchmark(group="inner_product", warmup=True)
+@pytest.mark.parametrize('cflags', [DEFAULT_CFLAGS, DEFAULT_CFLAGS + ('-march=native',)])
+def test_moa_c_backend_inner_product(benchmark, cflags):
+    n = 1000
+    m = 1000
+
+    _A = LazyArray(name='A', shape=('n', 'm'))
+    _B = LazyArray(name='B', shape=('m', 'k'))
+    expression = _A.inner('+', '*', _B)
+
+    function = load_c_function(expression.compile(backend='c'), cflags=cflags)
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((n, m))
+
+    benchmark(function, A, B)
+
+
+@pytest.mark.benchmark(group="reduce", warmup=True)
+def test_moa_c_backend_reduce(benchmark):
+    n = 1000
+    m = 1000
+
+    expression = LazyArray(name='A', shape=('n', 'm')).reduce('+')
+
+    function = load_c_function(expression.compile(backend='c'))
+
+    A = numpy.random.random((n, m))
+
+    benchmark(function, A)
+
+
+@pytest.mark.benchmark(group="inner_product", warmup=True)
+@pytest.mark.parametrize('fastmath', [True, False])
+def test_moa_llvm_backend_inner_product(benchmark, fastmath):
+    n = 1000
+    m = 1000
+
+    _A = LazyArray(name='A', shape=('n', 'm'))
+    _B = LazyArray(name='B', shape=('m', 'k'))
+    expression = _A.inner('+', '*', _B)
+
+    options = LLVMOptions(fastmath=fastmath)
+    function = load_llvm_function(expression.compile(backend='llvm', llvm_options=options), options)
+
+    A = numpy.random.random((n, m))
+    B = numpy.random.random((n, m))
+
+    benchmark(function, A, B)
+
+
+@pytest.mark.benchmark(group="compile_latency")
+@pytest.mark.parametrize('backend', ['llvm', 'numba'])
+def test_moa_compile_latency(benchmark, backend):
+    A = numpy.random.random((10, 10))
+    B = numpy.random.random((10, 10))
+
+    def _compile_and_run():
+        expression = LazyArray(name='A', shape=('n', 'm')).inner('+', '*', LazyArray(name='B', shape=('m', 'k')))
+        if backend == 'llvm':
+            # bypass the in memory cache of jit compiled kernels
+            LLVMFunction(expression.compile(backend='llvm', use_cache=False))(A, B)
+        else:
+            local_dict = {}
+            exec(expression.compile(backend='python', use_numba=True, use_cache=False), globals(), local_dict)
+            local_dict['f'](A, B)
+
+    benchmark.pedantic(_compile_and_run, rounds=3)
+
+
+@pytest.mark.benchmark(group="python_codegen")
+@pytest.mark.parametrize('method', ['source', 'ast'])
+def test_moa_python_codegen(benchmark, method):
+    expression = LazyArray(name='A', shape=('n', 'm')).inner('+', '*', LazyArray(name='B', shape=('m', 'k')))
+    context = optimize(expression._onf())
+
+    def _source():
+        local_dict = {}
+        exec(generate_python_source(context, materialize_scalars=True, use_numpy=True), globals(), local_dict)
+        return local_dict['f']
+
+    def _ast():
+        return generate_python_function(context, use_numpy=True)
+
+    benchmark(_source if method == 'source' else _ast)
+
+
+@pytest.mark.benchmark(group="evaluate", warmup=True)
+@pytest.mark.parametrize('backend', ['numba', 'llvm'])
+def test_moa_evaluate(benchmark, backend):
+    expression = LazyArray(name='A', shape=('n', 'm')) + LazyArray(name='B', shape=('n', 'm'))
+    arrays = {'A': numpy.random.random((10, 10)), 'B': numpy.random.random((10, 10))}
+
+    # compiled on first evaluation, afterwards only the kernel runs
+    benchmark(expression.evaluate, arrays, backend=backend)
+
+
+@pytest.mark.benchmark(group="specialize", warmup=True)
+@pytest.mark.parametrize('specialize', [True, False])
+def test_moa_evaluate_specialize(benchmark, specialize):
+    expression = LazyArray(name='A', shape=('n', 'm')).inner('+', '*', LazyArray(name='B', shape=('m', 'k')))
+    arrays = {'A': numpy.random.random((4, 4)), 'B': numpy.random.random((4, 4))}
+
+    benchmark(expression.evaluate, arrays, backend='llvm', specialize=specialize)
+
+
+@pytest.mark.benchmark(group="python_optimize")
+@pytest.mark.parametrize('optimize', [True, False])
+def test_moa_python_backend_optimize(benchmark, optimize):
+    expression = LazyArray(name='A', shape=('n', 'm')).inner('+', '*', LazyArray(name='B', shape=('m', 'k')))
+    function = compile_function(expression.context, optimize=optimize)
+
+    A = numpy.random.random((60, 60))
+    B = numpy.random.random((60, 60))
+
+    benchmark(function, A, B)
@@ -1,9 +1,12 @@
+import contextlib
 import enum
 import collections
-import copy
+import functools
 import itertools
+import threading
 
 from .exception import MOAException
+from .persistent import PersistentMapping
 
 
 NodeSymbol = enum.Enum('NodeSymbol', [
@@ -25,12 +28,147 @@ NodeSymbol = enum.Enum('NodeSymbol', [
     'LESSTHAN', 'LESSTHANEQUAL',
     'GREATERTHAN', 'GREATERTHANEQUAL',
     'AND', 'OR',
+    # loop attributes
+    'PARALLEL',
 ])
 
 
-Node = collections.namedtuple(
+_NodeBase = collections.namedtuple(
     'Node', ['symbol', 'shape', 'attrib', 'child'])
 
+
+class InternScope:
+    """Hash-consing table of the nodes constructed within ``intern_scope``
+
+    nodes: dict
+      hash -> interned node
+    hashes: dict
+      id(node) -> cached hash of nodes kept alive by the scope
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.hashes = {}
+        self._alive = []
+
+    def cache_hash(self, node, node_hash):
+        if id(node) not in self.hashes:
+            self._alive.append(node)
+            self.hashes[id(node)] = node_hash
+
+
+_local = threading.local()
+
+
+def current_intern_scope():
+    return getattr(_local, 'scope', None)
+
+
+@contextlib.contextmanager
+def intern_scope(enabled=True):
+    """Intern nodes constructed within the context
+
+    Nested scopes share the outermost scope so that nodes are interned
+    for a whole compilation and released when it completes. With
+    ``enabled=False`` nodes are not interned within the context e.g.
+    for short lived nodes that would only fill the table.
+    """
+    previous_scope = current_intern_scope()
+    if enabled and previous_scope is not None:
+        yield previous_scope
+        return
+
+    _local.scope = InternScope() if enabled else None
+    try:
+        yield _local.scope
+    finally:
+        _local.scope = previous_scope
+
+
+def interned(function):
+    """Decorator running function within ``intern_scope``"""
+    @functools.wraps(function)
+    def _function(*args, **kwargs):
+        with intern_scope():
+            return function(*args, **kwargs)
+    return _function
+
+
+def _is_structural(node):
+    """Node hashed by its structure (subclasses may define their own hash)"""
+    return type(node).__hash__ is Node.__hash__
+
+
+def _structural_hash(node, scope=None):
+    """Hash of node combining the hashes of its children without recursion"""
+    hashes = {} if scope is None else scope.hashes
+    stack = [(node, False)]
+    while stack:
+        _node, expanded = stack.pop()
+        if id(_node) in hashes:
+            continue
+        elif not expanded:
+            stack.append((_node, True))
+            stack.extend((child_node, False) for child_node in _node.child if _is_structural(child_node))
+            continue
+
+        node_hash = hash((_node.symbol, _node.shape, _node.attrib, tuple(
+            hashes[id(child_node)] if _is_structural(child_node) else hash(child_node) for child_node in _node.child)))
+        if scope is None:
+            hashes[id(_node)] = node_hash
+        else:
+            scope.cache_hash(_node, node_hash)
+    return hashes[id(node)]
+
+
+class Node(_NodeBase):
+    """MOA ast node
+
+    Nodes constructed within an ``intern_scope`` are hash-consed:
+    constructing a node structurally identical to an existing node
+    returns the existing object. The scope caches the hash of each
+    node which only depends on the cached hashes of its children.
+    Thus hashing is O(1) and equality of interned nodes is an
+    identity check. The compiler passes run within a scope which is
+    released when compilation completes. Outside of a scope the hash
+    is computed by an iterative walk over the tree.
+
+    Nodes with unhashable elements (e.g. python ast lists in the
+    backend) are not interned and fall back to tuple semantics.
+    """
+    __slots__ = ()
+
+    def __new__(cls, symbol, shape, attrib, child):
+        scope = getattr(_local, 'scope', None)
+        if scope is None:
+            return _NodeBase.__new__(cls, symbol, shape, attrib, child)
+
+        try:
+            node_hash = hash((symbol, shape, attrib, tuple(hash(child_node) for child_node in child)))
+        except TypeError:
+            return _NodeBase.__new__(cls, symbol, shape, attrib, child)
+
+        node = scope.nodes.get(node_hash)
+        if node is not None and tuple.__eq__(node, (symbol, shape, attrib, child)):
+            return node
+
+        node = _NodeBase.__new__(cls, symbol, shape, attrib, child)
+        if node_hash not in scope.nodes: # keep first node on hash collision
+            scope.nodes[node_hash] = node
+            scope.cache_hash(node, node_hash)
+        return node
+
+    def __hash__(self):
+        scope = getattr(_local, 'scope', None)
+        if scope is not None:
+            node_hash = scope.hashes.get(id(self))
+            if node_hash is not None:
+                return node_hash
+        return _structural_hash(self, scope)
+
+    def __reduce__(self):
+        return (self.__class__, tuple(self))
+
+
 SymbolNode = collections.namedtuple(
     'SymbolNode', ['symbol', 'shape', 'type', 'value'])
 
@@ -178,10 +316,10 @@ def add_symbol(context, name, symbol, shape, type, value):
         raise MOAException(f'attempted to add to symbol table different symbol with same name "{name}" {symbol_table[name]} != {SymbolNode(symbol, shape, type, value)}')
 
     # idempotency makes debugging way easier dict(str: tuple)
-    # deep copy not necessary
-    symbol_table_copy = copy.copy(symbol_table)
-    symbol_table_copy[name] = SymbolNode(symbol, shape, type, value)
-    return Context(ast=context.ast, symbol_table=symbol_table_copy)
+    # persistent mapping shares structure with previous symbol table
+    if not isinstance(symbol_table, PersistentMapping):
+        symbol_table = PersistentMapping(symbol_table)
+    return Context(ast=context.ast, symbol_table=symbol_table.set(name, SymbolNode(symbol, shape, type, value)))
 
 
 def select_array_node_symbol(context, selection=()):
@@ -264,48 +402,48 @@ def rename_symbol_table_symbols(symbol_table, symbol_mapping):
 
 # joining symbolic tables
 def join_symbol_tables(left_context, right_context):
-    """Join two symbol tables together which requires rewriting both trees
-
-    TODO: This function is ugly and could be simplified/broken into parts. It is needed by the array frontend.
+    """Join two symbol tables together which requires rewriting the right tree
 
+    Generated symbols (``_a`` arrays and ``_i`` indicies) referenced
+    by the right context are renamed to names unused by the left
+    context. The left tree and symbol table are kept as is so joining
+    costs the size of the right context and building an expression by
+    repeated joins (e.g. ``A0 + A1 + ...``) is linear in its size.
     """
-    counter = itertools.count()
-
-    def _symbol_mapping(symbols):
-        symbol_mapping = {}
-        for symbol in symbols:
-            if symbol.startswith('_i'):
-                symbol_mapping[symbol] = f'_i{next(counter)}'
-            elif symbol.startswith('_a'):
-                symbol_mapping[symbol] = f'_a{next(counter)}'
-            else:
-                symbol_mapping[symbol] = symbol
-        return symbol_mapping
+    left_symbol_table = left_context.symbol_table
+    if not isinstance(left_symbol_table, PersistentMapping):
+        left_symbol_table = PersistentMapping(left_symbol_table)
+    counter = itertools.count(len(left_symbol_table))
 
-    # discover used symbols and create symbol mapping
-    visited_symbols = referenced_node_symbols(left_context)
-    left_symbol_mapping = _symbol_mapping(visited_symbols)
+    def _unique_symbol(prefix):
+        symbol = f'{prefix}{next(counter)}'
+        while symbol in left_symbol_table:
+            symbol = f'{prefix}{next(counter)}'
+        return symbol
 
-    visited_symbols = referenced_node_symbols(right_context)
-    right_symbol_mapping = _symbol_mapping(visited_symbols)
+    # discover used symbols and create symbol mapping
+    right_symbol_mapping = {}
+    for symbol in referenced_node_symbols(right_context):
+        if symbol.startswith('_i') or symbol.startswith('_a'):
+            right_symbol_mapping[symbol] = _unique_symbol(symbol[:2])
+        else:
+            right_symbol_mapping[symbol] = symbol
 
     # check that user defined symbols match in both tables
-    for symbol in (left_symbol_mapping.keys() & right_symbol_mapping.keys()):
-        if not symbol.startswith('_') and left_context.symbol_table[symbol] != right_context.symbol_table[symbol]:
-            raise ValueError(f'user defined symbols must match "{symbol}" {left_context.symbol_table[symbol]} != {right_context.symbol_table[symbol]}')
+    for symbol in right_symbol_mapping:
+        if not symbol.startswith('_') and symbol in left_symbol_table and left_symbol_table[symbol] != right_context.symbol_table[symbol]:
+            raise ValueError(f'user defined symbols must match "{symbol}" {left_symbol_table[symbol]} != {right_context.symbol_table[symbol]}')
 
     # rename symbols in tree
-    new_left_context = create_context(
-        ast=rename_node_symbols(left_context, left_symbol_mapping),
-        symbol_table=rename_symbol_table_symbols(left_context.symbol_table, left_symbol_mapping))
-
     new_right_context = create_context(
         ast=rename_node_symbols(right_context, right_symbol_mapping),
         symbol_table=rename_symbol_table_symbols(right_context.symbol_table, right_symbol_mapping))
 
-    new_symbol_table = {**new_left_context.symbol_table, **new_right_context.symbol_table}
+    new_symbol_table = left_symbol_table
+    for symbol, symbol_node in new_right_context.symbol_table.items():
+        new_symbol_table = new_symbol_table.set(symbol, symbol_node)
 
-    return new_symbol_table, new_left_context, new_right_context
+    return new_symbol_table, left_context, new_right_context
 
 
 # tuple methods
@@ -321,28 +459,150 @@ def is_symbolic_element(element):
     return isinstance(element, tuple)
 
 
+def iterate_nodes(nodes):
+    """Every node within nodes (shared subtrees once per occurrence)"""
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(child_node for child_node in node.child if isinstance(child_node, Node))
+
+
 ## replacement methods
 class MOAReplacementError(MOAException):
     pass
 
 
-def node_traversal(context, replacement_function, traversal, max_iterations=range(100)):
+def node_traversal(context, replacement_function, traversal, max_iterations=range(100), callback=None):
+    """Apply replacement_function to every node in ast
+
+    Each node is rebuilt at most once per traversal and only when one
+    of its children was replaced. Unchanged subtrees are returned as
+    is. The symbol table is threaded through the traversal in
+    order. An explicit stack is used so that the depth of the ast is
+    not limited by the python recursion limit.
+
+    traversal: str
+      "preorder" repeatedly applies replacement_function to node
+      until it returns None before visiting children. "postorder"
+      applies replacement_function once after visiting children.
+    callback: callable
+      called as callback(context, replacement_context) for every
+      node that replacement_function replaced. Used to collect
+      statistics (see ``moa.stats``).
+    """
     if traversal == 'preorder':
-        for iteration in max_iterations:
+        context = _replace_until_fixpoint(context, replacement_function, max_iterations, callback)
+
+    symbol_table = context.symbol_table
+    # stack of (node, replaced children of node)
+    stack = [(context.ast, [])]
+    while True:
+        node, children = stack[-1]
+        if len(children) < len(node.child):
+            child_context = Context(ast=node.child[len(children)], symbol_table=symbol_table)
+            if traversal == 'preorder':
+                child_context = _replace_until_fixpoint(child_context, replacement_function, max_iterations, callback)
+            symbol_table = child_context.symbol_table
+            stack.append((child_context.ast, []))
+            continue
+
+        stack.pop()
+        if any(child_node is not replacement_child_node for child_node, replacement_child_node in zip(node.child, children)):
+            node = Node(symbol=node.symbol, shape=node.shape, attrib=node.attrib, child=tuple(children))
+        context = Context(ast=node, symbol_table=symbol_table)
+
+        if traversal == 'postorder':
             replacement_context = replacement_function(context)
-            if replacement_context is None:
-                break
+            if callback is not None and replacement_context.ast is not context.ast:
+                callback(context, replacement_context)
             context = replacement_context
-        else:
-            raise MOAReplacementError(f'reduction failed to complete in max_iterations')
-
-    for index in range(num_node_children(context)):
-        child_context = select_node(context, (index,))
-        replacement_child_context = node_traversal(child_context, replacement_function, traversal, max_iterations)
-        context = replace_node(context, replacement_child_context.ast, (index,))
-        context = Context(ast=context.ast, symbol_table=replacement_child_context.symbol_table)
+            symbol_table = context.symbol_table
+
+        if not stack:
+            return context
+        stack[-1][1].append(context.ast)
+
+
+def _replace_until_fixpoint(context, replacement_function, max_iterations, callback=None):
+    for iteration in max_iterations:
+        replacement_context = replacement_function(context)
+        if replacement_context is None:
+            return context
+        if callback is not None:
+            callback(context, replacement_context)
+        context = replacement_context
+    raise MOAReplacementError(f'reduction failed to complete in max_iterations')
+
+
+def rewrite_to_fixpoint(context, replacement_function, max_rewrites=None, callback=None):
+    """Rewrite ast until replacement_function does not apply to any node
+
+    replacement_function returns a replacement context or None when
+    it does not apply. Rewrites are applied top down. Whenever a child
+    is rewritten its parent is rebuilt and rewritten again since the
+    new child may enable rules at the parent, and rewritten subtrees
+    are traversed again. Subtrees that already reached the fixpoint
+    are recorded by identity and skipped when they reappear within a
+    rewritten subtree (interning makes identical subtrees the same
+    object). Thus every node is traversed once and the remaining work
+    is proportional to the size of the nodes created by rewrites.
+
+    max_rewrites: int
+      maximum total number of rewrites. None for unlimited
+    callback: callable
+      called as callback(context, replacement_context) for every rewrite
+
+    Returns the rewritten context and the number of rewrites.
+    """
+    num_rewrites = 0
+    symbol_table = context.symbol_table
 
-    if traversal == 'postorder':
-        return replacement_function(context)
+    def _rewrite(node):
+        nonlocal num_rewrites, symbol_table
+        while True:
+            node_context = Context(ast=node, symbol_table=symbol_table)
+            replacement_context = replacement_function(node_context)
+            if replacement_context is None:
+                return node
+
+            num_rewrites += 1
+            if max_rewrites is not None and num_rewrites > max_rewrites:
+                raise MOAReplacementError(f'rewriting did not reach fixpoint within {max_rewrites} rewrites')
+            if callback is not None:
+                callback(node_context, replacement_context)
+            node, symbol_table = replacement_context.ast, replacement_context.symbol_table
+
+    # id -> node of subtrees at the fixpoint. The nodes are kept alive
+    # so that their ids are not reused
+    normalized = {}
+
+    # stack of (node, rewritten children of node)
+    stack = [(_rewrite(context.ast), [])]
+    while True:
+        node, children = stack[-1]
+        if len(children) < len(node.child):
+            child_node = node.child[len(children)]
+            if id(child_node) not in normalized:
+                child_node = _rewrite(child_node)
+            if id(child_node) in normalized:
+                children.append(child_node)
+            else:
+                stack.append((child_node, []))
+            continue
+
+        stack.pop()
+        if any(child_node is not replacement_child_node for child_node, replacement_child_node in zip(node.child, children)):
+            node = Node(symbol=node.symbol, shape=node.shape, attrib=node.attrib, child=tuple(children))
+            replacement_node = _rewrite(node)
+            if replacement_node is not node:
+                if id(replacement_node) in normalized:
+                    node = replacement_node
+                else:
+                    stack.append((replacement_node, []))
+                    continue
+        normalized[id(node)] = node
 
-    return context
+        if not stack:
+            return Context(ast=node, symbol_table=symbol_table), num_rewrites
+        stack[-1][1].append(node)
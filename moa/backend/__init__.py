@@ -1 +1,5 @@
-from .python import generate_python_source
+from .python import generate_python_source, generate_python_function
+from .numpy import generate_numpy_source
+from .numba import generate_numba_source, NumbaOptions
+from .c import generate_c_source, load_c_function
+from .llvm import generate_llvm_ir, load_llvm_function, LLVMOptions
@@ -0,0 +1,567 @@
+"""C backend
+
+Lowers the ONF of an expression to a C translation unit compiled with
+the host C compiler (``cc`` or environment variable ``CC``) into a
+shared object. Shared objects are cached on disk by a digest of the
+source and compiler command and loaded with ``ctypes``.
+
+Arrays are passed as ``double`` buffers with their shape and byte
+strides so that NumPy arrays and any other object supporting the
+buffer protocol are used without copying. The translation unit
+exports
+
+ - ``const char *f(const moa_array *A, ..., double *result)``
+ - ``const char *f_shape(const moa_array *A, ..., moa_index *shape)``
+ - ``f_arguments`` space separated argument names and ``f_ndim`` the
+   dimension of the result
+
+both functions return ``NULL`` or the message of a failed argument
+check.
+"""
+import contextlib
+import ctypes
+import hashlib
+import math
+import numbers
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+
+from ..ast import NodeSymbol, has_symbolic_elements, is_symbolic_element, iterate_nodes
+from ..cache import LRUCache, default_cache_dir, secure_directory, check_owner
+from ..exception import MOAException
+from .. import __version__
+from .python import split_prologue, index_arguments
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class MOACompileError(MOAException):
+    """Generated source failed to compile"""
+
+
+DEFAULT_CFLAGS = ('-std=c99', '-O3', '-shared', '-fPIC')
+
+_PREAMBLE = '''#include <stddef.h>
+#include <stdlib.h>
+#include <math.h>
+
+typedef ptrdiff_t moa_index;
+
+typedef struct {
+    double *data;
+    int ndim;
+    const moa_index *shape;
+    const moa_index *strides; /* bytes */
+} moa_array;
+'''
+
+_BINARY_OPERATOR_MAP = {
+    (NodeSymbol.PLUS,): '+',
+    (NodeSymbol.MINUS,): '-',
+    (NodeSymbol.TIMES,): '*',
+    (NodeSymbol.DIVIDE,): '/',
+    (NodeSymbol.EQUAL,): '==',
+    (NodeSymbol.NOTEQUAL,): '!=',
+    (NodeSymbol.LESSTHAN,): '<',
+    (NodeSymbol.LESSTHANEQUAL,): '<=',
+    (NodeSymbol.GREATERTHAN,): '>',
+    (NodeSymbol.GREATERTHANEQUAL,): '>=',
+    (NodeSymbol.AND,): '&&',
+    (NodeSymbol.OR,): '||',
+}
+
+
+def generate_c_source(context):
+    """Generate C source of ONF context
+
+    context: Context
+      ONF context of expression
+    """
+    function_node = context.ast
+    argument_names, result_name = function_node.attrib
+    statements = function_node.child[0].child
+
+    arrays = {name: 'argument' for name in argument_names}
+    arrays[result_name] = 'result'
+    for node in iterate_nodes((function_node,)):
+        if node.symbol == (NodeSymbol.INITIALIZE,) and node.attrib[0] not in arrays and node.shape != ():
+            arrays[node.attrib[0]] = 'temporary'
+    generator = _CGenerator(context, arrays)
+
+    prologue_statements, body_statements = split_prologue(statements)
+    prologue = [line for statement in prologue_statements for line in generator.statement(statement)]
+    body = [line for statement in body_statements for line in generator.statement(statement)]
+    contiguous_strides = [strides[-1] for name, strides in generator.strides.items() if arrays[name] == 'argument' and strides]
+    if contiguous_strides:
+        # unit stride innermost dimensions allow the C compiler to vectorize
+        with generator.unit_strides():
+            contiguous_body = [line for statement in body_statements for line in generator.statement(statement)]
+        condition = ' && '.join(f'{stride} == 1' for stride in contiguous_strides)
+        body = [f'if ({condition}) {{'] + _indent(contiguous_body) + ['} else {'] + _indent(body) + ['}']
+
+    array_parameters = ', '.join(f'const moa_array *{name}' for name in argument_names)
+    result_shape = context.symbol_table[result_name].shape
+    result_shape_statements = [f'shape[{i}] = {generator.element(element)};' for i, element in enumerate(result_shape)]
+
+    lines = [_PREAMBLE]
+    lines.append(f'const char *f_arguments = "{" ".join(argument_names)}";')
+    lines.append(f'const char *f_indicies = "{" ".join(index_arguments(context))}";')
+    lines.append(f'const int f_ndim = {len(result_shape)};')
+    lines.append('')
+    lines.append(f'const char *f_shape({array_parameters}{", " if argument_names else ""}moa_index *shape) {{')
+    lines.extend(_indent(generator.declarations(include_arrays=False)))
+    lines.extend(_indent(prologue + result_shape_statements))
+    lines.extend(['cleanup:', '    return error;', '}', ''])
+    lines.append(f'const char *f({array_parameters}{", " if argument_names else ""}double *restrict {result_name}_data) {{')
+    lines.extend(_indent(generator.declarations(include_arrays=True)))
+    lines.extend(_indent(prologue + generator.argument_statements() + body))
+    lines.append('cleanup:')
+    lines.extend(_indent([f'free({name}_data);' for name, kind in arrays.items() if kind == 'temporary'] + ['return error;']))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def _indent(lines, level=1):
+    return ['    ' * level + line for line in lines]
+
+
+def _literal(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NAN'
+        elif math.isinf(value):
+            return 'INFINITY' if value > 0 else '(-INFINITY)'
+        return repr(value)
+    return str(int(value))
+
+
+def _string(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class _CGenerator:
+    def __init__(self, context, arrays):
+        self.context = context
+        self.arrays = arrays
+        self.scalar_types = _scalar_types(context, arrays)
+        self.strides = {}
+        for name, kind in arrays.items():
+            ndim = len(context.symbol_table[name].shape)
+            if kind == 'argument':
+                self.strides[name] = [f'{name}_stride_{i}' for i in range(ndim)]
+            else: # allocated row major
+                self.strides[name] = [f'{name}_stride_{i}' for i in range(ndim - 1)] + ['1'] * (ndim > 0)
+
+    @contextlib.contextmanager
+    def unit_strides(self):
+        """Assume innermost dimension of arguments is contiguous"""
+        strides = self.strides
+        self.strides = {name: _strides[:-1] + ['1'] * bool(_strides) if self.arrays[name] == 'argument' else _strides
+                        for name, _strides in strides.items()}
+        try:
+            yield
+        finally:
+            self.strides = strides
+
+    # declarations
+    def declarations(self, include_arrays):
+        lines = ['const char *error = NULL;']
+        for name, scalar_type in sorted(self.scalar_types.items()):
+            lines.append(f'{scalar_type} {name} = 0;')
+        if not include_arrays:
+            return lines
+
+        for name, kind in self.arrays.items():
+            if kind == 'argument':
+                lines.append(f'const double *restrict {name}_data;')
+            elif kind == 'temporary':
+                lines.append(f'double *restrict {name}_data = NULL;')
+            for stride in self.strides[name]:
+                if stride != '1':
+                    lines.append(f'moa_index {stride};')
+        return lines
+
+    def argument_statements(self):
+        """Load data pointer and element strides of arguments after argument checks"""
+        lines = []
+        for name, kind in self.arrays.items():
+            if kind == 'argument':
+                lines.append(f'{name}_data = {name}->data;')
+                lines.extend(f'{stride} = {name}->strides[{i}] / (moa_index)sizeof(double);' for i, stride in enumerate(self.strides[name]))
+        return lines
+
+    # statements
+    def statement(self, node):
+        symbol = node.symbol
+        if symbol == (NodeSymbol.BLOCK,):
+            return [line for child_node in node.child for line in self.statement(child_node)]
+        elif symbol == (NodeSymbol.CONDITION,):
+            return [f'if ({self.expression(node.child[0])}) {{'] + _indent(self.statement(node.child[1])) + ['}']
+        elif symbol == (NodeSymbol.ERROR,):
+            return [f'error = {_string(node.attrib[0])};', 'goto cleanup;']
+        elif symbol == (NodeSymbol.ASSIGN,):
+            return [f'{self.expression(node.child[0])} = {self.expression(node.child[1])};']
+        elif symbol[0] == NodeSymbol.LOOP:
+            index_name = node.attrib[0]
+            start, stop, step = (self.element(element) for element in self.context.symbol_table[index_name].value)
+            return [f'for ({index_name} = {start}; {index_name} < {stop}; {index_name} += {step}) {{'] + \
+                _indent(self.statement(node.child[0])) + ['}']
+        elif symbol == (NodeSymbol.INITIALIZE,):
+            return self._initialize(node)
+        raise MOAException(f'C backend does not support statement {symbol}')
+
+    def _initialize(self, node):
+        name = node.attrib[0]
+        kind = self.arrays.get(name)
+        if kind is None: # scalar
+            return [f'{name} = 0;']
+
+        shape = [self.element(element) for element in node.shape]
+        strides = self.strides[name]
+        lines = []
+        for i in reversed(range(len(shape) - 1)):
+            stride = shape[i + 1] if strides[i + 1] == '1' else f'{strides[i + 1]} * {shape[i + 1]}'
+            lines.append(f'{strides[i]} = {stride};')
+        if kind == 'temporary':
+            size = ' * '.join(f'(size_t){element}' for element in shape)
+            lines.extend([
+                f'{name}_data = calloc({size}, sizeof(double));',
+                f'if ({name}_data == NULL) {{',
+                f'    error = "unable to allocate array";',
+                '    goto cleanup;',
+                '}'])
+        return lines
+
+    # expressions
+    def element(self, element):
+        if is_symbolic_element(element):
+            return self.expression(element)
+        return _literal(element)
+
+    def expression(self, node):
+        results = {}
+        stack = [(node, False)]
+        while stack:
+            _node, visited = stack.pop()
+            if _node in results:
+                continue
+            if _node.symbol in {(NodeSymbol.ARRAY,), (NodeSymbol.INDEX,)}:
+                results[_node] = self._array(_node)
+            elif _node.symbol == (NodeSymbol.PSI,):
+                results[_node] = self._psi(_node)
+            elif _node.symbol == (NodeSymbol.DIM,):
+                results[_node] = f'{_node.child[0].attrib[0]}->ndim'
+            elif not visited:
+                stack.append((_node, True))
+                stack.extend((child_node, False) for child_node in _node.child)
+            elif _node.symbol == (NodeSymbol.NOT,):
+                results[_node] = f'(!{results[_node.child[0]]})'
+            elif _node.symbol == (NodeSymbol.DIVIDE,):
+                # division of integers is true division
+                results[_node] = f'({results[_node.child[0]]} / (double){results[_node.child[1]]})'
+            elif _node.symbol in _BINARY_OPERATOR_MAP:
+                left, right = (results[child_node] for child_node in _node.child)
+                results[_node] = f'({left} {_BINARY_OPERATOR_MAP[_node.symbol]} {right})'
+            else:
+                raise MOAException(f'C backend does not support expression {_node.symbol}')
+        return results[node]
+
+    def _array(self, node):
+        name = node.attrib[0]
+        symbol_node = self.context.symbol_table.get(name)
+        if symbol_node is not None and symbol_node.symbol != NodeSymbol.INDEX and symbol_node.shape == () and \
+           symbol_node.value is not None and not has_symbolic_elements(symbol_node.value):
+            return _literal(symbol_node.value[0])
+        elif self.arrays.get(name) == 'argument':
+            return f'{name}->data[0]'
+        elif name in self.arrays:
+            return f'{name}_data[0]'
+        return name
+
+    def _psi(self, node):
+        index_node, array_node = node.child
+        index_value = self.context.symbol_table[index_node.attrib[0]].value
+        if array_node.symbol == (NodeSymbol.SHAPE,):
+            return f'{array_node.child[0].attrib[0]}->shape[{self.element(index_value[0])}]'
+
+        name = array_node.attrib[0]
+        offsets = []
+        for element, stride in zip(index_value, self.strides[name]):
+            offset = self.element(element)
+            # scalar arguments and double scalars are not integers
+            if is_symbolic_element(element) and self.scalar_types.get(element.attrib[0]) != 'moa_index':
+                offset = f'(moa_index){offset}'
+            offsets.append(offset if stride == '1' else f'{offset} * {stride}')
+        return f'{name}_data[{" + ".join(offsets) or "0"}]'
+
+
+def _scalar_types(context, arrays):
+    """C type of every scalar and index variable
+
+    Scalars assigned only integer expressions of shapes, indicies
+    and integer constants are ``moa_index`` otherwise ``double``.
+    """
+    assignments = {}
+    scalar_types = {}
+    for node in iterate_nodes((context.ast,)):
+        if node.symbol[0] == NodeSymbol.LOOP:
+            scalar_types[node.attrib[0]] = 'moa_index'
+        elif node.symbol == (NodeSymbol.INITIALIZE,) and node.attrib[0] not in arrays:
+            scalar_types.setdefault(node.attrib[0], 'moa_index')
+        elif node.symbol == (NodeSymbol.ASSIGN,) and node.child[0].symbol == (NodeSymbol.ARRAY,) and node.child[0].attrib[0] not in arrays:
+            scalar_types.setdefault(node.child[0].attrib[0], 'moa_index')
+            assignments.setdefault(node.child[0].attrib[0], []).append(node.child[1])
+
+    def _is_double(node):
+        stack = [node]
+        while stack:
+            _node = stack.pop()
+            if _node.symbol == (NodeSymbol.DIVIDE,):
+                return True
+            elif _node.symbol == (NodeSymbol.PSI,):
+                if _node.child[1].symbol != (NodeSymbol.SHAPE,):
+                    return True
+            elif _node.symbol == (NodeSymbol.ARRAY,):
+                name = _node.attrib[0]
+                symbol_node = context.symbol_table.get(name)
+                if name in arrays or scalar_types.get(name) == 'double':
+                    return True
+                elif symbol_node is not None and symbol_node.value is not None and \
+                     any(isinstance(element, float) for element in symbol_node.value):
+                    return True
+            elif _node.symbol != (NodeSymbol.DIM,):
+                stack.extend(_node.child)
+        return False
+
+    changed = True
+    while changed:
+        changed = False
+        for name, values in assignments.items():
+            if scalar_types[name] != 'double' and any(_is_double(value) for value in values):
+                scalar_types[name] = 'double'
+                changed = True
+    return scalar_types
+
+
+# compilation and loading
+_c_function_cache = LRUCache(maxsize=64)
+
+
+def compile_c_source(source, cache_dir=None, cc=None, cflags=DEFAULT_CFLAGS):
+    """Compile C source to a shared object cached on disk
+
+    source: str
+      C source from ``generate_c_source``
+    cache_dir: str
+      directory of compiled shared objects. Defaults to the per user
+      ``moa.cache.default_cache_dir()``. The directory is created with
+      mode 0700 and must be owned by the user and not writable by
+      others (see ``moa.cache.secure_directory``)
+    cc: str
+      C compiler. Defaults to environment variable ``CC`` or "cc"
+    cflags: Sequence[str]
+      compiler flags e.g. ``DEFAULT_CFLAGS + ('-march=native',)``
+
+    Returns path of shared object.
+    """
+    cc = cc or os.environ.get('CC', 'cc')
+    directory = secure_directory(cache_dir or default_cache_dir())
+    digest = 'moa_' + hashlib.sha256(repr((__version__, cc, tuple(cflags), source)).encode('utf-8')).hexdigest()
+    path = os.path.join(directory, digest + '.so')
+    if os.path.exists(path):
+        check_owner(path)
+        return path
+
+    with tempfile.TemporaryDirectory(dir=directory) as build_directory:
+        source_path = os.path.join(build_directory, digest + '.c')
+        with open(source_path, 'w', encoding='utf-8') as f:
+            f.write(source)
+
+        object_path = os.path.join(build_directory, digest + '.so')
+        try:
+            process = subprocess.run([cc, *cflags, '-o', object_path, source_path], capture_output=True, text=True)
+        except OSError as error:
+            raise MOACompileError(f'unable to run C compiler {cc}: {error}') from None
+        if process.returncode != 0:
+            raise MOACompileError(f'C compiler {cc} failed:\n{process.stderr}')
+        # readers never see partially written shared objects
+        os.chmod(object_path, 0o700)
+        os.replace(object_path, path)
+    return path
+
+
+def load_c_function(source, cache_dir=None, cc=None, cflags=DEFAULT_CFLAGS, use_cache=True):
+    """Compile C source (see ``compile_c_source``) and load it as a ``CFunction``
+
+    Loaded functions are memoized in ``_c_function_cache`` unless
+    ``use_cache`` is False.
+    """
+    path = compile_c_source(source, cache_dir=cache_dir, cc=cc, cflags=cflags)
+    if not use_cache:
+        return CFunction(path)
+    function = _c_function_cache.get(path)
+    if function is None:
+        function = CFunction(path)
+        _c_function_cache.set(path, function)
+    return function
+
+
+class _PyBuffer(ctypes.Structure):
+    _fields_ = [
+        ('buf', ctypes.c_void_p),
+        ('obj', ctypes.c_void_p),
+        ('len', ctypes.c_ssize_t),
+        ('itemsize', ctypes.c_ssize_t),
+        ('readonly', ctypes.c_int),
+        ('ndim', ctypes.c_int),
+        ('format', ctypes.c_char_p),
+        ('shape', ctypes.POINTER(ctypes.c_ssize_t)),
+        ('strides', ctypes.POINTER(ctypes.c_ssize_t)),
+        ('suboffsets', ctypes.POINTER(ctypes.c_ssize_t)),
+        ('internal', ctypes.c_void_p),
+    ]
+
+
+class _MOAArray(ctypes.Structure):
+    _fields_ = [
+        ('data', ctypes.c_void_p),
+        ('ndim', ctypes.c_int),
+        ('shape', ctypes.POINTER(ctypes.c_ssize_t)),
+        ('strides', ctypes.POINTER(ctypes.c_ssize_t)),
+    ]
+
+
+_PyBUF_WRITABLE = 0x0001
+_PyBUF_RECORDS_RO = 0x001c # strided with format
+_DOUBLE_FORMATS = {b'd', b'@d', b'=d', b'<d' if sys.byteorder == 'little' else b'>d'}
+_INTEGER_FORMATS = set('bBhHiIlLqQnN')
+
+# private prototypes leave the argtypes of ctypes.pythonapi untouched
+_get_buffer = ctypes.PYFUNCTYPE(ctypes.c_int, ctypes.py_object, ctypes.POINTER(_PyBuffer), ctypes.c_int)(
+    ('PyObject_GetBuffer', ctypes.pythonapi))
+_release_buffer = ctypes.PYFUNCTYPE(None, ctypes.POINTER(_PyBuffer))(('PyBuffer_Release', ctypes.pythonapi))
+
+
+@contextlib.contextmanager
+def _buffer(obj, backend, writable=False):
+    buffer = _PyBuffer()
+    _get_buffer(obj, ctypes.byref(buffer), _PyBUF_RECORDS_RO | (_PyBUF_WRITABLE if writable else 0))
+    try:
+        if buffer.format not in _DOUBLE_FORMATS or buffer.itemsize != ctypes.sizeof(ctypes.c_double):
+            raise TypeError(f'{backend} backend requires arrays of doubles not format "{buffer.format.decode()}"')
+        if any(buffer.strides[i] % buffer.itemsize for i in range(buffer.ndim)):
+            raise TypeError(f'{backend} backend requires strides that are multiples of the itemsize')
+        yield buffer
+    finally:
+        _release_buffer(ctypes.byref(buffer))
+
+
+def _index_scalar(value):
+    """0-d array of doubles for integer scalar (e.g. an index) otherwise None"""
+    if isinstance(value, numbers.Integral):
+        index = int(value)
+    else:
+        try:
+            view = memoryview(value)
+        except TypeError:
+            return None
+        with view:
+            if view.ndim != 0 or view.format.lstrip('@=<>!') not in _INTEGER_FORMATS:
+                return None
+            index, = struct.unpack(view.format, view.tobytes())
+
+    scalar = _allocate(())
+    scalar[()] = index
+    return scalar
+
+
+def _allocate(shape):
+    if numpy is not None:
+        return numpy.zeros(shape)
+    elif math.prod(shape) == 0: # memoryview can not cast to empty shapes
+        return memoryview(bytearray()).cast('d')
+    return memoryview(bytearray(ctypes.sizeof(ctypes.c_double) * math.prod(shape))).cast('d', shape)
+
+
+class KernelFunction:
+    """Callable kernel with the calling convention of ``generate_c_source``
+
+    Called with arrays of doubles supporting the buffer protocol
+    (e.g. NumPy arrays) by position or name. Arrays are passed without
+    copying. Integer scalars are converted to doubles. Index arguments
+    must be integers (python ints, NumPy integers or 0-d integer
+    arrays) as in the other backends.
+    The result is a NumPy array when NumPy is installed otherwise a
+    ``memoryview``.
+
+    address: callable
+      address of an exported symbol by name
+    """
+    backend = 'C'
+
+    def __init__(self, address):
+        self.arguments = tuple(ctypes.c_char_p.from_address(address('f_arguments')).value.decode('utf-8').split())
+        self.indicies = frozenset(ctypes.c_char_p.from_address(address('f_indicies')).value.decode('utf-8').split())
+        self.ndim = ctypes.c_int.from_address(address('f_ndim')).value
+
+        array_types = [ctypes.POINTER(_MOAArray)] * len(self.arguments)
+        self._shape_function = ctypes.CFUNCTYPE(ctypes.c_char_p, *array_types, ctypes.POINTER(ctypes.c_ssize_t))(address('f_shape'))
+        self._function = ctypes.CFUNCTYPE(ctypes.c_char_p, *array_types, ctypes.c_void_p)(address('f'))
+
+    def _bind(self, args, kwargs):
+        if len(args) > len(self.arguments):
+            raise TypeError(f'expected at most {len(self.arguments)} arguments got {len(args)}')
+        arrays = dict(zip(self.arguments, args))
+        for name, value in kwargs.items():
+            if name not in self.arguments:
+                raise TypeError(f'unexpected argument {name}')
+            elif name in arrays:
+                raise TypeError(f'multiple values for argument {name}')
+            arrays[name] = value
+        missing = [name for name in self.arguments if name not in arrays]
+        if missing:
+            raise TypeError(f'missing arguments {", ".join(missing)}')
+        return [arrays[name] for name in self.arguments]
+
+    def __call__(self, *args, **kwargs):
+        with contextlib.ExitStack() as stack:
+            arrays = []
+            for name, value in zip(self.arguments, self._bind(args, kwargs)):
+                scalar = _index_scalar(value)
+                if scalar is None and name in self.indicies:
+                    raise TypeError(f'index argument {name} must be an integer not {type(value).__name__}')
+                buffer = stack.enter_context(_buffer(value if scalar is None else scalar, self.backend))
+                arrays.append(ctypes.byref(_MOAArray(buffer.buf, buffer.ndim, buffer.shape, buffer.strides)))
+
+            shape = (ctypes.c_ssize_t * self.ndim)()
+            error = self._shape_function(*arrays, shape)
+            if error is not None:
+                raise Exception(error.decode('utf-8'))
+
+            result = _allocate(tuple(shape))
+            with _buffer(result, self.backend, writable=True) as result_buffer:
+                error = self._function(*arrays, result_buffer.buf)
+            if error is not None:
+                raise Exception(error.decode('utf-8'))
+            return result
+
+
+class CFunction(KernelFunction):
+    """Kernel loaded from a shared object compiled by ``compile_c_source``
+
+    path: str
+      path of shared object
+    """
+    def __init__(self, path):
+        self.path = path
+        self._library = ctypes.CDLL(path)
+        super().__init__(lambda name: ctypes.cast(getattr(self._library, name), ctypes.c_void_p).value)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(path={self.path!r})'
@@ -0,0 +1,551 @@
+"""LLVM backend
+
+Emits LLVM IR of the ONF with ``llvmlite.ir`` and compiles it in
+process with llvmlite's MCJIT. Kernels share the calling convention
+of the C backend (see ``moa.backend.c``) so they take arrays of
+doubles supporting the buffer protocol without copying.
+
+Innermost loops without dependencies between iterations carry
+``llvm.loop.vectorize.enable`` metadata and the optimization pipeline
+is configured by ``LLVMOptions``. Requires llvmlite >= 0.44 (opaque
+pointers and ``create_pass_builder``).
+"""
+import collections
+import contextlib
+import hashlib
+
+from ..ast import NodeSymbol, has_symbolic_elements, is_symbolic_element, iterate_nodes
+from ..cache import LRUCache
+from ..exception import MOAException
+from .c import KernelFunction, _scalar_types
+from .python import split_prologue, index_arguments
+
+try:
+    import llvmlite.ir as ir
+    import llvmlite.binding as llvm
+except ImportError:
+    ir = None
+    llvm = None
+
+
+LLVMOptions = collections.namedtuple(
+    'LLVMOptions', ['opt_level', 'vectorize', 'fastmath', 'cpu'],
+    defaults=(3, True, False, None))
+
+
+def generate_llvm_ir(context, options=None):
+    """Generate LLVM IR of ONF context
+
+    context: Context
+      ONF context of expression
+    options: LLVMOptions
+      defaults to ``LLVMOptions()``
+
+    ``LLVMOptions`` fields:
+
+    opt_level: int
+      optimization level 0-3 of the pass pipeline
+    vectorize: bool
+      mark vectorizable innermost loops with
+      ``llvm.loop.vectorize.enable`` and run the loop and SLP
+      vectorizers
+    fastmath: bool
+      allow reassociation of floating point operations (vectorized reductions)
+    cpu: str
+      target cpu e.g. "skylake". ``None`` uses the host cpu and features
+    """
+    if ir is None:
+        raise ImportError('llvm backend requires llvmlite')
+
+    options = options or LLVMOptions()
+    function_node = context.ast
+    argument_names, result_name = function_node.attrib
+    statements = function_node.child[0].child
+
+    arrays = {name: 'argument' for name in argument_names}
+    arrays[result_name] = 'result'
+    for node in iterate_nodes((function_node,)):
+        if node.symbol == (NodeSymbol.INITIALIZE,) and node.attrib[0] not in arrays and node.shape != ():
+            arrays[node.attrib[0]] = 'temporary'
+
+    module = ir.Module(name='moa')
+    prologue_statements, body_statements = split_prologue(statements)
+
+    _string_global(module, 'f_arguments', ' '.join(argument_names))
+    _string_global(module, 'f_indicies', ' '.join(index_arguments(context)))
+    ndim_global = ir.GlobalVariable(module, _INT32, 'f_ndim')
+    ndim_global.initializer = ir.Constant(_INT32, len(context.symbol_table[result_name].shape))
+    ndim_global.global_constant = True
+
+    shape_generator = _LLVMGenerator(context, arrays, module, 'f_shape', options)
+    shape_generator.statements(prologue_statements)
+    shape_generator.store_shape(context.symbol_table[result_name].shape)
+    shape_generator.finish()
+
+    generator = _LLVMGenerator(context, arrays, module, 'f', options)
+    generator.statements(prologue_statements)
+    generator.load_arguments()
+    generator.body(body_statements)
+    generator.finish()
+    return str(module)
+
+
+_INT1 = ir.IntType(1) if ir else None
+_INT8 = ir.IntType(8) if ir else None
+_INT32 = ir.IntType(32) if ir else None
+_INT64 = ir.IntType(64) if ir else None
+_DOUBLE = ir.DoubleType() if ir else None
+_POINTER = ir.PointerType() if ir else None
+_ARRAY_TYPE = ir.LiteralStructType([_POINTER, _INT32, _POINTER, _POINTER]) if ir else None # moa_array
+
+_ARITHMETIC_MAP = {
+    (NodeSymbol.PLUS,): ('add', 'fadd'),
+    (NodeSymbol.MINUS,): ('sub', 'fsub'),
+    (NodeSymbol.TIMES,): ('mul', 'fmul'),
+}
+
+_COMPARISON_MAP = {
+    (NodeSymbol.EQUAL,): '==',
+    (NodeSymbol.NOTEQUAL,): '!=',
+    (NodeSymbol.LESSTHAN,): '<',
+    (NodeSymbol.LESSTHANEQUAL,): '<=',
+    (NodeSymbol.GREATERTHAN,): '>',
+    (NodeSymbol.GREATERTHANEQUAL,): '>=',
+}
+
+
+def _string_global(module, name, value):
+    """Global ``const char *name`` pointing to null terminated value"""
+    pointer_global = ir.GlobalVariable(module, _POINTER, name)
+    pointer_global.initializer = _message_global(module, value)
+    pointer_global.global_constant = True
+    return pointer_global
+
+
+def _message_global(module, value):
+    """Private null terminated string constant"""
+    data = bytearray(value.encode('utf-8') + b'\x00')
+    data_global = ir.GlobalVariable(module, ir.ArrayType(_INT8, len(data)), module.get_unique_name('message'))
+    data_global.initializer = ir.Constant(data_global.value_type, data)
+    data_global.global_constant = True
+    data_global.linkage = 'private'
+    return data_global
+
+
+def _declare(module, name, return_type, argument_types):
+    function = module.globals.get(name)
+    if function is None:
+        function = ir.Function(module, ir.FunctionType(return_type, argument_types), name)
+    return function
+
+
+class _LLVMGenerator:
+    def __init__(self, context, arrays, module, name, options):
+        self.context = context
+        self.arrays = arrays
+        self.module = module
+        self.options = options
+        self.scalar_types = _scalar_types(context, arrays)
+
+        # arrays followed by the result shape (f_shape) or result data (f)
+        argument_names = [name for name, kind in arrays.items() if kind == 'argument']
+        self.function = ir.Function(module, ir.FunctionType(_POINTER, [_POINTER] * (len(argument_names) + 1)), name)
+        self.function.args[-1].add_attribute('noalias')
+        self.array_pointers = dict(zip(argument_names, self.function.args))
+
+        entry_block = self.function.append_basic_block('entry')
+        self.cleanup_block = self.function.append_basic_block('cleanup')
+        self.builder = ir.IRBuilder(entry_block)
+
+        # every variable is a stack slot promoted to registers by mem2reg
+        self.variables = {}
+        for variable_name, scalar_type in sorted(self.scalar_types.items()):
+            variable_type = _DOUBLE if scalar_type == 'double' else _INT64
+            self.variables[variable_name] = self.builder.alloca(variable_type, name=variable_name)
+            self.builder.store(ir.Constant(variable_type, 0), self.variables[variable_name])
+        self.error = self.builder.alloca(_POINTER, name='error')
+        self.builder.store(ir.Constant(_POINTER, None), self.error)
+
+        self.data = {}
+        self.strides = {}
+        for array_name, kind in arrays.items():
+            if kind == 'result':
+                self.data[array_name] = self.function.args[-1]
+            elif kind == 'temporary':
+                self.data[array_name] = self.builder.alloca(_POINTER, name=f'{array_name}_data')
+                self.builder.store(ir.Constant(_POINTER, None), self.data[array_name])
+            if kind != 'argument':
+                ndim = len(context.symbol_table[array_name].shape)
+                self.strides[array_name] = [self.builder.alloca(_INT64, name=f'{array_name}_stride_{i}') for i in range(ndim - 1)] + \
+                    [ir.Constant(_INT64, 1)] * (ndim > 0)
+
+    def finish(self):
+        if not self.builder.block.is_terminated:
+            self.builder.branch(self.cleanup_block)
+        self.builder.position_at_end(self.cleanup_block)
+        free = _declare(self.module, 'free', ir.VoidType(), [_POINTER])
+        for array_name, kind in self.arrays.items():
+            if kind == 'temporary':
+                self.builder.call(free, [self.builder.load(self.data[array_name], typ=_POINTER)])
+        self.builder.ret(self.builder.load(self.error, typ=_POINTER))
+
+    # arrays
+    def load_arguments(self):
+        """Load data pointer and element strides of arguments after argument checks"""
+        for array_name, kind in self.arrays.items():
+            if kind != 'argument':
+                continue
+            array_pointer = self.array_pointers[array_name]
+            self.data[array_name] = self._load_field(array_pointer, 0, _POINTER)
+            strides_pointer = self._load_field(array_pointer, 3, _POINTER)
+            self.strides[array_name] = []
+            for i in range(len(self.context.symbol_table[array_name].shape)):
+                stride_pointer = self.builder.gep(strides_pointer, [ir.Constant(_INT64, i)], source_etype=_INT64)
+                stride = self.builder.load(stride_pointer, typ=_INT64)
+                self.strides[array_name].append(self.builder.sdiv(stride, ir.Constant(_INT64, 8), name=f'{array_name}_stride_{i}'))
+
+    def _load_field(self, array_pointer, field, field_type):
+        pointer = self.builder.gep(array_pointer, [ir.Constant(_INT32, 0), ir.Constant(_INT32, field)], source_etype=_ARRAY_TYPE)
+        return self.builder.load(pointer, typ=field_type)
+
+    def _data(self, array_name):
+        data = self.data[array_name]
+        if self.arrays[array_name] == 'temporary':
+            return self.builder.load(data, typ=_POINTER)
+        return data
+
+    def _stride(self, stride):
+        if isinstance(stride, ir.AllocaInstr):
+            return self.builder.load(stride, typ=_INT64)
+        return stride
+
+    @contextlib.contextmanager
+    def unit_strides(self):
+        """Assume innermost dimension of arguments is contiguous"""
+        strides = self.strides
+        self.strides = {name: _strides[:-1] + [ir.Constant(_INT64, 1)] * bool(_strides) if self.arrays[name] == 'argument' else _strides
+                        for name, _strides in strides.items()}
+        try:
+            yield
+        finally:
+            self.strides = strides
+
+    def store_shape(self, shape):
+        shape_pointer = self.function.args[-1]
+        for i, element in enumerate(shape):
+            pointer = self.builder.gep(shape_pointer, [ir.Constant(_INT64, i)], source_etype=_INT64)
+            self.builder.store(self._convert(self.element(element), _INT64), pointer)
+
+    # statements
+    def body(self, statements):
+        contiguous_strides = [strides[-1] for name, strides in self.strides.items() if self.arrays[name] == 'argument' and strides]
+        if not contiguous_strides:
+            self.statements(statements)
+            return
+
+        # unit stride innermost dimensions allow vectorization
+        condition = ir.Constant(_INT1, 1)
+        for stride in contiguous_strides:
+            condition = self.builder.and_(condition, self.builder.icmp_signed('==', stride, ir.Constant(_INT64, 1)))
+        with self.builder.if_else(condition) as (contiguous, strided):
+            with contiguous:
+                with self.unit_strides():
+                    self.statements(statements)
+            with strided:
+                self.statements(statements)
+
+    def statements(self, statements):
+        for statement in statements:
+            self.statement(statement)
+
+    def statement(self, node):
+        symbol = node.symbol
+        if symbol == (NodeSymbol.BLOCK,):
+            self.statements(node.child)
+        elif symbol == (NodeSymbol.CONDITION,):
+            with self.builder.if_then(self._convert(self.expression(node.child[0]), _INT1)):
+                self.statement(node.child[1])
+        elif symbol == (NodeSymbol.ERROR,):
+            self.builder.store(_message_global(self.module, node.attrib[0]), self.error)
+            self.builder.branch(self.cleanup_block)
+            # statements following an error are unreachable
+            self.builder.position_at_end(self.function.append_basic_block('unreachable'))
+        elif symbol == (NodeSymbol.ASSIGN,):
+            self._assign(*node.child)
+        elif symbol[0] == NodeSymbol.LOOP:
+            self._loop(node)
+        elif symbol == (NodeSymbol.INITIALIZE,):
+            self._initialize(node)
+        else:
+            raise MOAException(f'LLVM backend does not support statement {symbol}')
+
+    def _assign(self, target_node, value_node):
+        value = self.expression(value_node)
+        if target_node.symbol == (NodeSymbol.PSI,):
+            self.builder.store(self._convert(value, _DOUBLE), self._psi_pointer(target_node))
+        elif target_node.attrib[0] in self.arrays:
+            self.builder.store(self._convert(value, _DOUBLE), self._data(target_node.attrib[0]))
+        else:
+            variable = self.variables[target_node.attrib[0]]
+            self.builder.store(self._convert(value, variable.allocated_type), variable)
+
+    def _loop(self, node):
+        index_name = node.attrib[0]
+        index_variable = self.variables[index_name]
+        start, stop, step = (self._convert(self.element(element), _INT64) for element in self.context.symbol_table[index_name].value)
+        self.builder.store(start, index_variable)
+
+        condition_block = self.function.append_basic_block(f'{index_name}_condition')
+        body_block = self.function.append_basic_block(f'{index_name}_body')
+        exit_block = self.function.append_basic_block(f'{index_name}_exit')
+        self.builder.branch(condition_block)
+
+        self.builder.position_at_end(condition_block)
+        index = self.builder.load(index_variable, typ=_INT64)
+        self.builder.cbranch(self.builder.icmp_signed('<', index, stop), body_block, exit_block)
+
+        self.builder.position_at_end(body_block)
+        self.statement(node.child[0])
+        index = self.builder.load(index_variable, typ=_INT64)
+        self.builder.store(self.builder.add(index, step), index_variable)
+        backedge = self.builder.branch(condition_block)
+        if self.options.vectorize and self._vectorizable(node):
+            backedge.set_metadata('llvm.loop', self._vectorize_metadata())
+
+        self.builder.position_at_end(exit_block)
+
+    def _vectorizable(self, node):
+        """Whether loop is innermost without dependencies between iterations
+
+        Array elements stored independently of the loop index and
+        scalars living across iterations accumulate (reductions). The
+        vectorizer only reorders scalar reductions with fastmath and
+        warns when requested loops can not be vectorized.
+        """
+        index_name = node.attrib[0]
+        statements = list(iterate_nodes(node.child))
+        temporaries = {_node.attrib[0] for _node in statements if _node.symbol == (NodeSymbol.INITIALIZE,)}
+        for _node in statements:
+            if _node.symbol[0] == NodeSymbol.LOOP:
+                return False
+            elif _node.symbol != (NodeSymbol.ASSIGN,):
+                continue
+
+            target_node = _node.child[0]
+            if target_node.symbol == (NodeSymbol.PSI,):
+                index_value = self.context.symbol_table[target_node.child[0].attrib[0]].value
+                if not any(is_symbolic_element(element) and element.attrib[0] == index_name for element in index_value):
+                    return False
+            elif target_node.attrib[0] in self.arrays:
+                return False
+            elif target_node.attrib[0] not in temporaries and not self.options.fastmath:
+                return False
+        return True
+
+    def _vectorize_metadata(self):
+        enable = self.module.add_metadata([ir.MetaDataString(self.module, 'llvm.loop.vectorize.enable'), ir.Constant(_INT1, 1)])
+        # loop ids are distinct self referencing nodes
+        loop_id = self.module.add_metadata([enable, ir.MetaDataString(self.module, f'moa.loop.{len(self.module.metadata)}')])
+        loop_id.operands = (loop_id,) + loop_id.operands
+        return loop_id
+
+    def _initialize(self, node):
+        array_name = node.attrib[0]
+        kind = self.arrays.get(array_name)
+        if kind is None: # scalar
+            variable = self.variables[array_name]
+            self.builder.store(ir.Constant(variable.allocated_type, 0), variable)
+            return
+
+        shape = [self._convert(self.element(element), _INT64) for element in node.shape]
+        strides = self.strides[array_name]
+        for i in reversed(range(len(shape) - 1)):
+            self.builder.store(self.builder.mul(self._stride(strides[i + 1]), shape[i + 1]), strides[i])
+
+        if kind == 'temporary':
+            size = ir.Constant(_INT64, 1)
+            for element in shape:
+                size = self.builder.mul(size, element)
+            calloc = _declare(self.module, 'calloc', _POINTER, [_INT64, _INT64])
+            data = self.builder.call(calloc, [size, ir.Constant(_INT64, 8)])
+            self.builder.store(data, self.data[array_name])
+            with self.builder.if_then(self.builder.icmp_unsigned('==', data, ir.Constant(_POINTER, None)), likely=False):
+                self.builder.store(_message_global(self.module, 'unable to allocate array'), self.error)
+                self.builder.branch(self.cleanup_block)
+                self.builder.position_at_end(self.function.append_basic_block('unreachable'))
+
+    # expressions
+    def element(self, element):
+        if is_symbolic_element(element):
+            return self.expression(element)
+        return _constant(element)
+
+    def _convert(self, value, value_type):
+        if value.type == value_type:
+            return value
+        elif value_type == _INT1:
+            if value.type == _DOUBLE:
+                return self.builder.fcmp_unordered('!=', value, ir.Constant(_DOUBLE, 0))
+            return self.builder.icmp_signed('!=', value, ir.Constant(value.type, 0))
+        elif value_type == _DOUBLE:
+            return self.builder.uitofp(value, _DOUBLE) if value.type == _INT1 else self.builder.sitofp(value, _DOUBLE)
+        elif value.type == _DOUBLE:
+            return self.builder.fptosi(value, value_type)
+        elif value.type == _INT1:
+            return self.builder.zext(value, value_type)
+        return self.builder.sext(value, value_type)
+
+    def _flags(self):
+        return ('fast',) if self.options.fastmath else ()
+
+    def expression(self, node):
+        results = {}
+        stack = [(node, False)]
+        while stack:
+            _node, visited = stack.pop()
+            if _node in results:
+                continue
+            if _node.symbol in {(NodeSymbol.ARRAY,), (NodeSymbol.INDEX,)}:
+                results[_node] = self._array(_node)
+            elif _node.symbol == (NodeSymbol.PSI,):
+                results[_node] = self._psi(_node)
+            elif _node.symbol == (NodeSymbol.DIM,):
+                results[_node] = self._convert(self._load_field(self.array_pointers[_node.child[0].attrib[0]], 1, _INT32), _INT64)
+            elif not visited:
+                stack.append((_node, True))
+                stack.extend((child_node, False) for child_node in _node.child)
+            elif _node.symbol == (NodeSymbol.NOT,):
+                results[_node] = self.builder.not_(self._convert(results[_node.child[0]], _INT1))
+            elif _node.symbol in {(NodeSymbol.AND,), (NodeSymbol.OR,)}:
+                left, right = (self._convert(results[child_node], _INT1) for child_node in _node.child)
+                results[_node] = self.builder.and_(left, right) if _node.symbol == (NodeSymbol.AND,) else self.builder.or_(left, right)
+            elif _node.symbol == (NodeSymbol.DIVIDE,):
+                # division of integers is true division
+                left, right = (self._convert(results[child_node], _DOUBLE) for child_node in _node.child)
+                results[_node] = self.builder.fdiv(left, right, flags=self._flags())
+            elif _node.symbol in _ARITHMETIC_MAP:
+                left, right = (results[child_node] for child_node in _node.child)
+                integer_operation, float_operation = _ARITHMETIC_MAP[_node.symbol]
+                if left.type == _DOUBLE or right.type == _DOUBLE:
+                    results[_node] = getattr(self.builder, float_operation)(
+                        self._convert(left, _DOUBLE), self._convert(right, _DOUBLE), flags=self._flags())
+                else:
+                    results[_node] = getattr(self.builder, integer_operation)(left, right)
+            elif _node.symbol in _COMPARISON_MAP:
+                left, right = (results[child_node] for child_node in _node.child)
+                operation = _COMPARISON_MAP[_node.symbol]
+                if left.type == _DOUBLE or right.type == _DOUBLE:
+                    results[_node] = self.builder.fcmp_ordered(operation, self._convert(left, _DOUBLE), self._convert(right, _DOUBLE))
+                else:
+                    results[_node] = self.builder.icmp_signed(operation, self._convert(left, _INT64), self._convert(right, _INT64))
+            else:
+                raise MOAException(f'LLVM backend does not support expression {_node.symbol}')
+        return results[node]
+
+    def _array(self, node):
+        name = node.attrib[0]
+        symbol_node = self.context.symbol_table.get(name)
+        if symbol_node is not None and symbol_node.symbol != NodeSymbol.INDEX and symbol_node.shape == () and \
+           symbol_node.value is not None and not has_symbolic_elements(symbol_node.value):
+            return _constant(symbol_node.value[0])
+        elif self.arrays.get(name) == 'argument':
+            return self.builder.load(self._load_field(self.array_pointers[name], 0, _POINTER), typ=_DOUBLE)
+        elif name in self.arrays:
+            return self.builder.load(self._data(name), typ=_DOUBLE)
+        return self.builder.load(self.variables[name], typ=self.variables[name].allocated_type)
+
+    def _psi(self, node):
+        index_node, array_node = node.child
+        if array_node.symbol == (NodeSymbol.SHAPE,):
+            index_value = self.context.symbol_table[index_node.attrib[0]].value
+            shape_pointer = self._load_field(self.array_pointers[array_node.child[0].attrib[0]], 2, _POINTER)
+            pointer = self.builder.gep(shape_pointer, [self._convert(self.element(index_value[0]), _INT64)], source_etype=_INT64)
+            return self.builder.load(pointer, typ=_INT64)
+        return self.builder.load(self._psi_pointer(node), typ=_DOUBLE)
+
+    def _psi_pointer(self, node):
+        index_node, array_node = node.child
+        index_value = self.context.symbol_table[index_node.attrib[0]].value
+        array_name = array_node.attrib[0]
+
+        offset = ir.Constant(_INT64, 0)
+        for element, stride in zip(index_value, self.strides[array_name]):
+            element = self._convert(self.element(element), _INT64)
+            stride = self._stride(stride)
+            term = element if isinstance(stride, ir.Constant) and stride.constant == 1 else self.builder.mul(element, stride)
+            offset = term if isinstance(offset, ir.Constant) and offset.constant == 0 else self.builder.add(offset, term)
+        return self.builder.gep(self._data(array_name), [offset], inbounds=True, source_etype=_DOUBLE)
+
+
+def _constant(value):
+    if isinstance(value, float):
+        return ir.Constant(_DOUBLE, value)
+    return ir.Constant(_INT64, int(value))
+
+
+# just in time compilation
+_llvm_function_cache = LRUCache(maxsize=64)
+
+
+def _target_machine(options):
+    target = llvm.Target.from_default_triple()
+    if options.cpu is None:
+        return target.create_target_machine(cpu=llvm.get_host_cpu_name(), features=llvm.get_host_cpu_features().flatten(), opt=options.opt_level)
+    return target.create_target_machine(cpu=options.cpu, opt=options.opt_level)
+
+
+def load_llvm_function(source, options=None, use_cache=True):
+    """Optimize and JIT compile LLVM IR from ``generate_llvm_ir`` with MCJIT
+
+    options: LLVMOptions
+      optimization level, vectorization and target cpu. Defaults to
+      ``LLVMOptions()``
+
+    Returns ``LLVMFunction`` memoized in ``_llvm_function_cache`` by
+    a digest of source and options unless ``use_cache`` is False.
+    """
+    if llvm is None:
+        raise ImportError('llvm backend requires llvmlite')
+
+    options = options or LLVMOptions()
+    if not use_cache:
+        return LLVMFunction(source, options)
+    key = hashlib.sha256(repr((source, options)).encode('utf-8')).hexdigest()
+    function = _llvm_function_cache.get(key)
+    if function is None:
+        function = LLVMFunction(source, options)
+        _llvm_function_cache.set(key, function)
+    return function
+
+
+class LLVMFunction(KernelFunction):
+    """Kernel JIT compiled from LLVM IR with MCJIT
+
+    source: str
+      LLVM IR from ``generate_llvm_ir``
+    options: LLVMOptions
+    """
+    backend = 'LLVM'
+
+    def __init__(self, source, options=None):
+        llvm.initialize_native_target()
+        llvm.initialize_native_asmprinter()
+
+        self.options = options or LLVMOptions()
+        target_machine = _target_machine(self.options)
+        module = llvm.parse_assembly(source)
+        module.verify()
+
+        tuning_options = llvm.create_pipeline_tuning_options(speed_level=self.options.opt_level)
+        tuning_options.loop_vectorization = self.options.vectorize
+        tuning_options.slp_vectorization = self.options.vectorize
+        pass_builder = llvm.create_pass_builder(target_machine, tuning_options)
+        pass_builder.getModulePassManager().run(module, pass_builder)
+
+        self.module = module
+        self._engine = llvm.create_mcjit_compiler(module, target_machine)
+        self._engine.finalize_object()
+        super().__init__(self._engine.get_global_value_address)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(options={self.options!r})'
@@ -0,0 +1,160 @@
+"""Numba backend
+
+Generates python source of the ONF over NumPy arrays decorated with
+``numba.jit`` configured by ``NumbaOptions``. Arrays are allocated
+with the dtype that the operations of the expression produce for the
+given arguments instead of always ``float64``. Generated source
+expects ``numba`` and ``numpy`` to be available in the namespace it
+is executed in.
+"""
+import ast
+import collections
+
+from .python import python_backend, materialize_python_ast, python_ast_recursion_limit, unparse_python_ast, index_arguments, _unwrap_statements
+
+
+NumbaOptions = collections.namedtuple(
+    'NumbaOptions', ['nopython', 'fastmath', 'parallel', 'nogil', 'cache', 'boundscheck', 'dtype'],
+    defaults=(True, False, False, False, False, None, None))
+
+
+_DTYPE_NAME = '_dtype'
+
+
+def generate_numba_source(context, options=None):
+    """Generate numba decorated python source of ONF context
+
+    context: Context
+      ONF context of expression
+    options: NumbaOptions
+      defaults to ``NumbaOptions()``
+
+    ``NumbaOptions`` fields:
+
+    nopython: bool
+      compile without falling back to object mode
+    fastmath: bool
+      allow reassociation of floating point operations (vectorized reductions)
+    parallel: bool
+      enable numba's automatic parallelization and run loops marked by
+      ``moa.optimize.parallelize_loops`` with ``numba.prange``
+    nogil: bool
+      release the GIL while the kernel runs
+    cache: bool
+      cache the compiled kernel on disk. Numba only caches functions
+      defined in files so load the source with ``DiskCache.load_module``
+    boundscheck: bool
+      check array indicies. ``None`` uses numba's default
+    dtype: str
+      dtype of allocated arrays e.g. "float32". ``None`` infers the
+      dtype from the arguments
+    """
+    options = options or NumbaOptions()
+    python_ast = python_backend(context)
+
+    with python_ast_recursion_limit(python_ast):
+        python_ast = materialize_python_ast(context, python_ast, use_numba=True)
+        python_ast = _normalize_parallel_loops(python_ast)
+        python_ast = _decorate_function(python_ast, options)
+        python_ast = _allocate_with_dtype(python_ast, options, index_arguments(context))
+        return unparse_python_ast(python_ast)
+
+
+def _decorate_function(python_ast, options):
+    keywords = [ast.keyword(arg=key, value=ast.NameConstant(value=value))
+                for key, value in options._asdict().items() if key != 'dtype' and value is not None]
+
+    class DecorateFunction(ast.NodeTransformer):
+        def visit_FunctionDef(self, node):
+            node.decorator_list = [ast.Call(func=ast.Name(id='numba.jit', ctx=ast.Load()), args=[], keywords=keywords)]
+            return node
+
+    return DecorateFunction().visit(python_ast)
+
+
+def _normalize_parallel_loops(python_ast):
+    """Rewrite parallel loops to the unit step ranges supported by ``numba.prange``
+
+    ``for i in numba.prange(start, stop, step)`` becomes a loop over
+    the iteration number ``i_iteration`` with ``i = start + i_iteration * step``.
+    """
+    class NormalizeParallelLoops(ast.NodeTransformer):
+        def visit_For(self, node):
+            self.generic_visit(node)
+            if not (isinstance(node.iter, ast.Call) and isinstance(node.iter.func, ast.Name) and node.iter.func.id == 'numba.prange'):
+                return node
+
+            start, stop, step = node.iter.args
+            if isinstance(step, ast.Constant) and step.value == 1:
+                return node
+
+            iteration_name = f'{node.target.id}_iteration'
+            iteration_node = ast.BinOp(left=ast.Name(id=iteration_name, ctx=ast.Load()), op=ast.Mult(), right=step)
+            if not (isinstance(start, ast.Constant) and start.value == 0):
+                stop = ast.BinOp(left=stop, op=ast.Sub(), right=start)
+                iteration_node = ast.BinOp(left=start, op=ast.Add(), right=iteration_node)
+            num_iterations = ast.BinOp(
+                left=ast.BinOp(left=stop, op=ast.Add(), right=ast.BinOp(left=step, op=ast.Sub(), right=ast.Num(n=1))),
+                op=ast.FloorDiv(), right=step)
+            node.iter = ast.Call(func=node.iter.func, args=[num_iterations], keywords=[])
+            node.body = [ast.Assign(targets=[ast.Name(id=node.target.id, ctx=ast.Store())], value=iteration_node)] + node.body
+            node.target = ast.Name(id=iteration_name, ctx=ast.Store())
+            return node
+
+    return NormalizeParallelLoops().visit(python_ast)
+
+
+def _dtype_expression(function_node, options, indicies=()):
+    """Expression of the dtype of all array allocations
+
+    Numba does not support ``numpy.result_type`` so the dtype is
+    inferred by applying the operations to empty arrays of the
+    argument dtypes. Division promotes integers to floats. Index
+    arguments do not contribute to the dtype.
+    """
+    if options.dtype is not None:
+        return ast.Name(id=f'numpy.{options.dtype}', ctx=ast.Load())
+
+    arguments = [argument for argument in function_node.args.args if argument.arg not in indicies]
+    expression = None
+    for argument in arguments:
+        empty_array = ast.Call(
+            func=ast.Name(id='numpy.empty', ctx=ast.Load()),
+            args=[ast.Num(n=0), ast.Attribute(value=ast.Name(id=argument.arg, ctx=ast.Load()), attr='dtype', ctx=ast.Load())],
+            keywords=[])
+        expression = empty_array if expression is None else ast.BinOp(left=expression, op=ast.Add(), right=empty_array)
+
+    if expression is None:
+        return ast.Name(id='numpy.float64', ctx=ast.Load())
+    if len(arguments) == 1 and not any(isinstance(node, ast.BinOp) and isinstance(node.op, ast.Div) for node in ast.walk(function_node)):
+        return ast.Attribute(value=ast.Name(id=arguments[0].arg, ctx=ast.Load()), attr='dtype', ctx=ast.Load())
+    if any(isinstance(node, ast.BinOp) and isinstance(node.op, ast.Div) for node in ast.walk(function_node)):
+        expression = ast.BinOp(left=expression, op=ast.Div(), right=expression)
+    return ast.Attribute(value=expression, attr='dtype', ctx=ast.Load())
+
+
+def _is_allocation(statement):
+    return isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Call) and \
+        isinstance(statement.value.func, ast.Name) and statement.value.func.id == 'numpy.zeros'
+
+
+def _allocate_with_dtype(python_ast, options, indicies=()):
+    class AllocateWithDtype(ast.NodeTransformer):
+        def visit_FunctionDef(self, node):
+            dtype_expression = _dtype_expression(node, options, indicies)
+            self.generic_visit(node)
+            node.body = _unwrap_statements(node.body)
+            # dtype is computed once after argument checks
+            for i, statement in enumerate(node.body):
+                if _is_allocation(statement):
+                    node.body.insert(i, ast.Assign(targets=[ast.Name(id=_DTYPE_NAME, ctx=ast.Store())], value=dtype_expression))
+                    break
+            return node
+
+        def visit_Call(self, node):
+            self.generic_visit(node)
+            if isinstance(node.func, ast.Name) and node.func.id == 'numpy.zeros':
+                node.keywords = [ast.keyword(arg='dtype', value=ast.Name(id=_DTYPE_NAME, ctx=ast.Load()))]
+            return node
+
+    return AllocateWithDtype().visit(python_ast)
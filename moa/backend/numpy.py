@@ -0,0 +1,270 @@
+"""Vectorized NumPy backend
+
+Lowers the DNF of an expression to whole array NumPy operations.
+Each psi of an array becomes a (possibly sliced and transposed) view
+of the array, binary operations become broadcasted ufunc calls, and
+reductions become ``numpy.sum``/``numpy.prod`` or a single
+``numpy.einsum`` when reducing a product. The shape and dimension
+checks of the ONF are kept as is. Generated source expects ``numpy``
+to be available in the namespace it is executed in.
+"""
+import ast
+import string
+
+from ..ast import Node, NodeSymbol, create_context, is_symbolic_element
+from ..exception import MOAException
+from .python import python_backend, materialize_python_ast, python_ast_recursion_limit, unparse_python_ast, split_prologue
+
+
+class MOAVectorizeError(MOAException):
+    """Expression can not be expressed as whole array operations"""
+
+
+_BINOP_MAP = {
+    (NodeSymbol.PLUS,): ast.Add,
+    (NodeSymbol.MINUS,): ast.Sub,
+    (NodeSymbol.TIMES,): ast.Mult,
+    (NodeSymbol.DIVIDE,): ast.Div,
+}
+
+
+def generate_numpy_source(context, expression_context):
+    """Generate python source evaluating expression with NumPy array operations
+
+    context: Context
+      ONF context of expression providing the argument checks
+    expression_context: Context
+      DNF context of expression
+
+    Returns python source or None if the expression can not be
+    vectorized.
+    """
+    expression_node = expression_context.ast
+    if expression_node.symbol == (NodeSymbol.CONDITION,):
+        expression_node = expression_node.child[1]
+
+    try:
+        python_expression = vectorize(expression_context, expression_node)
+    except MOAVectorizeError:
+        return None
+
+    function_node = context.ast
+    block_node = function_node.child[0]
+    statements, _ = split_prologue(block_node.child)
+
+    prologue_context = create_context(
+        ast=Node(function_node.symbol, function_node.shape, function_node.attrib, (
+            Node(block_node.symbol, block_node.shape, block_node.attrib, statements),)),
+        symbol_table=context.symbol_table)
+    python_ast = python_backend(prologue_context)
+    result_name = function_node.attrib[1]
+    python_ast.body.insert(-1, ast.Assign(targets=[ast.Name(id=result_name, ctx=ast.Store())], value=python_expression))
+
+    with python_ast_recursion_limit(python_ast):
+        python_ast = materialize_python_ast(prologue_context, python_ast)
+        return unparse_python_ast(python_ast)
+
+
+def vectorize(context, node):
+    """Python ast of NumPy expression evaluating DNF node for all indicies
+
+    The axes of the result are ordered by sorted index name matching
+    the result index of the ONF.
+    """
+    indicies = _output_indicies(context, node)
+
+    results = {}
+    stack = [(node, False)]
+    while stack:
+        _node, visited = stack.pop()
+        if _node in results:
+            continue
+        if _node.symbol == (NodeSymbol.PSI,):
+            results[_node] = _vectorize_psi(context, _node)
+        elif _node.symbol == (NodeSymbol.ARRAY,):
+            symbol_node = context.symbol_table[_node.attrib[0]]
+            if symbol_node.symbol == NodeSymbol.INDEX or symbol_node.shape != ():
+                raise MOAVectorizeError(f'array {_node.attrib[0]} is not a scalar')
+            results[_node] = (ast.Name(id=_node.attrib[0], ctx=ast.Load()), ())
+        elif not visited:
+            stack.append((_node, True))
+            stack.extend((child_node, False) for child_node in _node.child)
+        elif _node.symbol in _BINOP_MAP:
+            results[_node] = _vectorize_binary_operation(_node, *(results[child_node] for child_node in _node.child))
+        elif _node.symbol[0] == NodeSymbol.REDUCE:
+            results[_node] = _vectorize_reduce(_node, results)
+        else:
+            raise MOAVectorizeError(f'node symbol {_node.symbol} is not vectorized')
+
+    python_expression, expression_indicies = results[node]
+    if set(expression_indicies) != set(indicies):
+        raise MOAVectorizeError('result does not depend on every output index')
+    python_expression = _align(python_expression, expression_indicies, indicies)
+
+    if node.symbol == (NodeSymbol.PSI,):
+        # a view of an argument must not be returned
+        return _call('numpy.array', python_expression)
+    return _call('numpy.asarray', python_expression)
+
+
+def _output_indicies(context, node):
+    indicies, reduction_indicies = set(), set()
+    for symbol_name, symbol_node in context.symbol_table.items():
+        if symbol_node.symbol == NodeSymbol.INDEX:
+            indicies.add(symbol_name)
+
+    stack = [node]
+    while stack:
+        _node = stack.pop()
+        if _node.symbol[0] == NodeSymbol.REDUCE:
+            reduction_indicies.add(_node.attrib[0])
+        stack.extend(_node.child)
+    return tuple(sorted(indicies - reduction_indicies))
+
+
+# python ast helpers
+def _attribute(name):
+    names = name.split('.')
+    node = ast.Name(id=names[0], ctx=ast.Load())
+    for attr in names[1:]:
+        node = ast.Attribute(value=node, attr=attr, ctx=ast.Load())
+    return node
+
+
+def _call(name, *args, **kwargs):
+    return ast.Call(func=_attribute(name), args=list(args),
+                    keywords=[ast.keyword(arg=key, value=value) for key, value in kwargs.items()])
+
+
+def _element(element):
+    if is_symbolic_element(element):
+        return ast.Name(id=element.attrib[0], ctx=ast.Load())
+    return ast.Num(n=element)
+
+
+def _full_slice():
+    return _call('slice', ast.NameConstant(value=None))
+
+
+def _subscript(python_expression, elements):
+    """Index python_expression with elements
+
+    Elements are python ast nodes with ``slice(None)`` for full
+    dimensions and ``None`` for new axes. Tuples of slices are written
+    as ``slice`` calls since slice syntax within tuples is not
+    supported by all unparsers.
+    """
+    elements = list(elements)
+    while elements and _is_full_slice(elements[-1]):
+        elements.pop()
+    if not elements:
+        return python_expression
+    if len(elements) == 1:
+        index = elements[0]
+    else:
+        index = ast.Tuple(elts=elements, ctx=ast.Load())
+    return ast.Subscript(value=python_expression, slice=ast.Index(value=index), ctx=ast.Load())
+
+
+def _is_full_slice(element):
+    return isinstance(element, ast.Call) and isinstance(element.func, ast.Name) and \
+        element.func.id == 'slice' and len(element.args) == 1
+
+
+def _align(python_expression, indicies, target_indicies):
+    """Transpose and insert new axes so that axes broadcast as target_indicies"""
+    ordered_indicies = tuple(sorted(indicies, key=target_indicies.index))
+    if ordered_indicies != indicies:
+        python_expression = _call('numpy.transpose', python_expression, ast.Tuple(
+            elts=[ast.Num(n=indicies.index(index)) for index in ordered_indicies], ctx=ast.Load()))
+
+    elements = [_full_slice() if index in indicies else ast.NameConstant(value=None) for index in target_indicies]
+    # leading new axes are implied by broadcasting
+    while elements and isinstance(elements[0], ast.NameConstant):
+        elements.pop(0)
+    return _subscript(python_expression, elements)
+
+
+# vectorization of DNF nodes
+def _vectorize_psi(context, node):
+    index_node, array_node = node.child
+    if array_node.symbol != (NodeSymbol.ARRAY,):
+        raise MOAVectorizeError('psi of expression')
+
+    index_value = context.symbol_table[index_node.attrib[0]].value
+    array_shape = context.symbol_table[array_node.attrib[0]].shape
+    if index_value is None or len(index_value) != len(array_shape):
+        raise MOAVectorizeError('psi is not a full index')
+
+    elements = []
+    indicies = ()
+    for element, dimension in zip(index_value, array_shape):
+        symbol_node = context.symbol_table.get(element.attrib[0]) if is_symbolic_element(element) else None
+        if symbol_node is not None and symbol_node.symbol == NodeSymbol.INDEX:
+            if element.attrib[0] in indicies:
+                raise MOAVectorizeError('repeated index in psi')
+            start, stop, step = symbol_node.value
+            if start == 0 and step == 1 and stop == dimension:
+                elements.append(_full_slice())
+            else:
+                elements.append(_call('slice', _element(start), _element(stop), _element(step)))
+            indicies = indicies + (element.attrib[0],)
+        else:
+            elements.append(_element(element))
+
+    return _subscript(ast.Name(id=array_node.attrib[0], ctx=ast.Load()), elements), indicies
+
+
+def _vectorize_binary_operation(node, left, right):
+    (left_expression, left_indicies), (right_expression, right_indicies) = left, right
+    indicies = left_indicies + tuple(index for index in right_indicies if index not in left_indicies)
+    return ast.BinOp(
+        left=_align(left_expression, left_indicies, indicies),
+        op=_BINOP_MAP[node.symbol](),
+        right=_align(right_expression, right_indicies, indicies)), indicies
+
+
+def _product_factors(node):
+    """Factors of a product of nodes e.g. ``a * (b * c)``"""
+    factors = []
+    stack = [node]
+    while stack:
+        _node = stack.pop()
+        if _node.symbol == (NodeSymbol.TIMES,):
+            stack.extend(reversed(_node.child))
+        else:
+            factors.append(_node)
+    return factors
+
+
+def _vectorize_reduce(node, results):
+    reduction_index = node.attrib[0]
+    child_node = node.child[0]
+    python_expression, indicies = results[child_node]
+    if reduction_index not in indicies:
+        raise MOAVectorizeError('reduction does not depend on reduction index')
+    result_indicies = tuple(index for index in indicies if index != reduction_index)
+
+    operation = node.symbol[1]
+    if operation == NodeSymbol.PLUS and child_node.symbol == (NodeSymbol.TIMES,):
+        factors = [results[factor] for factor in _product_factors(child_node)]
+        factor_indicies = [index for _, _indicies in factors for index in _indicies]
+        letters = dict(zip(dict.fromkeys(factor_indicies), string.ascii_letters))
+        if len(letters) == len(set(factor_indicies)): # einsum supports at most 52 indicies
+            subscripts = ','.join(''.join(letters[index] for index in _indicies) for _, _indicies in factors)
+            subscripts += '->' + ''.join(letters[index] for index in result_indicies)
+            return _call('numpy.einsum', ast.Str(s=subscripts), *(factor for factor, _ in factors),
+                         optimize=ast.NameConstant(value=True)), result_indicies
+
+    axis = ast.Num(n=indicies.index(reduction_index))
+    if operation == NodeSymbol.PLUS:
+        return _call('numpy.sum', python_expression, axis=axis), result_indicies
+    elif operation == NodeSymbol.TIMES:
+        return _call('numpy.prod', python_expression, axis=axis), result_indicies
+    elif operation == NodeSymbol.MINUS:
+        # 0 - a_0 - a_1 - ...
+        return ast.UnaryOp(op=ast.USub(), operand=_call('numpy.sum', python_expression, axis=axis)), result_indicies
+    elif operation == NodeSymbol.DIVIDE:
+        # 1 / a_0 / a_1 / ...
+        return ast.BinOp(left=ast.Num(n=1), op=ast.Div(), right=_call('numpy.prod', python_expression, axis=axis)), result_indicies
+    raise MOAVectorizeError(f'reduction {operation} is not vectorized')
@@ -1,12 +1,13 @@
 import ast
-import astunparse
+import contextlib
+import sys
 
 from ..ast import (
     create_context,
     select_node,
     NodeSymbol, node_traversal,
     has_symbolic_elements, is_symbolic_element,
-    select_array_node_symbol,
+    select_array_node_symbol, iterate_nodes,
 )
 
 
@@ -18,73 +19,469 @@ def python_backend(context):
     return context.ast
 
 
-def generate_python_source(context, materialize_scalars=False, use_numba=False):
+def generate_python_source(context, materialize_scalars=False, use_numba=False, use_numpy=False, vectorize_innermost=False):
+    """Generate python source of ONF context
+
+    materialize_scalars: bool
+      replace scalar constants with their value
+    use_numba: bool
+      decorate function with ``numba.jit`` and allocate numpy arrays
+    use_numpy: bool
+      allocate arrays with ``numpy.zeros`` instead of ``Array``
+    vectorize_innermost: bool
+      replace innermost loops with NumPy slice expressions where
+      possible (see ``vectorize_innermost_loops``). Implies ``use_numpy``
+    """
     python_ast = python_backend(context)
 
-    class ReplaceScalars(ast.NodeTransformer):
-        def visit_Name(self, node):
-            symbol_node = context.symbol_table.get(node.id)
-            if symbol_node is not None and symbol_node.symbol != NodeSymbol.INDEX and (symbol_node.shape == () and symbol_node.value is not None and not has_symbolic_elements(symbol_node.value)):
-                return ast.Num(symbol_node.value[0])
-            return node
+    # python ast transformers and unparsing are recursive
+    with python_ast_recursion_limit(python_ast):
+        python_ast = _transform_python_ast(context, python_ast, materialize_scalars, use_numba, use_numpy, vectorize_innermost)
+        return unparse_python_ast(python_ast)
+
+
+def generate_python_function(context, namespace=None, use_numba=False, use_numpy=False, vectorize_innermost=False):
+    """Compile python function of ONF context without generating source
+
+    The python ast is materialized and normalized in a single
+    iterative traversal and compiled directly instead of unparsing
+    and parsing source. Source is generated on demand with
+    ``python_function_source``.
+
+    namespace: dict
+      globals of the function. Defaults to ``Array``, ``numpy`` and
+      ``numba`` as required by the options
+    use_numba, use_numpy, vectorize_innermost: bool
+      see ``generate_python_source``
+    """
+    python_ast = python_backend(context)
+    use_numpy = use_numpy or vectorize_innermost
+    if namespace is None:
+        namespace = default_namespace(use_numba=use_numba, use_numpy=use_numpy)
+
+    if vectorize_innermost:
+        with python_ast_recursion_limit(python_ast):
+            python_ast = materialize_python_ast(context, python_ast, use_numba=use_numba, use_numpy=use_numpy)
+            python_ast = vectorize_innermost_loops(python_ast)
+        return compile_python_ast(python_ast, namespace)
+    return _compile_python_ast(python_ast, namespace, lambda node: _materialize_node(context, node, use_numba, use_numpy))
+
+
+def _transform_python_ast(context, python_ast, materialize_scalars, use_numba, use_numpy, vectorize_innermost):
+    if materialize_scalars:
+        python_ast = materialize_python_ast(context, python_ast, use_numba=use_numba, use_numpy=use_numpy or vectorize_innermost)
+    if vectorize_innermost:
+        python_ast = vectorize_innermost_loops(python_ast)
+    return python_ast
+
+
+def default_namespace(use_numba=False, use_numpy=False):
+    """Globals required by generated functions"""
+    from ..array import Array
+
+    namespace = {'Array': Array}
+    if use_numba or use_numpy:
+        import numpy
+        namespace['numpy'] = numpy
+    if use_numba:
+        import numba
+        namespace['numba'] = numba
+    return namespace
+
+
+def unparse_python_ast(python_ast):
+    """Python source of python ast generated by the backends"""
+    import astunparse # only required when source is requested
+
+    return astunparse.unparse(python_ast)[:-1] # remove newline
+
 
+def compile_python_ast(python_ast, namespace=None, filename='<moa>'):
+    """Compile python ast of function ``f`` to a function
+
+    The python ast generated by the backends wraps statements in
+    ``ast.Expr`` and uses dotted names such as ``numpy.zeros``. It is
+    normalized to a module accepted by ``compile``. The module is
+    kept as ``function.python_ast`` so that ``python_function_source``
+    can unparse it on demand.
+
+    python_ast: ast.FunctionDef or ast.Module
+    namespace: dict
+      globals of the function. Defaults to ``default_namespace()``
+    """
+    return _compile_python_ast(python_ast, default_namespace() if namespace is None else namespace, filename=filename)
+
+
+def python_function_source(function):
+    """Source of function compiled by ``compile_python_ast``"""
+    return unparse_python_ast(function.python_ast)
+
+
+def _compile_python_ast(python_ast, namespace, rewrite=None, filename='<moa>'):
+    if not isinstance(python_ast, ast.Module):
+        python_ast = ast.Module(body=[python_ast], type_ignores=[])
+    depth = _normalize_python_ast(python_ast, rewrite)
+
+    namespace = dict(namespace)
+    # compiling python ast is recursive
+    with recursion_limit(sys.getrecursionlimit() + 4 * depth):
+        exec(compile(python_ast, filename, 'exec'), namespace)
+    function = namespace['f']
+    function.python_ast = python_ast
+    return function
+
+
+_STATEMENT_FIELDS = {'body', 'orelse'}
+_LIST_FIELDS = {'posonlyargs', 'kwonlyargs', 'kw_defaults', 'defaults', 'decorator_list', 'type_ignores', 'type_params'}
+
+
+def _normalize_python_ast(python_ast, rewrite=None):
+    """Normalize backend python ast in place for ``compile``
+
+    Statements wrapped in ``ast.Expr`` are unwrapped, dotted names
+    become attribute lookups, missing contexts and locations are
+    filled in and ``rewrite(node)`` is applied to every node before it
+    is visited. Returns the depth of the python ast.
+    """
+    def _replace(node):
+        if rewrite is not None:
+            node = rewrite(node)
+        if isinstance(node, ast.Name) and '.' in node.id:
+            # dotted names e.g. numpy.zeros are attribute lookups
+            names = node.id.split('.')
+            node = ast.Name(id=names[0], ctx=ast.Load())
+            for attr in names[1:]:
+                node = ast.Attribute(value=node, attr=attr, ctx=ast.Load())
+        return node
+
+    depth = 0
+    stack = [(python_ast, 1)]
+    while stack:
+        node, node_depth = stack.pop()
+        depth = max(depth, node_depth)
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                if field in _STATEMENT_FIELDS:
+                    value = _unwrap_statements(value)
+                    if field == 'body' and not value:
+                        value = [ast.Pass()]
+                value = [_replace(element) if isinstance(element, ast.AST) else element for element in value]
+                stack.extend((element, node_depth + 1) for element in value if isinstance(element, ast.AST))
+                setattr(node, field, value)
+            elif isinstance(value, ast.AST):
+                value = _replace(value)
+                stack.append((value, node_depth + 1))
+                setattr(node, field, value)
+            elif value is None:
+                if field == 'ctx':
+                    node.ctx = ast.Load()
+                elif field in _LIST_FIELDS:
+                    setattr(node, field, [])
+
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                _store_context(target)
+        elif isinstance(node, ast.For):
+            _store_context(node.target)
+        # there is no source so every node is located at the first line
+        if 'lineno' in node._attributes:
+            node.lineno = node.end_lineno = 1
+            node.col_offset = node.end_col_offset = 0
+    return depth
+
+
+def _store_context(node):
+    node.ctx = ast.Store()
+    if isinstance(node, ast.Tuple):
+        for element in node.elts:
+            _store_context(element)
+
+
+def _materialize_node(context, node, use_numba, use_numpy):
+    """Node local replacements of ``materialize_python_ast``"""
+    if isinstance(node, ast.Name):
+        # scalar constants
+        symbol_node = context.symbol_table.get(node.id)
+        if symbol_node is not None and symbol_node.symbol != NodeSymbol.INDEX and (symbol_node.shape == () and symbol_node.value is not None and not has_symbolic_elements(symbol_node.value)):
+            return ast.Num(symbol_node.value[0])
+        elif node.id == 'Array' and (use_numba or use_numpy):
+            node.id = 'numpy.zeros'
+        elif node.id == 'prange':
+            node.id = 'numba.prange' if use_numba else 'range'
+    elif isinstance(node, ast.Attribute) and node.attr == 'shape' and isinstance(node.value, ast.Name) and _is_scalar_argument(context, node.value.id):
+        # scalar arguments e.g. indicies may be python or numpy scalars without shape
+        if use_numba or use_numpy:
+            return ast.Call(func=ast.Name(id='numpy.shape', ctx=ast.Load()), args=[node.value], keywords=[])
+        return ast.Call(func=ast.Name(id='getattr', ctx=ast.Load()), args=[node.value, ast.Str(s='shape'), ast.Tuple(elts=[], ctx=ast.Load())], keywords=[])
     # TODO: this will no longer be necissary with psi reduction
-    class ReplaceShapeIndex(ast.NodeTransformer):
-        def visit_Subscript(self, node):
-            if isinstance(node.value, ast.Attribute) and node.value.attr == 'shape':
-                return ast.Subscript(value=node.value,
-                                     slice=ast.Index(value=node.slice.value.elts[0]),
-                                     ctx=ast.Load())
-            return node
+    elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Attribute) and node.value.attr == 'shape':
+        # python >= 3.9 no longer wraps subscripts in ast.Index
+        index = node.slice.value if isinstance(node.slice, ast.Index) else node.slice
+        return ast.Subscript(value=node.value,
+                             slice=ast.Index(value=index.elts[0]),
+                             ctx=ast.Load())
+    elif isinstance(node, ast.FunctionDef) and use_numba:
+        node.decorator_list = [ast.Name(id='numba.jit', ctx=ast.Load())]
+    return node
 
-    class ReplaceWithNumba(ast.NodeTransformer):
-        def visit_FunctionDef(self, node):
-            node.decorator_list = [ast.Name(id='numba.jit', ctx=ast.Load())]
-            self.generic_visit(node)
-            return node
 
+def _is_scalar_argument(context, name):
+    symbol_node = context.symbol_table.get(name)
+    return symbol_node is not None and symbol_node.symbol == NodeSymbol.ARRAY and symbol_node.shape == () and symbol_node.value is None
+
+
+def materialize_python_ast(context, python_ast, use_numba=False, use_numpy=False):
+    """Replace scalar constants and shape indexing in python ast
+
+    All replacements are node local and applied in a single traversal.
+    """
+    class MaterializePythonAst(ast.NodeTransformer):
+        def generic_visit(self, node):
+            return _materialize_node(context, super().generic_visit(node), use_numba, use_numpy)
+
+    return MaterializePythonAst().visit(python_ast)
+
+
+# hybrid loops and numpy slices
+_REDUCTION_FUNCTION_MAP = {
+    ast.Add: 'numpy.sum',
+    ast.Sub: 'numpy.sum',
+    ast.Mult: 'numpy.prod',
+    ast.Div: 'numpy.prod',
+}
+
+
+def vectorize_innermost_loops(python_ast):
+    """Replace innermost loops with NumPy slice expressions
+
+    Only the outer loops remain as python loops so the interpreter
+    overhead is proportional to the number of outer iterations.
+
+    .. code-block:: python
+
+       for _i3 in range(0, n, 1):
+           _a12 = 0
+           for _i5 in range(0, m, 1):
+               _a12 = (_a12 + A[(_i3, _i5)])
+           _a10[(_i3,)] = _a12
+
+    becomes
+
+    .. code-block:: python
+
+       for _i3 in range(0, n, 1):
+           _a12 = 0
+           _a12 = (_a12 + numpy.sum(A[(_i3, slice(0, m, 1))]))
+           _a10[(_i3,)] = _a12
+
+    A loop is vectorized when its index is only used as an element of
+    array indicies, each written array element is indexed by the loop
+    index, and scalars are either accumulated with ``+-*/`` or written
+    before they are read (temporaries). Other loops are unchanged.
+    """
+    class VectorizeInnermostLoops(ast.NodeTransformer):
+        def visit_For(self, node):
+            if any(isinstance(_, ast.For) for _ in ast.walk(node) if _ is not node):
+                self.generic_visit(node)
+                return node
+            statements = _vectorize_loop(node)
+            if statements is None:
+                return node
+            return [ast.Expr(value=statement) for statement in statements]
+
+    return VectorizeInnermostLoops().visit(python_ast)
+
+
+def _unwrap_statements(body):
+    statements = []
+    for statement in body:
+        while isinstance(statement, ast.Expr) and isinstance(statement.value, (ast.stmt, list)):
+            statement = statement.value
+        if isinstance(statement, list):
+            statements.extend(_unwrap_statements(statement))
+        else:
+            statements.append(statement)
+    return statements
+
+
+def _subscript_elements(node):
+    index = node.slice.value if isinstance(node.slice, ast.Index) else node.slice
+    return index.elts if isinstance(index, ast.Tuple) else None
+
+
+def _names(node):
+    return [_.id for _ in ast.walk(node) if isinstance(_, ast.Name)]
+
+
+def _vectorize_loop(node):
+    """Statements replacing loop or None when loop can not be vectorized
+
+    Iterations touch disjoint elements of written arrays when every
+    access of a written array has the loop index at the same
+    position. The loop may then be distributed over its statements
+    and each statement evaluated for all indicies at once.
+    """
+    if not (isinstance(node.target, ast.Name) and isinstance(node.iter, ast.Call) and
+            isinstance(node.iter.func, ast.Name) and node.iter.func.id == 'range' and len(node.iter.args) == 3):
+        return None
+    index_name = node.target.id
+
+    statements = _unwrap_statements(node.body)
+    if not all(isinstance(statement, ast.Assign) and len(statement.targets) == 1 for statement in statements):
+        return None
+
+    # position of loop index in subscripts of each array
+    index_positions = {}
+    written_arrays = set()
+    for statement in statements:
+        for _node in ast.walk(statement):
+            if isinstance(_node, ast.Subscript):
+                elements = _subscript_elements(_node) if isinstance(_node.value, ast.Name) else None
+                if elements is None:
+                    return None
+                positions = tuple(i for i, element in enumerate(elements) if isinstance(element, ast.Name) and element.id == index_name)
+                if len(positions) > 1 or any(index_name in _names(element) for element in elements if not isinstance(element, ast.Name)):
+                    return None
+                index_positions.setdefault(_node.value.id, set()).add(positions)
+        target = statement.targets[0]
+        if isinstance(target, ast.Subscript):
+            written_arrays.add(target.value.id)
+    if any(len(index_positions[name]) != 1 or index_positions[name] == {()} for name in written_arrays):
+        return None
+
+    # scalars are temporaries (written before read) or accumulators
+    vectors = {index_name}
+    reductions = set()
+    assigned = set()
+    for statement in statements:
+        target, value = statement.targets[0], statement.value
+        reads = set(_names(value))
+        if reads & reductions:
+            # accumulators may only be read by their own update
+            return None
+        if isinstance(target, ast.Subscript):
+            if vectors & set(_names(target)) - {index_name}:
+                return None
+        elif isinstance(target, ast.Name) and target.id not in assigned:
+            name = target.id
+            if isinstance(value, ast.BinOp) and type(value.op) in _REDUCTION_FUNCTION_MAP and \
+               isinstance(value.left, ast.Name) and value.left.id == name and name not in _names(value.right):
+                if not (reads & vectors):
+                    return None
+                reductions.add(name)
+            elif name in reads or any(name in _names(_) for _ in statements[:statements.index(statement)]):
+                return None
+            elif reads & vectors:
+                vectors.add(name)
+            assigned.add(name)
+        else:
+            return None
+        if any(vectors & set(_names(element)) - {index_name}
+               for _node in ast.walk(value) if isinstance(_node, ast.Subscript)
+               for element in _subscript_elements(_node)):
+            return None
+
+    # loop index may only appear as an element of a subscript
+    num_index_elements = sum(
+        isinstance(element, ast.Name) and element.id == index_name
+        for statement in statements for _node in ast.walk(statement) if isinstance(_node, ast.Subscript)
+        for element in _subscript_elements(_node))
+    if num_index_elements != sum(_names(statement).count(index_name) for statement in statements):
+        return None
+
+    index_slice = ast.Call(func=ast.Name(id='slice', ctx=ast.Load()), args=list(node.iter.args), keywords=[])
+
+    class ReplaceIndex(ast.NodeTransformer):
         def visit_Name(self, node):
-            if node.id == 'Array':
-                node.id = 'numpy.zeros'
+            if node.id == index_name:
+                return index_slice
             return node
 
-    if materialize_scalars:
-        python_ast = ReplaceScalars().visit(python_ast)
-        python_ast = ReplaceShapeIndex().visit(python_ast)
-        if use_numba:
-            python_ast = ReplaceWithNumba().visit(python_ast)
+    vectorized_statements = []
+    for statement in statements:
+        statement = ReplaceIndex().visit(statement)
+        target, value = statement.targets[0], statement.value
+        if isinstance(target, ast.Name) and target.id in reductions:
+            value = ast.BinOp(left=value.left, op=value.op, right=ast.Call(
+                func=ast.Name(id=_REDUCTION_FUNCTION_MAP[type(value.op)], ctx=ast.Load()), args=[value.right], keywords=[]))
+            statement = ast.Assign(targets=[target], value=value)
+        vectorized_statements.append(statement)
+    return vectorized_statements
+
+
+def python_ast_depth(python_ast):
+    depth = 0
+    stack = [(python_ast, 1)]
+    while stack:
+        node, node_depth = stack.pop()
+        depth = max(depth, node_depth)
+        if isinstance(node, list):
+            children = node
+        else:
+            children = ast.iter_child_nodes(node)
+        stack.extend((child, node_depth + 1) for child in children)
+    return depth
+
+
+@contextlib.contextmanager
+def recursion_limit(limit):
+    previous_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, previous_limit))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(previous_limit)
+
+
+def python_ast_recursion_limit(python_ast):
+    """Recursion limit for recursive transformers and unparsing of python ast"""
+    return recursion_limit(sys.getrecursionlimit() + 4 * python_ast_depth(python_ast))
+
+
+def split_prologue(statements):
+    """Split ONF function statements into prologue and body
+
+    Argument checks and shape assignments precede array
+    initializations and loops.
+    """
+    num_prologue = 0
+    while num_prologue < len(statements) and statements[num_prologue].symbol[0] not in {NodeSymbol.INITIALIZE, NodeSymbol.LOOP}:
+        num_prologue += 1
+    return statements[:num_prologue], statements[num_prologue:]
 
-    return astunparse.unparse(python_ast)[:-1] # remove newline
+
+def index_arguments(context):
+    """Names of ONF function arguments used within indicies of arrays"""
+    argument_names = context.ast.attrib[0]
+    names = set()
+    for node in iterate_nodes((context.ast,)):
+        if node.symbol == (NodeSymbol.PSI,):
+            for element in context.symbol_table[node.child[0].attrib[0]].value:
+                if is_symbolic_element(element):
+                    names.update(_node.attrib[0] for _node in iterate_nodes((element,)) if _node.symbol == (NodeSymbol.ARRAY,))
+    return tuple(name for name in argument_names if name in names)
+
+
+# python ast function registry
+_NODE_AST_MAP = {}
+
+
+def register_ast_function(symbol, ast_function):
+    """Register function converting node with symbol to python ast
+
+    symbol: tuple
+      node symbol e.g. ``(NodeSymbol.PLUS,)``
+    ast_function: function
+      function that takes context with children converted to python
+      ast and returns context with node converted to python ast
+    """
+    if symbol in _NODE_AST_MAP:
+        raise ValueError(f'python ast function for symbol {symbol} already registered with {_NODE_AST_MAP[symbol].__name__}')
+    _NODE_AST_MAP[symbol] = ast_function
 
 
 def _ast_replacement(context):
-    _NODE_AST_MAP = {
-        (NodeSymbol.ARRAY,): _ast_array,
-        (NodeSymbol.INDEX,): _ast_array,
-        (NodeSymbol.FUNCTION,): _ast_function,
-        (NodeSymbol.CONDITION,): _ast_condition,
-        (NodeSymbol.BLOCK,): _ast_block,
-        (NodeSymbol.ERROR,): _ast_error,
-        (NodeSymbol.ASSIGN,): _ast_assignment,
-        (NodeSymbol.INITIALIZE,): _ast_initialize,
-        (NodeSymbol.LOOP,): _ast_loop,
-        (NodeSymbol.SHAPE,): _ast_shape,
-        (NodeSymbol.DIM,): _ast_dimension,
-        (NodeSymbol.PSI,): _ast_psi,
-        (NodeSymbol.PLUS,): _ast_plus_minus_times_divide,
-        (NodeSymbol.MINUS,): _ast_plus_minus_times_divide,
-        (NodeSymbol.TIMES,): _ast_plus_minus_times_divide,
-        (NodeSymbol.DIVIDE,): _ast_plus_minus_times_divide,
-        (NodeSymbol.EQUAL,): _ast_comparison_operations,
-        (NodeSymbol.NOTEQUAL,): _ast_comparison_operations,
-        (NodeSymbol.LESSTHAN,): _ast_comparison_operations,
-        (NodeSymbol.LESSTHANEQUAL,): _ast_comparison_operations,
-        (NodeSymbol.GREATERTHAN,): _ast_comparison_operations,
-        (NodeSymbol.GREATERTHANEQUAL,): _ast_comparison_operations,
-        (NodeSymbol.AND,): _ast_boolean_binary_operations,
-        (NodeSymbol.OR,): _ast_boolean_binary_operations,
-        (NodeSymbol.NOT,): _ast_boolean_unary_operations,
-    }
     return _NODE_AST_MAP[context.ast.symbol](context)
 
 
@@ -135,9 +532,11 @@ def _ast_assignment(context):
 
 def _ast_loop(context):
     node_symbol = select_array_node_symbol(context)
+    # parallel loops are materialized as numba.prange or range
+    range_name = 'prange' if context.ast.symbol == (NodeSymbol.LOOP, NodeSymbol.PARALLEL) else 'range'
     return create_context(
         ast=ast.For(target=ast.Name(id=context.ast.attrib[0]),
-                iter=ast.Call(func=ast.Name(id='range'),
+                iter=ast.Call(func=ast.Name(id=range_name),
                               args=[
                                   _ast_element(context, node_symbol.value[0]),
                                   _ast_element(context, node_symbol.value[1]),
@@ -173,15 +572,17 @@ def _ast_dimension(context):
         symbol_table=context.symbol_table)
 
 
+_BINOP_MAP = {
+    (NodeSymbol.PLUS,): ast.Add,
+    (NodeSymbol.MINUS,): ast.Sub,
+    (NodeSymbol.TIMES,): ast.Mult,
+    (NodeSymbol.DIVIDE,): ast.Div,
+}
+
+
 def _ast_plus_minus_times_divide(context):
-    binop_map = {
-        (NodeSymbol.PLUS,): ast.Add,
-        (NodeSymbol.MINUS,): ast.Sub,
-        (NodeSymbol.TIMES,): ast.Mult,
-        (NodeSymbol.DIVIDE,): ast.Div,
-    }
     return create_context(
-        ast=ast.BinOp(left=select_node(context, (0,)).ast, op=binop_map[context.ast.symbol](), right=select_node(context, (1,)).ast),
+        ast=ast.BinOp(left=select_node(context, (0,)).ast, op=_BINOP_MAP[context.ast.symbol](), right=select_node(context, (1,)).ast),
         symbol_table=context.symbol_table)
 
 
@@ -197,37 +598,68 @@ def _ast_condition(context):
         symbol_table=context.symbol_table)
 
 
+_COMPARISON_MAP = {
+    (NodeSymbol.EQUAL,): ast.Eq,
+    (NodeSymbol.NOTEQUAL,): ast.NotEq,
+    (NodeSymbol.LESSTHAN,): ast.Lt,
+    (NodeSymbol.LESSTHANEQUAL,): ast.LtE,
+    (NodeSymbol.GREATERTHAN,): ast.Gt,
+    (NodeSymbol.GREATERTHANEQUAL,): ast.GtE,
+}
+
+
 def _ast_comparison_operations(context):
-    comparision_map = {
-        (NodeSymbol.EQUAL,): ast.Eq,
-        (NodeSymbol.NOTEQUAL,): ast.NotEq,
-        (NodeSymbol.LESSTHAN,): ast.Lt,
-        (NodeSymbol.LESSTHANEQUAL,): ast.LtE,
-        (NodeSymbol.GREATERTHAN,): ast.Gt,
-        (NodeSymbol.GREATERTHANEQUAL,): ast.GtE,
-    }
     return create_context(
         ast=ast.Compare(left=select_node(context, (0,)).ast,
-                        ops=[comparision_map[context.ast.symbol]()],
+                        ops=[_COMPARISON_MAP[context.ast.symbol]()],
                         comparators=[select_node(context, (1,)).ast]),
         symbol_table=context.symbol_table)
 
 
+_BOOLEAN_BINARY_MAP = {
+    (NodeSymbol.AND,): ast.And,
+    (NodeSymbol.OR,): ast.Or
+}
+
+
 def _ast_boolean_binary_operations(context):
-    boolean_map = {
-        (NodeSymbol.AND,): ast.And,
-        (NodeSymbol.OR,): ast.Or
-    }
     return create_context(
-        ast=ast.BoolOp(op=boolean_map[context.ast.symbol](), values=[
+        ast=ast.BoolOp(op=_BOOLEAN_BINARY_MAP[context.ast.symbol](), values=[
             select_node(context, (0,)).ast, select_node(context, (1,)).ast]),
         symbol_table=context.symbol_table)
 
 
+_BOOLEAN_UNARY_MAP = {
+    (NodeSymbol.NOT,): ast.Not
+}
+
+
 def _ast_boolean_unary_operations(context):
-    boolean_map = {
-        (NodeSymbol.NOT,): ast.Not
-    }
     return create_context(
-        ast=ast.UnaryOp(op=boolean_map[context.ast.symbol](), operand=select_node(context, (0,)).ast),
+        ast=ast.UnaryOp(op=_BOOLEAN_UNARY_MAP[context.ast.symbol](), operand=select_node(context, (0,)).ast),
         symbol_table=context.symbol_table)
+
+
+# core python ast functions
+register_ast_function((NodeSymbol.ARRAY,), _ast_array)
+register_ast_function((NodeSymbol.INDEX,), _ast_array)
+register_ast_function((NodeSymbol.FUNCTION,), _ast_function)
+register_ast_function((NodeSymbol.CONDITION,), _ast_condition)
+register_ast_function((NodeSymbol.BLOCK,), _ast_block)
+register_ast_function((NodeSymbol.ERROR,), _ast_error)
+register_ast_function((NodeSymbol.ASSIGN,), _ast_assignment)
+register_ast_function((NodeSymbol.INITIALIZE,), _ast_initialize)
+register_ast_function((NodeSymbol.LOOP,), _ast_loop)
+register_ast_function((NodeSymbol.LOOP, NodeSymbol.PARALLEL), _ast_loop)
+register_ast_function((NodeSymbol.SHAPE,), _ast_shape)
+register_ast_function((NodeSymbol.DIM,), _ast_dimension)
+register_ast_function((NodeSymbol.PSI,), _ast_psi)
+for symbol in _BINOP_MAP:
+    register_ast_function(symbol, _ast_plus_minus_times_divide)
+for symbol in _COMPARISON_MAP:
+    register_ast_function(symbol, _ast_comparison_operations)
+for symbol in _BOOLEAN_BINARY_MAP:
+    register_ast_function(symbol, _ast_boolean_binary_operations)
+for symbol in _BOOLEAN_UNARY_MAP:
+    register_ast_function(symbol, _ast_boolean_unary_operations)
+del symbol
@@ -0,0 +1,326 @@
+"""Caching of compiled MOA expressions
+
+"""
+import collections
+import contextlib
+import enum
+import functools
+import hashlib
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import __version__
+from .exception import MOAException
+
+
+class MOACacheError(MOAException):
+    pass
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def context_key(context):
+    """Canonical hashable representation of a MOA context
+
+    The ast is a tree of tuples and is therefore already hashable. The
+    symbol table is order independent so it is sorted by symbol name.
+    """
+    return (context.ast, tuple(sorted(context.symbol_table.items())))
+
+
+def stable_repr(value):
+    """Representation of cache key that is identical across processes
+
+    ``repr`` of functions (e.g. optimization passes) and partials
+    includes memory addresses. Functions are represented by their
+    qualified name and partials by their function, arguments and
+    keywords. Raises ``MOACacheError`` for values without a stable
+    representation such as lambdas and local functions. An explicit
+    stack is used so that deep asts are not limited by the python
+    recursion limit.
+    """
+    parts = []
+    # stack of (is literal, value)
+    stack = [(False, value)]
+    while stack:
+        literal, value = stack.pop()
+        if literal:
+            parts.append(value)
+        elif value is None or isinstance(value, (bool, int, float, complex, str, bytes, enum.Enum)):
+            parts.append(repr(value))
+        elif isinstance(value, (tuple, list)):
+            # namedtuples e.g. ast nodes and backend options are named
+            name = type(value).__qualname__ if hasattr(value, '_fields') else ''
+            stack.append((True, ']' if isinstance(value, list) else ')'))
+            for element in reversed(value):
+                stack.extend(((True, ', '), (False, element)))
+            stack.append((True, name + ('[' if isinstance(value, list) else '(')))
+        elif isinstance(value, (set, frozenset)):
+            parts.append('{' + ', '.join(sorted(stable_repr(element) for element in value)) + '}')
+        elif isinstance(value, dict):
+            parts.append('{' + ', '.join(sorted(f'{stable_repr(k)}: {stable_repr(v)}' for k, v in value.items())) + '}')
+        elif isinstance(value, functools.partial):
+            parts.append('partial' + stable_repr((value.func, value.args, value.keywords)))
+        elif isinstance(value, (types.FunctionType, types.BuiltinFunctionType, type)) and '<' not in value.__qualname__:
+            parts.append(f'{value.__module__}.{value.__qualname__}')
+        else:
+            raise MOACacheError(f'cache key element {value!r} has no representation that is stable across processes')
+    return ''.join(parts)
+
+
+def default_cache_dir():
+    """Per user cache directory of compiled kernels
+
+    Environment variable ``MOA_CACHE_DIR`` or "moa" within
+    ``XDG_CACHE_HOME`` (default "~/.cache").
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.environ.get('MOA_CACHE_DIR') or os.path.join(cache_home, 'moa')
+
+
+def secure_directory(directory):
+    """Create directory with mode 0700 and check that only the user may write to it
+
+    Files loaded as executable code from a directory writable by
+    other users could have been planted. Raises ``MOACacheError``
+    when directory is not owned by the user or is group or world
+    writable.
+    """
+    directory = os.path.abspath(directory)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    check_owner(directory)
+    return directory
+
+
+def check_owner(path):
+    """Raise ``MOACacheError`` unless path is owned by the user and not writable by others"""
+    if not hasattr(os, 'getuid'):
+        return
+
+    stat = os.stat(path)
+    if stat.st_uid != os.getuid():
+        raise MOACacheError(f'{path} is not owned by the current user')
+    if stat.st_mode & 0o022:
+        raise MOACacheError(f'{path} is writable by other users')
+
+
+class LRUCache:
+    """Least recently used cache with a bounded number of entries
+
+    maxsize: int
+      maximum number of entries stored in cache. None for unbounded
+    """
+    def __init__(self, maxsize=128):
+        self._maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        self._maxsize = maxsize
+        self._evict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def get(self, key, default=None):
+        try:
+            value = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        if self._maxsize is None:
+            return
+
+        while len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return CacheInfo(hits=self.hits, misses=self.misses, maxsize=self._maxsize, currsize=len(self._cache))
+
+
+class DiskCache:
+    """Size bounded on disk cache of generated kernel source
+
+    Entries are python source files named by a digest of the cache
+    key and the moa version. Entries are executed so the directory
+    and each entry must be owned by the user and not writable by
+    others (see ``secure_directory``). Files are written to a temporary file
+    and atomically renamed so readers never see partial entries while
+    writers and eviction are serialized with a lock file. Numba
+    caches compiled kernels in ``__pycache__`` next to the source when
+    loaded with ``load_module``.
+
+    directory: str
+      directory to store cached kernels
+    maxsize: int
+      maximum total size in bytes of cached source. None for unbounded
+    """
+    SUFFIX = '.py'
+    LOCK_FILENAME = '.lock'
+
+    def __init__(self, directory, maxsize=64 * 1024 * 1024):
+        self.directory = secure_directory(directory)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, key):
+        """Name of entry for key. Raises ``MOACacheError`` for keys without ``stable_repr``"""
+        return 'moa_' + hashlib.sha256(stable_repr((__version__, key)).encode('utf-8')).hexdigest()
+
+    def supports(self, key):
+        try:
+            self.digest(key)
+        except MOACacheError:
+            return False
+        return True
+
+    def path(self, key):
+        return os.path.join(self.directory, self.digest(key) + self.SUFFIX)
+
+    def get(self, key, default=None):
+        path = self.path(key)
+        try:
+            check_owner(path)
+            with open(path, encoding='utf-8') as f:
+                source = f.read()
+            os.utime(path) # recently used entries are evicted last
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return source
+
+    def set(self, key, source):
+        path = self.path(key)
+        with self._lock():
+            fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(source)
+                os.replace(temporary_path, path)
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+            self._evict()
+
+    def load_module(self, key, namespace=None):
+        """Import cached source as module with namespace as globals
+
+        Numba dispatchers within the module have on disk caching
+        enabled which is only possible for functions defined in files.
+        """
+        path = self.path(key)
+        check_owner(path)
+        # numba loads pickled kernels from __pycache__
+        pycache_directory = os.path.join(self.directory, '__pycache__')
+        if os.path.isdir(pycache_directory):
+            check_owner(pycache_directory)
+        spec = importlib.util.spec_from_file_location(self.digest(key), path)
+        module = importlib.util.module_from_spec(spec)
+        module.__dict__.update(namespace or {})
+        # numba imports the module by name when loading cached kernels
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+
+        for value in tuple(vars(module).values()):
+            if hasattr(value, 'enable_caching'):
+                value.enable_caching()
+        return module
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.SUFFIX) and entry.is_file():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+
+        entries = self._entries()
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_size <= self.maxsize:
+                break
+            self._remove(path)
+            total_size -= size
+
+    def _remove(self, path):
+        self._remove_file(path)
+
+        # numba index and data files are prefixed by module name
+        prefix = os.path.basename(path)[:-len(self.SUFFIX)] + '.'
+        pycache_directory = os.path.join(self.directory, '__pycache__')
+        if os.path.isdir(pycache_directory):
+            for entry in os.scandir(pycache_directory):
+                if entry.name.startswith(prefix):
+                    self._remove_file(entry.path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @contextlib.contextmanager
+    def _lock(self):
+        with open(os.path.join(self.directory, self.LOCK_FILENAME), 'w') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def clear(self):
+        with self._lock():
+            for _, _, path in self._entries():
+                self._remove(path)
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        entries = self._entries()
+        return CacheInfo(hits=self.hits, misses=self.misses, maxsize=self.maxsize, currsize=sum(size for _, size, _ in entries))
@@ -0,0 +1,395 @@
+"""Compact struct of arrays encoding of the MOA ast
+
+A ``Node`` namedtuple per node costs hundreds of bytes. ``CompactAST``
+stores nodes in flat arrays instead: an integer opcode indexing a table
+of node symbols, indicies into pools of distinct shapes and attributes,
+and child offsets into a flat array of child node ids (compressed
+sparse row). Nodes are only appended and children always have smaller
+ids than their parents, so arrays in id order are in postorder.
+
+Passes run directly on the encoding. For each visited node only a
+small window of ``Node`` objects is materialized, two levels deep,
+which is what shape functions and DNF reduction rules inspect. Nodes
+below the window are represented by references to their id and are
+never decoded. Windows are short lived and never interned. Rewritten
+nodes are appended to the arena. For 10^5 nodes the shape and DNF
+passes need less than half the memory of the ``Node`` passes and
+take within about 20% of their time (see
+``benchmarks/test_compiler.py``).
+"""
+import array
+import collections
+
+from . import ast, shape, dnf
+
+
+CompactContext = collections.namedtuple(
+    'CompactContext', ['ast', 'root', 'symbol_table'])
+
+
+_CompactRefBase = collections.namedtuple(
+    'Node', ['symbol', 'shape', 'attrib', 'child', 'index'])
+
+
+class _CompactRef(_CompactRefBase):
+    """Node materialized from CompactAST remembering its id
+
+    Nodes at the bottom of a window have their children hidden
+    (``child == ()``) and must not be inspected further. The id is
+    part of the tuple so that references are never confused with
+    nodes that merely look the same within the window. References
+    are not ``Node`` subclasses and thus never interned.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        raise TypeError('compact node references cannot be pickled')
+
+
+class _Pool:
+    """Interns values to integer indicies"""
+    def __init__(self):
+        self.values = []
+        self._index = {}
+        # values decoded from the pool are added back as the same
+        # objects so look them up by identity before hashing
+        self._identity = {}
+
+    def add(self, value):
+        index = self._identity.get(id(value))
+        if index is not None:
+            return index
+
+        try:
+            return self._index[value]
+        except KeyError:
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+            self._identity[id(value)] = index
+            return index
+
+    def __len__(self):
+        return len(self.values)
+
+
+class CompactAST:
+    """Append only arena of MOA ast nodes stored as arrays"""
+    def __init__(self):
+        self.symbols = _Pool()
+        self.shapes = _Pool()
+        self.attribs = _Pool()
+        self.opcode = array.array('H')
+        self.shape = array.array('l')
+        self.attrib = array.array('l')
+        self.child_offset = array.array('l', [0])
+        self.children = array.array('l')
+
+    def __len__(self):
+        return len(self.opcode)
+
+    def add_node(self, symbol, shape, attrib, child_ids):
+        self.opcode.append(self.symbols.add(symbol))
+        self.shape.append(-1 if shape is None else self.shapes.add(shape))
+        self.attrib.append(self.attribs.add(attrib))
+        self.children.extend(child_ids)
+        self.child_offset.append(len(self.children))
+        return len(self.opcode) - 1
+
+    def node_symbol(self, index):
+        return self.symbols.values[self.opcode[index]]
+
+    def node_shape(self, index):
+        shape_index = self.shape[index]
+        return None if shape_index == -1 else self.shapes.values[shape_index]
+
+    def node_attrib(self, index):
+        return self.attribs.values[self.attrib[index]]
+
+    def node_children(self, index):
+        return self.children[self.child_offset[index]:self.child_offset[index+1]]
+
+    def parents(self, root):
+        """Parent id of each node reachable from root (-1 otherwise)"""
+        parent = array.array('l', [-1]) * len(self)
+        stack = [root]
+        while stack:
+            index = stack.pop()
+            for child_index in self.node_children(index):
+                parent[child_index] = index
+                stack.append(child_index)
+        return parent
+
+    def encode(self, node):
+        """Append node and its descendants returning id of node
+
+        Subtrees that are references into this arena are not copied.
+        """
+        if isinstance(node, _CompactRef):
+            return node.index
+
+        # stack of (node, remaining children of node, child ids of node)
+        stack = [(node, iter(node.child), [])]
+        while True:
+            node, child_nodes, child_ids = stack[-1]
+            for child_node in child_nodes:
+                if isinstance(child_node, _CompactRef):
+                    child_ids.append(child_node.index)
+                else:
+                    stack.append((child_node, iter(child_node.child), []))
+                    break
+            else:
+                index = self.add_node(node.symbol, node.shape, node.attrib, child_ids)
+                stack.pop()
+                if not stack:
+                    return index
+                stack[-1][2].append(index)
+
+    def decode(self, root):
+        """Build ``Node`` tree for node id"""
+        reachable = set()
+        stack = [root]
+        while stack:
+            index = stack.pop()
+            if index not in reachable:
+                reachable.add(index)
+                stack.extend(self.node_children(index))
+
+        # children have smaller ids than parents
+        nodes = {}
+        for index in sorted(reachable):
+            nodes[index] = ast.Node(
+                self.node_symbol(index), self.node_shape(index), self.node_attrib(index),
+                tuple(nodes[child_index] for child_index in self.node_children(index)))
+        return nodes[root]
+
+    def window(self, index, depth=2, child_ids=None):
+        """Materialize node with descendants up to depth
+
+        The node itself is a plain ``Node`` while its descendants are
+        references into the arena. child_ids replaces the children of
+        the node. Neither is interned since windows are short lived.
+        """
+        symbols, opcode = self.symbols.values, self.opcode
+        shapes, shape = self.shapes.values, self.shape
+        attribs, attrib = self.attribs.values, self.attrib
+        children, child_offset = self.children, self.child_offset
+
+        def _reference(index, depth):
+            if depth == 0:
+                child = ()
+            else:
+                child = tuple([_reference(child_index, depth - 1) for child_index in children[child_offset[index]:child_offset[index+1]]])
+            shape_index = shape[index]
+            return tuple.__new__(_CompactRef, (
+                symbols[opcode[index]], None if shape_index == -1 else shapes[shape_index], attribs[attrib[index]], child, index))
+
+        if child_ids is None:
+            child_ids = children[child_offset[index]:child_offset[index+1]]
+        shape_index = shape[index]
+        return tuple.__new__(ast.Node, (
+            symbols[opcode[index]], None if shape_index == -1 else shapes[shape_index], attribs[attrib[index]],
+            tuple([_reference(child_index, depth - 1) for child_index in child_ids])))
+
+    def collect(self, root):
+        """Return new arena with only nodes reachable from root and new root id"""
+        compact_ast = CompactAST()
+        mapping = {}
+        stack = [(root, False)]
+        while stack:
+            index, visited = stack.pop()
+            if index in mapping:
+                continue
+            if visited:
+                mapping[index] = compact_ast.add_node(
+                    self.node_symbol(index), self.node_shape(index), self.node_attrib(index),
+                    [mapping[child_index] for child_index in self.node_children(index)])
+            else:
+                stack.append((index, True))
+                stack.extend((child_index, False) for child_index in reversed(self.node_children(index)))
+        return compact_ast, mapping[root]
+
+
+# conversion
+def from_context(context):
+    compact_ast = CompactAST()
+    root = compact_ast.encode(context.ast)
+    return CompactContext(ast=compact_ast, root=root, symbol_table=context.symbol_table)
+
+
+def to_context(compact_context):
+    return ast.create_context(
+        ast=compact_context.ast.decode(compact_context.root),
+        symbol_table=compact_context.symbol_table)
+
+
+# traversal
+def _replace(compact_ast, index, symbol_table, replacement_function, depth, child_ids=None):
+    context = replacement_function(ast.create_context(
+        ast=compact_ast.window(index, depth, child_ids), symbol_table=symbol_table))
+    if context is None:
+        return None
+    return compact_ast.encode(context.ast), context.symbol_table
+
+
+def compact_node_traversal(compact_context, replacement_function, traversal, max_iterations=range(100), depth=2, applies=None):
+    """``ast.node_traversal`` operating on the compact encoding
+
+    depth: int
+      number of levels below the node that replacement_function
+      inspects. Deeper nodes have their children hidden.
+    applies: callable
+      preorder only. ``applies(compact_ast, index)`` is False when
+      replacement_function is known not to apply to the node which is
+      then not materialized. None for all nodes
+    """
+    compact_ast = compact_context.ast
+    symbol_table = compact_context.symbol_table
+
+    def _replace_until_fixpoint(index, symbol_table):
+        for iteration in max_iterations:
+            if applies is not None and not applies(compact_ast, index):
+                return index, symbol_table
+            result = _replace(compact_ast, index, symbol_table, replacement_function, depth)
+            if result is None:
+                return index, symbol_table
+            index, symbol_table = result
+        raise ast.MOAReplacementError(f'reduction failed to complete in max_iterations')
+
+    root = compact_context.root
+    if traversal == 'preorder':
+        root, symbol_table = _replace_until_fixpoint(root, symbol_table)
+
+    # stack of (node id, child ids of node, replaced child ids)
+    stack = [(root, compact_ast.node_children(root), [])]
+    while True:
+        index, node_child_ids, child_ids = stack[-1]
+        if len(child_ids) < len(node_child_ids):
+            child_index = node_child_ids[len(child_ids)]
+            if traversal == 'preorder':
+                child_index, symbol_table = _replace_until_fixpoint(child_index, symbol_table)
+            stack.append((child_index, compact_ast.node_children(child_index), []))
+            continue
+
+        stack.pop()
+        if traversal == 'postorder':
+            index, symbol_table = _replace(compact_ast, index, symbol_table, replacement_function, depth, child_ids)
+        elif node_child_ids.tolist() != child_ids:
+            index = compact_ast.add_node(compact_ast.node_symbol(index), compact_ast.node_shape(index), compact_ast.node_attrib(index), child_ids)
+
+        if not stack:
+            return CompactContext(ast=compact_ast, root=index, symbol_table=symbol_table)
+        stack[-1][2].append(index)
+
+
+def rewrite_to_fixpoint(compact_context, replacement_function, max_rewrites=None, depth=2, applies=None):
+    """``ast.rewrite_to_fixpoint`` operating on the compact encoding
+
+    Node ids at the fixpoint are recorded and skipped when they
+    reappear in a rewritten subtree. Ids are never reused since the
+    arena is append only.
+
+    depth: int
+      number of levels below the node that replacement_function
+      inspects. Deeper nodes have their children hidden.
+    applies: callable
+      ``applies(compact_ast, index)`` is False when
+      replacement_function is known not to apply to the node which is
+      then not materialized. None for all nodes
+
+    Returns the rewritten context and the number of rewrites.
+    """
+    compact_ast = compact_context.ast
+    symbol_table = compact_context.symbol_table
+    num_rewrites = 0
+
+    def _rewrite(index):
+        nonlocal num_rewrites, symbol_table
+        while True:
+            if applies is not None and not applies(compact_ast, index):
+                return index
+            result = _replace(compact_ast, index, symbol_table, replacement_function, depth)
+            if result is None:
+                return index
+
+            num_rewrites += 1
+            if max_rewrites is not None and num_rewrites > max_rewrites:
+                raise ast.MOAReplacementError(f'rewriting did not reach fixpoint within {max_rewrites} rewrites')
+            index, symbol_table = result
+
+    normalized = set()
+
+    # stack of (node id, child ids of node, rewritten child ids)
+    root = _rewrite(compact_context.root)
+    stack = [(root, compact_ast.node_children(root), [])]
+    while True:
+        index, node_child_ids, child_ids = stack[-1]
+        if len(child_ids) < len(node_child_ids):
+            child_index = node_child_ids[len(child_ids)]
+            if child_index not in normalized:
+                child_index = _rewrite(child_index)
+            if child_index in normalized:
+                child_ids.append(child_index)
+            else:
+                stack.append((child_index, compact_ast.node_children(child_index), []))
+            continue
+
+        stack.pop()
+        if node_child_ids.tolist() != child_ids:
+            index = compact_ast.add_node(compact_ast.node_symbol(index), compact_ast.node_shape(index), compact_ast.node_attrib(index), child_ids)
+            replacement_index = _rewrite(index)
+            if replacement_index != index:
+                if replacement_index in normalized:
+                    index = replacement_index
+                else:
+                    stack.append((replacement_index, compact_ast.node_children(replacement_index), []))
+                    continue
+        normalized.add(index)
+
+        if not stack:
+            return CompactContext(ast=compact_ast, root=index, symbol_table=symbol_table), num_rewrites
+        stack[-1][2].append(index)
+
+
+# passes
+#
+# nodes built by the replacement functions are encoded into the arena
+# right away so they are not interned even within a compilation scope
+def calculate_shapes(compact_context):
+    with ast.intern_scope(enabled=False):
+        return compact_node_traversal(compact_context, shape._shape_replacement, traversal='postorder')
+
+
+def reduce_to_dnf(compact_context, max_rewrites=None):
+    """``dnf.reduce_to_dnf`` operating on the compact encoding
+
+    max_rewrites: int
+      maximum number of rule applications. None for unlimited
+    """
+    with ast.intern_scope(enabled=False):
+        compact_ast = compact_context.ast
+        index, symbol_table = _replace(compact_ast, compact_context.root, compact_context.symbol_table, dnf.add_indexing_node, depth=1)
+        compact_context = CompactContext(ast=compact_ast, root=index, symbol_table=symbol_table)
+        compact_context, num_rewrites = rewrite_to_fixpoint(compact_context, dnf._reduce_replacement, max_rewrites=max_rewrites, applies=_reduction_filter())
+        return compact_context
+
+
+def _reduction_filter():
+    """Whether a DNF reduction rule may match node from the opcodes of node and its children
+
+    Mirrors the rule lookup of ``dnf.select_reduction_rule`` such that
+    nodes without candidate rules are skipped without materializing
+    their window.
+    """
+    # (opcode, child opcodes) -> any candidate rules
+    candidates = {}
+
+    def _applies(compact_ast, index):
+        opcode = compact_ast.opcode
+        key = (opcode[index], tuple([opcode[child_index] for child_index in compact_ast.node_children(index)]))
+        if key not in candidates:
+            symbol = compact_ast.symbols.values[key[0]]
+            rule_keys = [(symbol, i, compact_ast.symbols.values[child_opcode]) for i, child_opcode in enumerate(key[1])]
+            rule_keys.extend(((symbol, None, None), (None, None, None)))
+            candidates[key] = any(rule_key in dnf._REDUCTION_RULES for rule_key in rule_keys)
+        return candidates[key]
+    return _applies
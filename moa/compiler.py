@@ -1,15 +1,280 @@
-from moa.shape import calculate_shapes
+import functools
+import os
+
+from moa import ast
+from moa.shape import calculate_shapes, specialize_shapes
 from moa.dnf import reduce_to_dnf
-from moa.onf import reduce_to_onf
-from moa.backend import generate_python_source
+from moa.onf import reduce_to_onf, determine_function_arguments
+from moa.optimize import optimize as optimize_onf, parallelize_loops, DEFAULT_PASSES, SPECIALIZED_PASSES, PYTHON_PASSES, PYTHON_SPECIALIZED_PASSES
+from moa.backend import generate_python_source, generate_numpy_source, generate_numba_source, generate_c_source, generate_llvm_ir
+from moa.backend import generate_python_function, load_c_function, load_llvm_function
+from moa.backend.python import default_namespace
+from moa.cache import LRUCache, DiskCache, MOACacheError, context_key, default_cache_dir
 
 
-def compiler(context, backend='python', include_conditions=True, use_numba=False):
-    shape_context = calculate_shapes(context)
-    dnf_context = reduce_to_dnf(shape_context)
-    onf_context = reduce_to_onf(dnf_context, include_conditions=include_conditions)
+compiler_cache = LRUCache(maxsize=256)
+function_cache = LRUCache(maxsize=256)
 
-    if backend == 'python':
-        return generate_python_source(onf_context, materialize_scalars=True, use_numba=use_numba)
+
+@ast.interned
+def compiler(context, backend='python', include_conditions=True, use_numba=False, use_cache=True, cache_dir=None, stats=None, optimize=True, numba_options=None, llvm_options=None):
+    """Compile MOA context to source for the given backend
+
+    backend: str
+      "python" emits loops over every index. "numpy" emits whole
+      array NumPy operations falling back to loops over NumPy arrays
+      when the expression can not be vectorized. "numba" emits loops
+      over NumPy arrays compiled with ``numba.jit``. "c" emits C
+      source to be compiled and loaded with
+      ``moa.backend.load_c_function``. "llvm" emits LLVM IR to be
+      JIT compiled with ``moa.backend.load_llvm_function``
+
+    Results are memoized in ``compiler_cache`` keyed by the structure
+    of the context and the compiler options. When ``cache_dir`` (or
+    environment variable ``MOA_CACHE_DIR``) is set generated source is
+    additionally shared across processes through a ``DiskCache``
+    unless a pass has no ``moa.cache.stable_repr`` (e.g. a lambda).
+
+    stats: moa.stats.CompileStats
+      optionally record timing and statistics of each stage
+    optimize: bool or Sequence[callable]
+      apply ONF optimizations ``default_passes(backend, use_numba)`` or the
+      given passes e.g. ``functools.partial(tile_loops, tile_size=64)``
+    numba_options: moa.backend.NumbaOptions
+      options of the "numba" backend e.g. ``NumbaOptions(fastmath=True)``
+    llvm_options: moa.backend.LLVMOptions
+      options of the "llvm" backend e.g. ``LLVMOptions(fastmath=True)``
+    """
+    if not isinstance(optimize, bool):
+        optimize = tuple(optimize)
+
+    if not use_cache:
+        return _compile(context, backend=backend, include_conditions=include_conditions, use_numba=use_numba, stats=stats, optimize=optimize, numba_options=numba_options, llvm_options=llvm_options)
+
+    key = compiler_cache_key(context, backend=backend, include_conditions=include_conditions, use_numba=use_numba, optimize=optimize,
+                             numba_options=numba_options, llvm_options=llvm_options)
+    source = compiler_cache.get(key)
+    if source is not None:
+        if stats is not None:
+            stats.cache = 'memory'
+        return source
+
+    disk_cache = get_disk_cache(cache_dir)
+    if disk_cache is not None and not disk_cache.supports(key):
+        disk_cache = None # e.g. lambdas as optimization passes
+    if disk_cache is not None:
+        source = disk_cache.get(key)
+        if source is not None and stats is not None:
+            stats.cache = 'disk'
+
+    if source is None:
+        source = _compile(context, backend=backend, include_conditions=include_conditions, use_numba=use_numba, stats=stats, optimize=optimize, numba_options=numba_options, llvm_options=llvm_options)
+        if disk_cache is not None:
+            disk_cache.set(key, source)
+
+    compiler_cache.set(key, source)
+    return source
+
+
+def compiler_cache_key(context, backend='python', include_conditions=True, use_numba=False, optimize=True, numba_options=None, llvm_options=None, **options):
+    """Key of compiled source in ``compiler_cache`` and ``DiskCache``
+
+    Takes the context and the options of ``compiler``. Additional
+    options, such as ``specialize`` of ``compile_function``, are
+    appended sorted by name.
+    """
+    if not isinstance(optimize, bool):
+        optimize = tuple(optimize)
+    return (context_key(context), backend, include_conditions, use_numba, optimize, numba_options, llvm_options) + tuple(sorted(options.items()))
+
+
+@ast.interned
+def compile_function(context, backend='python', include_conditions=True, use_numba=False, cache_dir=None, stats=None, optimize=True, numba_options=None, llvm_options=None, specialize=False):
+    """Compile MOA context to a callable for the given backend
+
+    Positional arguments of the callable are the arrays of
+    ``moa.onf.determine_function_arguments`` sorted by name. Callables
+    are memoized in ``function_cache`` with the same key as
+    ``compiler``. The "python" backend compiles the python ast
+    directly with ``generate_python_function``, all other backends
+    load the (cached) source returned by ``compiler``. Numba kernels
+    with ``NumbaOptions(cache=True)`` are loaded from a ``DiskCache``
+    in ``cache_dir`` (default ``moa.cache.default_cache_dir()``) so
+    that numba caches the compiled kernel next to the source.
+
+    specialize: bool
+      return a ``SpecializedFunction`` compiling a variant for the
+      concrete shapes and dtypes of the arguments on each call
+
+    See ``compiler`` for the remaining arguments.
+    """
+    if not isinstance(optimize, bool):
+        optimize = tuple(optimize)
+
+    key = compiler_cache_key(context, backend=backend, include_conditions=include_conditions, use_numba=use_numba, optimize=optimize,
+                             numba_options=numba_options, llvm_options=llvm_options, specialize=specialize)
+    function = function_cache.get(key)
+    if function is not None:
+        if stats is not None:
+            stats.cache = 'memory'
+        return function
+
+    if specialize:
+        function = SpecializedFunction(context, dict(
+            backend=backend, include_conditions=include_conditions, use_numba=use_numba, cache_dir=cache_dir,
+            optimize=default_passes(backend, use_numba, specialize=True) if optimize is True else optimize, numba_options=numba_options, llvm_options=llvm_options))
     else:
+        function = _compile_function(context, backend=backend, include_conditions=include_conditions, use_numba=use_numba, cache_dir=cache_dir, stats=stats,
+                                     optimize=optimize, numba_options=numba_options, llvm_options=llvm_options)
+
+    function_cache.set(key, function)
+    return function
+
+
+def _compile_function(context, backend='python', include_conditions=True, use_numba=False, cache_dir=None, stats=None, optimize=True, numba_options=None, llvm_options=None, use_cache=True):
+    """Callable of ``compile_function`` without memoizing it in ``function_cache``
+
+    use_cache: bool
+      memoize source in ``compiler_cache`` and kernels in the caches
+      of ``load_c_function`` and ``load_llvm_function``. Without it
+      the callable is only referenced by the caller
+    """
+    if backend == 'python':
+        _, onf_context = _reduce(context, include_conditions, stats)
+        onf_context = _optimize(onf_context, optimize, default_passes(backend, use_numba), stats)
+        return _run_stage(stats, 'codegen', functools.partial(generate_python_function, use_numba=use_numba), onf_context, callback=False)
+
+    source = compiler(context, backend=backend, include_conditions=include_conditions, use_numba=use_numba, use_cache=use_cache, cache_dir=cache_dir, stats=stats,
+                      optimize=optimize, numba_options=numba_options, llvm_options=llvm_options)
+    if backend == 'c':
+        return load_c_function(source, cache_dir=cache_dir, use_cache=use_cache)
+    elif backend == 'llvm':
+        return load_llvm_function(source, options=llvm_options, use_cache=use_cache)
+
+    namespace = default_namespace(use_numba=use_numba or backend == 'numba', use_numpy=True)
+    if backend == 'numba' and numba_options is not None and numba_options.cache:
+        # numba only caches functions defined in files
+        disk_cache = DiskCache(cache_dir or default_cache_dir())
+        source_key = compiler_cache_key(context, backend=backend, include_conditions=include_conditions, use_numba=use_numba, optimize=optimize,
+                                        numba_options=numba_options, llvm_options=llvm_options)
+        if not disk_cache.supports(source_key):
+            raise MOACacheError('NumbaOptions(cache=True) requires optimization passes named across processes (e.g. no lambdas)')
+        if disk_cache.get(source_key) is None:
+            disk_cache.set(source_key, source)
+        return disk_cache.load_module(source_key, namespace=namespace).f
+
+    exec(source, namespace)
+    return namespace['f']
+
+
+DEFAULT_MAX_VARIANTS = 32
+
+
+class SpecializedFunction:
+    """Callable dispatching to variants compiled for concrete argument shapes
+
+    context: moa.ast.Context
+      expression with symbolic shapes
+    options: dict
+      keyword arguments of ``compile_function`` for each variant
+    maxsize: int
+      maximum number of variants kept in ``variants``
+
+    Each call checks the shapes and dtypes of the arguments. A variant
+    for a new signature substitutes the shapes into the symbol table
+    with ``moa.shape.specialize_shapes`` so that loop bounds are
+    constants and small loop nests are fully unrolled by the passes of
+    ``default_passes(..., specialize=True)``. Variants are kept in a
+    ``LRUCache`` keyed by signature and are not memoized in the global
+    caches so ``maxsize`` bounds the variants kept alive.
+    """
+    def __init__(self, context, options, maxsize=DEFAULT_MAX_VARIANTS):
+        self.context = context
+        self.options = options
+        self.arguments = tuple(node.attrib[0] for node in determine_function_arguments(context.symbol_table))
+        self.variants = LRUCache(maxsize=maxsize)
+
+    def __call__(self, *arrays):
+        if len(arrays) != len(self.arguments):
+            raise TypeError(f'expected {len(self.arguments)} arguments got {len(arrays)}')
+
+        signature = tuple((getattr(array, 'shape', None), getattr(array, 'dtype', None)) for array in arrays)
+        function = self.variants.get(signature)
+        if function is None:
+            function = self._specialize(signature)
+            self.variants.set(signature, function)
+        return function(*arrays)
+
+    def _specialize(self, signature):
+        shapes = {name: tuple(shape) for name, (shape, dtype) in zip(self.arguments, signature) if shape is not None}
+        context = specialize_shapes(self.context, shapes)
+        if context is None:
+            # generic kernel reports arguments not matching the declared shapes
+            context = self.context
+        # variants are only referenced by ``variants`` so that evicted variants are released
+        return _compile_function(context, use_cache=False, **self.options)
+
+
+def default_passes(backend, use_numba=False, specialize=False):
+    """ONF optimization passes applied with ``optimize=True``
+
+    Loops of the "python" backend without numba are interpreted and
+    use ``moa.optimize.PYTHON_PASSES`` without loop interchange,
+    tiling and unroll and jam. Compiled backends use
+    ``moa.optimize.DEFAULT_PASSES``. Variants for concrete shapes
+    (``specialize=True``) additionally fully unroll small loop nests.
+    """
+    if backend == 'python' and not use_numba:
+        return PYTHON_SPECIALIZED_PASSES if specialize else PYTHON_PASSES
+    return SPECIALIZED_PASSES if specialize else DEFAULT_PASSES
+
+
+def get_disk_cache(cache_dir=None):
+    cache_dir = cache_dir or os.environ.get('MOA_CACHE_DIR')
+    if cache_dir is None:
+        return None
+    return DiskCache(cache_dir)
+
+
+def _run_stage(stats, stage, stage_function, context, callback=True):
+    if stats is None:
+        return stage_function(context)
+    return stats.run_stage(stage, stage_function, context, callback=callback)
+
+
+def _reduce(context, include_conditions, stats=None):
+    shape_context = _run_stage(stats, 'shape', calculate_shapes, context)
+    dnf_context = _run_stage(stats, 'dnf', reduce_to_dnf, shape_context)
+    onf_context = _run_stage(stats, 'onf', functools.partial(reduce_to_onf, include_conditions=include_conditions), dnf_context)
+    return dnf_context, onf_context
+
+
+def _optimize(onf_context, optimize, passes, stats=None):
+    if not optimize:
+        return onf_context
+    if optimize is not True:
+        passes = optimize
+    return _run_stage(stats, 'optimize', functools.partial(optimize_onf, passes=passes), onf_context, callback=False)
+
+
+def _compile(context, backend, include_conditions, use_numba, stats=None, optimize=True, numba_options=None, llvm_options=None):
+    if backend not in {'python', 'numpy', 'numba', 'c', 'llvm'}:
         raise ValueError(f'unknown backend {backend}')
+
+    dnf_context, onf_context = _reduce(context, include_conditions, stats)
+    if backend == 'numpy':
+        source = _run_stage(stats, 'vectorize', functools.partial(generate_numpy_source, expression_context=dnf_context), onf_context, callback=False)
+        if source is not None:
+            return source
+
+    onf_context = _optimize(onf_context, optimize, default_passes(backend, use_numba), stats)
+    if backend == 'numba':
+        if numba_options is not None and numba_options.parallel:
+            onf_context = _run_stage(stats, 'parallelize', parallelize_loops, onf_context, callback=False)
+        return _run_stage(stats, 'codegen', functools.partial(generate_numba_source, options=numba_options), onf_context, callback=False)
+    elif backend == 'c':
+        return _run_stage(stats, 'codegen', generate_c_source, onf_context, callback=False)
+    elif backend == 'llvm':
+        return _run_stage(stats, 'codegen', functools.partial(generate_llvm_ir, options=llvm_options), onf_context, callback=False)
+    return _run_stage(stats, 'codegen', functools.partial(generate_python_source, materialize_scalars=True, use_numba=use_numba, use_numpy=backend == 'numpy',
+        vectorize_innermost=backend == 'numpy' and not use_numba), onf_context, callback=False)
@@ -35,78 +35,94 @@ def add_indexing_node(context):
     return ast.create_context(ast=node, symbol_table=context.symbol_table)
 
 
-def reduce_to_dnf(context):
-    """Preorder traversal and replacement of ast tree
+@ast.interned
+def reduce_to_dnf(context, callback=None, max_rewrites=None):
+    """Rewrite ast with reduction rules until fixpoint
 
+    max_rewrites: int
+      maximum number of rule applications. None for unlimited
     """
-    context = add_indexing_node(context)
-    context = ast.node_traversal(context, _reduce_replacement, traversal='preorder')
+    context, num_rewrites = rewrite_to_dnf(context, callback=callback, max_rewrites=max_rewrites)
     return context
 
 
-def matches_rule(rule, context):
-    if rule[0] is not None and (rule[0] != context.ast.symbol):
-        return False
+@ast.interned
+def rewrite_to_dnf(context, callback=None, max_rewrites=None):
+    """Reduce to DNF like ``reduce_to_dnf`` returning context and number of rewrites"""
+    context = add_indexing_node(context)
+    return ast.rewrite_to_fixpoint(context, _reduce_replacement, max_rewrites=max_rewrites, callback=callback)
 
-    if len(rule) == 2:
-        if ast.num_node_children(context) != len(rule[1]):
-            return False
 
-        for i in range(ast.num_node_children(context)):
-            if rule[1][i] is None:
-                continue
+def matches_rule(rule, context):
+    stack = [(rule, context.ast)]
+    while stack:
+        rule, node = stack.pop()
+        if rule[0] is not None and (rule[0] != node.symbol):
+            return False
 
-            sub_context = ast.select_node(context, (i,))
-            if not matches_rule(rule[1][i], sub_context):
+        if len(rule) == 2:
+            if len(node.child) != len(rule[1]):
                 return False
+
+            for child_rule, child_node in zip(rule[1], node.child):
+                if child_rule is not None:
+                    stack.append((child_rule, child_node))
     return True
 
 
-def _reduce_replacement(context):
-    reduction_rules = {
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.ASSIGN,),),)): _reduce_psi_assign,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.PSI,),),)): _reduce_psi_psi,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.TRANSPOSE,),),)): _reduce_psi_transpose,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.TRANSPOSEV,),),)): _reduce_psi_transposev,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.PLUS,),),)): _reduce_psi_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.MINUS,),),)): _reduce_psi_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.TIMES,),),)): _reduce_psi_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DIVIDE,),),)): _reduce_psi_plus_minus_times_divide,
-        # outer product
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS),),)): _reduce_psi_outer_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS),),)): _reduce_psi_outer_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES),),)): _reduce_psi_outer_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE),),)): _reduce_psi_outer_plus_minus_times_divide,
-        # reduction
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.REDUCE, ast.NodeSymbol.PLUS),),)): _reduce_psi_reduce_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.REDUCE, ast.NodeSymbol.MINUS),),)): _reduce_psi_reduce_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.REDUCE, ast.NodeSymbol.TIMES),),)): _reduce_psi_reduce_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.REDUCE, ast.NodeSymbol.DIVIDE),),)): _reduce_psi_reduce_plus_minus_times_divide,
-        # inner product
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS  , ast.NodeSymbol.PLUS),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS , ast.NodeSymbol.PLUS),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES , ast.NodeSymbol.PLUS),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE, ast.NodeSymbol.PLUS),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS  , ast.NodeSymbol.MINUS),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS , ast.NodeSymbol.MINUS),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES , ast.NodeSymbol.MINUS),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE, ast.NodeSymbol.MINUS),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS  , ast.NodeSymbol.TIMES),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS , ast.NodeSymbol.TIMES),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES , ast.NodeSymbol.TIMES),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE, ast.NodeSymbol.TIMES),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS  , ast.NodeSymbol.DIVIDE),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS , ast.NodeSymbol.DIVIDE),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES , ast.NodeSymbol.DIVIDE),),)): _reduce_psi_inner_plus_minus_times_divide,
-        ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE, ast.NodeSymbol.DIVIDE),),)): _reduce_psi_inner_plus_minus_times_divide,
-    }
-
-    for rule, replacement_function in reduction_rules.items():
-        if matches_rule(rule, context):
-            return replacement_function(context)
+# reduction rule registry
+_REDUCTION_RULES = {}
+
+
+def _reduction_rule_key(rule):
+    """Index rule by node symbol and the first child with a symbol in pattern"""
+    if len(rule) == 2:
+        for i, child_rule in enumerate(rule[1]):
+            if child_rule is not None and child_rule[0] is not None:
+                return (rule[0], i, child_rule[0])
+    return (rule[0], None, None)
+
+
+def register_reduction_rule(rule, replacement_function):
+    """Register a DNF reduction rule
+
+    rule: tuple
+      pattern ``(symbol, (child_rule, ...))`` as used by
+      ``matches_rule``. ``None`` matches any symbol or child.
+    replacement_function: function
+      function that takes matched context and returns reduced context
+    """
+    rules = _REDUCTION_RULES.setdefault(_reduction_rule_key(rule), [])
+    for existing_rule, existing_function in rules:
+        if existing_rule == rule:
+            raise MOAReductionError(f'reduction rule {rule} already registered with {existing_function.__name__}')
+    rules.append((rule, replacement_function))
+
+
+def select_reduction_rule(context):
+    """Find reduction rule matching context in constant time
+
+    Candidate rules are looked up by the node symbol and the symbol of
+    each child and then verified with ``matches_rule``.
+    """
+    node = context.ast
+    keys = [(node.symbol, i, child_node.symbol) for i, child_node in enumerate(node.child)]
+    keys.extend(((node.symbol, None, None), (None, None, None)))
+
+    for key in keys:
+        for rule, replacement_function in _REDUCTION_RULES.get(key, ()):
+            if matches_rule(rule, context):
+                return replacement_function
     return None
 
 
+def _reduce_replacement(context):
+    replacement_function = select_reduction_rule(context)
+    if replacement_function is None:
+        return None
+    return replacement_function(context)
+
+
 def _reduce_psi_assign(context):
     """<i j> psi ... assign ... => <i j> psi ... assign <i j> psi ..."""
     return ast.create_context(
@@ -263,3 +279,22 @@ def _reduce_psi_plus_minus_times_divide(context):
     return ast.create_context(
         ast=ast.Node(ast.select_node(context, (1,)).ast.symbol, context.ast.shape, (), (left_node, right_node)),
         symbol_table=context.symbol_table)
+
+
+# core reduction rules
+_BINARY_OPERATIONS = (ast.NodeSymbol.PLUS, ast.NodeSymbol.MINUS, ast.NodeSymbol.TIMES, ast.NodeSymbol.DIVIDE)
+
+register_reduction_rule(((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.ASSIGN,),),)), _reduce_psi_assign)
+register_reduction_rule(((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.PSI,),),)), _reduce_psi_psi)
+register_reduction_rule(((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.TRANSPOSE,),),)), _reduce_psi_transpose)
+register_reduction_rule(((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.TRANSPOSEV,),),)), _reduce_psi_transposev)
+for operation in _BINARY_OPERATIONS:
+    register_reduction_rule(((ast.NodeSymbol.PSI,), (None, ((operation,),),)), _reduce_psi_plus_minus_times_divide)
+    # outer product
+    register_reduction_rule(((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, operation),),)), _reduce_psi_outer_plus_minus_times_divide)
+    # reduction
+    register_reduction_rule(((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.REDUCE, operation),),)), _reduce_psi_reduce_plus_minus_times_divide)
+# inner product
+for left_operation, right_operation in itertools.product(_BINARY_OPERATIONS, repeat=2):
+    register_reduction_rule(((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.DOT, left_operation, right_operation),),)), _reduce_psi_inner_plus_minus_times_divide)
+del operation, left_operation, right_operation
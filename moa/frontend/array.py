@@ -1,7 +1,7 @@
 from .. import ast, compiler
 from ..shape import calculate_shapes
 from ..dnf import reduce_to_dnf
-from ..onf import reduce_to_onf
+from ..onf import reduce_to_onf, determine_function_arguments
 from ..analysis import metric_flops
 from ..visualize import visualize_ast, print_ast
 
@@ -204,8 +204,42 @@ class LazyArray:
     def __rtruediv__(self, other):
         return self._rbinary_opperation(ast.NodeSymbol.DIVIDE, other)
 
-    def compile(self, backend='python', **kwargs):
-        return compiler.compiler(self.context, backend=backend, **kwargs)
+    def compile(self, backend='python', stats=None, **kwargs):
+        return compiler.compiler(self.context, backend=backend, stats=stats, **kwargs)
+
+    def evaluate(self, arrays, backend='python', **kwargs):
+        """Compile expression once and evaluate it with the given arrays
+
+        arrays: Mapping[str, array]
+          arguments bound by name to ``determine_function_arguments``
+        backend: str
+          see ``moa.compiler.compiler``
+
+        The callable is compiled by ``moa.compiler.compile_function``
+        and memoized in ``moa.compiler.function_cache``. The last
+        lookup is reused while the expression and options are
+        unchanged so that repeated evaluations only run the kernel.
+
+        Returns a ``moa.array.Array`` for the "python" backend without
+        numba and NumPy arrays for all other backends.
+        """
+        evaluated = getattr(self, '_evaluated', None)
+        if evaluated is None or evaluated[0] is not self.context or evaluated[1] != backend or evaluated[2] != kwargs:
+            arguments = tuple(node.attrib[0] for node in determine_function_arguments(self.context.symbol_table))
+            function = compiler.compile_function(self.context, backend=backend, **kwargs)
+            evaluated = self._evaluated = (self.context, backend, dict(kwargs), arguments, function)
+
+        arguments, function = evaluated[3], evaluated[4]
+        unexpected = [name for name in arrays if name not in arguments]
+        if unexpected:
+            raise TypeError(f'unexpected arguments {", ".join(unexpected)}')
+        missing = [name for name in arguments if name not in arrays]
+        if missing:
+            raise TypeError(f'missing arguments {", ".join(missing)}')
+        return function(*[arrays[name] for name in arguments])
+
+    def __call__(self, **arrays):
+        return self.evaluate(arrays)
 
     def _shape(self):
         return calculate_shapes(self.context)
@@ -6,11 +6,12 @@ class MOAONFReductionError(MOAException):
     pass
 
 
-def reduce_to_onf(context, include_conditions=True):
-    return naive_reduction(context, include_conditions=include_conditions)
+@ast.interned
+def reduce_to_onf(context, include_conditions=True, callback=None):
+    return naive_reduction(context, include_conditions=include_conditions, callback=callback)
 
 
-def naive_reduction(context, include_conditions=True):
+def naive_reduction(context, include_conditions=True, callback=None):
     """Simple backend does not simplify loops and directly converts moa reduced statement to ONF
 
     ONF AST is a language independent representation
@@ -59,7 +60,7 @@ def naive_reduction(context, include_conditions=True):
                 ast.Node((ast.NodeSymbol.ARRAY,), context.ast.shape, (result_index_name,), ()),
                 ast.Node((ast.NodeSymbol.ARRAY,), context.ast.shape, (result_array_name,), ()))),
             context.ast)),
-        symbol_table=context.symbol_table))
+        symbol_table=context.symbol_table), callback=callback)
 
     # add array initializations
     initializations = initializations + result_initialization
@@ -82,7 +83,7 @@ def naive_reduction(context, include_conditions=True):
         symbol_table=context.symbol_table)
 
 
-def rewrite_expression(context):
+def rewrite_expression(context, callback=None):
     initializations = ()
 
     initialization_map = {
@@ -146,7 +147,7 @@ def rewrite_expression(context):
             context = _apply_operation_on_block(context)
         return context
 
-    context = ast.node_traversal(context, _reduce_traversal, traversal='postorder')
+    context = ast.node_traversal(context, _reduce_traversal, traversal='postorder', callback=callback)
     return context, initializations
 
 
@@ -171,12 +172,21 @@ def determine_dimension_conditions(context, function_arguments):
 def determine_shape_conditions(context, function_arguments):
     shape_conditions = []
     assignments = []
+    assigned_names = set()
     for array in function_arguments:
         for i, element in enumerate(array.shape):
             array_name = ast.generate_unique_array_name(context)
             context = ast.add_symbol(context, array_name, ast.NodeSymbol.ARRAY, (1,), None, (i,))
 
-            if ast.is_symbolic_element(element):
+            if ast.is_symbolic_element(element) and element.attrib[0] in assigned_names:
+                # <i> psi shape A == n (n assigned from a previous argument)
+                shape_conditions.append(ast.Node((ast.NodeSymbol.EQUAL,), (), (), (
+                    element,
+                    ast.Node((ast.NodeSymbol.PSI,), (), (), (
+                        ast.Node((ast.NodeSymbol.ARRAY,), (1,), (array_name,), ()),
+                        ast.Node((ast.NodeSymbol.SHAPE,), (len(array.shape),), (), (array,)))))))
+            elif ast.is_symbolic_element(element):
+                assigned_names.add(element.attrib[0])
                 # <i> psi shape A
                 assignments.append(ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
                     ast.Node((ast.NodeSymbol.ARRAY,), (), (element.attrib[0],), ()),
@@ -0,0 +1,1148 @@
+"""Machine independent optimizations of the ONF ast
+
+Each pass takes and returns an ONF context (see ``moa.onf``).
+"""
+import collections
+
+from . import ast
+
+
+@ast.interned
+def optimize(context, passes=None):
+    """Apply ONF optimization passes in order
+
+    passes: Sequence[callable]
+      passes to apply. Defaults to ``DEFAULT_PASSES``
+    """
+    for optimization_pass in (DEFAULT_PASSES if passes is None else passes):
+        context = optimization_pass(context)
+    return context
+
+
+# common subexpression elimination
+def common_subexpression_elimination(context):
+    """Bind repeated subexpressions of each assignment to scalar temporaries
+
+    ``_a1[(i,)] = (A[(i,)] + B[(i,)]) * (A[(i,)] + B[(i,)])`` becomes
+    ``_a2 = A[(i,)] + B[(i,)]`` followed by ``_a1[(i,)] = _a2 * _a2``.
+    Statements are pure within an assignment so temporaries are
+    evaluated immediately before the assignment they were taken from.
+    """
+    def _replace_block(context):
+        if context.ast.symbol != (ast.NodeSymbol.BLOCK,):
+            return context
+
+        statements = ()
+        for child_node in context.ast.child:
+            if child_node.symbol == (ast.NodeSymbol.ASSIGN,):
+                context, temporary_statements, expression_node = _bind_subexpressions(context, child_node.child[1])
+                statements = statements + temporary_statements
+                if temporary_statements:
+                    child_node = ast.Node(child_node.symbol, child_node.shape, child_node.attrib, (child_node.child[0], expression_node))
+            statements = statements + (child_node,)
+
+        if statements == context.ast.child:
+            return context
+        return ast.create_context(
+            ast=ast.Node(context.ast.symbol, context.ast.shape, context.ast.attrib, statements),
+            symbol_table=context.symbol_table)
+
+    return ast.node_traversal(context, _replace_block, traversal='postorder')
+
+
+def _subexpression_uses(node):
+    """Number of distinct parents using each subexpression
+
+    Identical subtrees are a single node of the expression DAG.
+    """
+    uses = collections.Counter()
+    visited = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node in visited:
+            continue
+        visited.add(node)
+        for child_node in node.child:
+            uses[child_node] += 1
+            stack.append(child_node)
+    return uses
+
+
+def _is_subexpression_candidate(node, uses):
+    return uses[node] > 1 and node.symbol != (ast.NodeSymbol.ARRAY,) and ast.is_operation(ast.create_context(ast=node))
+
+
+def _bind_subexpressions(context, node):
+    """Return context, temporary assignments, and rewritten expression"""
+    uses = _subexpression_uses(node)
+    if not any(_is_subexpression_candidate(subexpression, uses) for subexpression in uses):
+        return context, (), node
+
+    statements = ()
+    replacements = {}
+    # postorder over expression DAG so temporaries are defined before use
+    stack = [(node, False)]
+    while stack:
+        node, visited = stack.pop()
+        if node in replacements:
+            continue
+        if not visited:
+            stack.append((node, True))
+            stack.extend((child_node, False) for child_node in reversed(node.child))
+            continue
+
+        child = tuple(replacements[child_node] for child_node in node.child)
+        if child != node.child:
+            node_replacement = ast.Node(node.symbol, node.shape, node.attrib, child)
+        else:
+            node_replacement = node
+
+        if _is_subexpression_candidate(node, uses):
+            array_name = ast.generate_unique_array_name(context)
+            context = ast.add_symbol(context, array_name, ast.NodeSymbol.ARRAY, (), None, None)
+            array_node = ast.Node((ast.NodeSymbol.ARRAY,), (), (array_name,), ())
+            statements = statements + (ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (array_node, node_replacement)),)
+            node_replacement = array_node
+        replacements[node] = node_replacement
+
+    return context, statements, node_replacement
+
+
+# loop fusion
+def fuse_loops(context):
+    """Fuse adjacent loops with identical bounds and independent bodies
+
+    Two loops are fused when neither writes an array that the other
+    reads or writes. Assignments between the loops that are
+    independent of the first loop are moved before it, such as the
+    initialization of a second reduction.
+
+    .. code-block:: python
+
+       for _i4 in range(0, 3, 1):      for _i4 in range(0, 3, 1):
+           _a18 = _a18 + A[_i4, _i2]  =>    _a18 = _a18 + A[_i4, _i2]
+       _a20 = 1                            _a20 = _a20 * A[_i4, _i2]
+       for _i6 in range(0, 3, 1):
+           _a20 = _a20 * A[_i6, _i2]
+    """
+    def _replace_block(context):
+        if context.ast.symbol != (ast.NodeSymbol.BLOCK,):
+            return context
+
+        node = context.ast
+        context, statements = _fuse_statements(context, node.child)
+        if statements == node.child:
+            return ast.create_context(ast=node, symbol_table=context.symbol_table)
+        return ast.create_context(
+            ast=ast.Node(node.symbol, node.shape, node.attrib, statements),
+            symbol_table=context.symbol_table)
+
+    return ast.node_traversal(context, _replace_block, traversal='postorder')
+
+
+def _fuse_statements(context, statements):
+    statements = tuple(statements)
+    i = 0
+    while i < len(statements):
+        if statements[i].symbol != (ast.NodeSymbol.LOOP,):
+            i += 1
+            continue
+
+        loop_node = statements[i]
+        loop_accesses = array_accesses(context, loop_node)
+        j = i + 1
+        while j < len(statements) and statements[j].symbol in {(ast.NodeSymbol.ASSIGN,), (ast.NodeSymbol.INITIALIZE,)} and \
+              _independent(loop_accesses, array_accesses(context, statements[j])):
+            j += 1
+
+        if j < len(statements) and _fusable(context, loop_node, statements[j]):
+            context, fused_loop_node = _fuse_loop_pair(context, loop_node, statements[j])
+            statements = statements[:i] + statements[i+1:j] + (fused_loop_node,) + statements[j+1:]
+            i = i + (j - i - 1) # try fusing fused loop with next loop
+        else:
+            i += 1
+    return context, statements
+
+
+def array_accesses(context, node):
+    """Names of arrays read and written within node
+
+    Indicies referenced by index arrays (e.g. ``_i2`` in ``A[_i1, _i2]``)
+    count as reads.
+
+    Returns tuple of (reads, writes).
+    """
+    reads, writes = set(), set()
+    stack = [(node, False)]
+    while stack:
+        node, is_write = stack.pop()
+        if not isinstance(node, ast.Node):
+            continue
+
+        if node.symbol == (ast.NodeSymbol.ARRAY,):
+            name = node.attrib[0]
+            (writes if is_write else reads).add(name)
+            symbol_node = context.symbol_table.get(name)
+            if symbol_node is not None:
+                for element in (symbol_node.value or ()) + (symbol_node.shape or ()):
+                    if ast.is_symbolic_element(element):
+                        reads.add(element.attrib[0])
+        elif node.symbol == (ast.NodeSymbol.ASSIGN,):
+            stack.append((node.child[0], True))
+            stack.append((node.child[1], False))
+        elif node.symbol == (ast.NodeSymbol.PSI,) and is_write:
+            stack.append((node.child[0], False))
+            stack.append((node.child[1], True))
+        elif node.symbol in {(ast.NodeSymbol.INITIALIZE,), (ast.NodeSymbol.LOOP,)}:
+            writes.add(node.attrib[0])
+            stack.extend((child_node, False) for child_node in node.child)
+        else:
+            stack.extend((child_node, False) for child_node in node.child)
+    return reads, writes
+
+
+def _independent(left_accesses, right_accesses, ignore=frozenset()):
+    left_reads, left_writes = left_accesses
+    right_reads, right_writes = right_accesses
+    return not (((left_writes & (right_reads | right_writes)) | (right_writes & left_reads)) - ignore)
+
+
+def _fusable(context, left_loop_node, right_loop_node):
+    if right_loop_node.symbol != (ast.NodeSymbol.LOOP,):
+        return False
+
+    left_index, right_index = left_loop_node.attrib[0], right_loop_node.attrib[0]
+    if context.symbol_table[left_index].value != context.symbol_table[right_index].value:
+        return False
+
+    return _independent(
+        array_accesses(context, left_loop_node),
+        array_accesses(context, right_loop_node),
+        ignore={left_index, right_index})
+
+
+def _fuse_loop_pair(context, left_loop_node, right_loop_node):
+    left_index, right_index = left_loop_node.attrib[0], right_loop_node.attrib[0]
+    context, right_block_node = rename_index(context, right_loop_node.child[0], right_index, left_index)
+
+    left_block_node = left_loop_node.child[0]
+    context, statements = _fuse_statements(context, left_block_node.child + right_block_node.child)
+    return context, ast.Node(left_loop_node.symbol, left_loop_node.shape, left_loop_node.attrib, (
+        ast.Node(left_block_node.symbol, left_block_node.shape, left_block_node.attrib, statements),))
+
+
+def rename_index(context, node, old_index, new_index):
+    """Replace references to index old_index in node with new_index
+
+    Index arrays referencing old_index are copied to new symbols.
+
+    Returns tuple of (context, node).
+    """
+    return _replace_index(context, node, old_index, new_index,
+                          lambda element: ast.Node(element.symbol, element.shape, (new_index,), element.child))
+
+
+def substitute_index(context, node, index, value):
+    """Replace references to index in node with the integer value
+
+    Index arrays referencing index are copied to new symbols with the
+    value as element and the index itself is replaced by a scalar
+    constant.
+
+    Returns tuple of (context, node).
+    """
+    return _replace_index(context, node, index, None, lambda element: value)
+
+
+def _replace_index(context, node, old_index, new_index, replace_element):
+    symbol_mapping = {} if new_index is None else {old_index: new_index}
+
+    def _rename(context):
+        if not ast.is_array(context):
+            return context
+
+        name = context.ast.attrib[0]
+        if name == old_index and name not in symbol_mapping:
+            context, value_node = _add_scalar(context, (replace_element(context.ast),))
+            symbol_mapping[name] = value_node.attrib[0]
+        elif name not in symbol_mapping:
+            symbol_node = context.symbol_table.get(name)
+            if symbol_node is None or not any(ast.is_symbolic_element(element) and element.attrib[0] == old_index for element in symbol_node.value or ()):
+                return context
+
+            value = tuple(
+                replace_element(element) if ast.is_symbolic_element(element) and element.attrib[0] == old_index else element
+                for element in symbol_node.value)
+            symbol_mapping[name] = ast.generate_unique_array_name(context)
+            context = ast.add_symbol(context, symbol_mapping[name], symbol_node.symbol, symbol_node.shape, symbol_node.type, value)
+        return ast.replace_node_attributes(context, (symbol_mapping[name],) + context.ast.attrib[1:])
+
+    context = ast.node_traversal(ast.create_context(ast=node, symbol_table=context.symbol_table), _rename, traversal='postorder')
+    return ast.create_context(ast=None, symbol_table=context.symbol_table), context.ast
+
+
+# loop interchange
+_STRIDE_BASE = 1024
+"""Assumed extent of each dimension when estimating the stride of an access"""
+
+
+def interchange_loops(context, layout='C'):
+    """Order loop nests so that the innermost loop has unit stride accesses
+
+    layout: str
+      memory layout of arrays "C" (row major) or "F" (column major)
+
+    The innermost loop of a perfect loop nest is chosen to be the index
+    with the smallest stride over all psi accesses in its body. Scalar
+    reduction accumulators are first replaced by the output element
+    they are stored to and the nest is distributed so that reductions
+    may be interchanged with the loops over output indicies. The inner
+    product ``A[i, k] * B[k, j]`` is reordered from ``i, j, k`` to
+    ``i, k, j``. A loop nest is only replaced when the estimated cost
+    of its innermost loops decreases.
+    """
+    if layout not in {'C', 'F'}:
+        raise ValueError(f'layout "{layout}" must be "C" or "F"')
+
+    return _replace_loop_nests(context, lambda context, loop_node: (context, _reorder_loop_nest(context, loop_node, layout)))
+
+
+def _replace_loop_nests(context, replacement_function):
+    """Replace each loop statement of every block
+
+    replacement_function(context, loop_node) returns tuple of context
+    and statements replacing loop_node. Blocks are visited in
+    postorder so inner loop nests are replaced before outer.
+    """
+    def _replace_block(context):
+        if context.ast.symbol != (ast.NodeSymbol.BLOCK,):
+            return context
+
+        node = context.ast
+        statements = ()
+        for child_node in node.child:
+            if child_node.symbol == (ast.NodeSymbol.LOOP,):
+                context, replacement = replacement_function(context, child_node)
+                statements = statements + replacement
+            else:
+                statements = statements + (child_node,)
+
+        if statements == node.child:
+            return ast.create_context(ast=node, symbol_table=context.symbol_table)
+        return ast.create_context(
+            ast=ast.Node(node.symbol, node.shape, node.attrib, statements),
+            symbol_table=context.symbol_table)
+
+    return ast.node_traversal(context, _replace_block, traversal='postorder')
+
+
+def _perfect_nest(loop_node):
+    """Return loops of perfect loop nest and statements of innermost body"""
+    loop_nodes = []
+    statements = (loop_node,)
+    while len(statements) == 1 and statements[0].symbol == (ast.NodeSymbol.LOOP,):
+        loop_nodes.append(statements[0])
+        statements = statements[0].child[0].child
+    return loop_nodes, statements
+
+
+def _build_nest(loop_nodes, statements):
+    for loop_node in reversed(loop_nodes):
+        block_node = loop_node.child[0]
+        statements = (ast.Node(loop_node.symbol, loop_node.shape, loop_node.attrib, (
+            ast.Node(block_node.symbol, block_node.shape, block_node.attrib, tuple(statements)),)),)
+    return statements
+
+
+def _contains_loop(statements):
+    return any(statement.symbol == (ast.NodeSymbol.LOOP,) for statement in statements)
+
+
+def _reorder_loop_nest(context, loop_node, layout):
+    """Return statements replacing loop_node"""
+    loop_nodes, statements = _perfect_nest(loop_node)
+    indicies = {node.attrib[0] for node in loop_nodes}
+
+    if not _contains_loop(statements):
+        if not _reorderable(context, statements, indicies):
+            return (loop_node,)
+        replacement = _build_nest(_order_loops(context, loop_nodes, statements, layout), statements)
+    else:
+        statements = _accumulate_into_outputs(context, statements)
+        if not _reorderable(context, statements, indicies, distribute=True):
+            return (loop_node,)
+
+        replacement = ()
+        for statement in statements:
+            if statement.symbol == (ast.NodeSymbol.LOOP,):
+                inner_loop_nodes, inner_statements = _perfect_nest(statement)
+                nest_loop_nodes = loop_nodes + inner_loop_nodes
+                if not _contains_loop(inner_statements) and _reorderable(context, inner_statements, indicies):
+                    nest_loop_nodes = _order_loops(context, nest_loop_nodes, inner_statements, layout)
+                replacement = replacement + _build_nest(nest_loop_nodes, inner_statements)
+            else:
+                replacement = replacement + _build_nest(_order_loops(context, loop_nodes, (statement,), layout), (statement,))
+
+    if _innermost_cost(context, replacement, layout) < _innermost_cost(context, (loop_node,), layout):
+        return replacement
+    return (loop_node,)
+
+
+def _accumulate_into_outputs(context, statements):
+    """Replace scalar reduction accumulators with the element they are stored to
+
+    ``_a1 = 0; for k: _a1 = _a1 + e; C[i, j] = _a1`` becomes
+    ``C[i, j] = 0; for k: C[i, j] = C[i, j] + e``.
+    """
+    statements = tuple(statements)
+    i = 0
+    while i + 2 < len(statements):
+        initialize_node, loop_node, store_node = statements[i:i+3]
+        if not (initialize_node.symbol == (ast.NodeSymbol.ASSIGN,) and
+                initialize_node.child[0].symbol == (ast.NodeSymbol.ARRAY,) and
+                loop_node.symbol == (ast.NodeSymbol.LOOP,) and
+                store_node.symbol == (ast.NodeSymbol.ASSIGN,) and
+                store_node.child[0].symbol == (ast.NodeSymbol.PSI,) and
+                store_node.child[1] == initialize_node.child[0]):
+            i += 1
+            continue
+
+        accumulator_name = initialize_node.child[0].attrib[0]
+        element_node = store_node.child[0]
+        output_name = element_node.child[1].attrib[0]
+        other_statements = statements[:i] + statements[i+3:]
+        if any(accumulator_name in set.union(*array_accesses(context, statement)) for statement in other_statements) or \
+           output_name in set.union(*array_accesses(context, loop_node)) or \
+           output_name in array_accesses(context, initialize_node.child[1])[0]:
+            i += 1
+            continue
+
+        def _replace_accumulator(context):
+            if ast.is_array(context) and context.ast.attrib[0] == accumulator_name:
+                return ast.create_context(ast=element_node, symbol_table=context.symbol_table)
+            return context
+
+        loop_node = ast.node_traversal(
+            ast.create_context(ast=loop_node, symbol_table=context.symbol_table),
+            _replace_accumulator, traversal='postorder').ast
+        initialize_node = ast.Node(initialize_node.symbol, initialize_node.shape, initialize_node.attrib, (
+            element_node, initialize_node.child[1]))
+        statements = statements[:i] + (initialize_node, loop_node) + statements[i+3:]
+        i += 2
+    return statements
+
+
+def _ordered_accesses(context, node):
+    """Arrays accessed within node in evaluation order
+
+    Returns list of (name, index names, is_write) where index names is
+    None for scalar accesses and otherwise the index of each dimension
+    of a psi access (None for constant elements).
+    """
+    accesses = []
+    stack = [(node, False)]
+    while stack:
+        node, is_write = stack.pop()
+        if not isinstance(node, ast.Node):
+            continue
+
+        if node.symbol == (ast.NodeSymbol.ARRAY,):
+            accesses.append((node.attrib[0], None, is_write))
+        elif node.symbol == (ast.NodeSymbol.PSI,):
+            index_symbol_node = context.symbol_table[node.child[0].attrib[0]]
+            index_names = tuple(
+                element.attrib[0] if ast.is_symbolic_element(element) else None
+                for element in index_symbol_node.value)
+            accesses.append((node.child[1].attrib[0], index_names, is_write))
+        elif node.symbol == (ast.NodeSymbol.ASSIGN,):
+            # stack is last in first out: value is read before target is written
+            stack.append((node.child[0], True))
+            stack.append((node.child[1], False))
+        else:
+            stack.extend((child_node, False) for child_node in reversed(node.child))
+    return accesses
+
+
+def _reorderable(context, statements, indicies, distribute=False):
+    """Iterations of the loops over indicies may be reordered
+
+    Every written array must either be a scalar that is written before
+    it is read in each iteration or be accessed only at one psi index
+    (a reduction into that element). When distributing the loops over
+    statements written elements must be distinct for each iteration and
+    scalars may not be shared between statements.
+    """
+    accessed = {}
+    for i, statement in enumerate(statements):
+        if statement.symbol not in {(ast.NodeSymbol.ASSIGN,), (ast.NodeSymbol.LOOP,), (ast.NodeSymbol.BLOCK,)}:
+            return False
+        for name, index_names, is_write in _ordered_accesses(context, statement):
+            accessed.setdefault(name, []).append((i, index_names, is_write))
+
+    for name, accesses in accessed.items():
+        if not any(is_write for _, _, is_write in accesses):
+            continue
+
+        if accesses[0][1] is None:
+            if not accesses[0][2] or any(index_names is not None for _, index_names, _ in accesses):
+                return False
+            if distribute and len({i for i, _, _ in accesses}) > 1:
+                return False
+        else:
+            index_names = accesses[0][1]
+            if any(_index_names != index_names for _, _index_names, _ in accesses):
+                return False
+            if distribute and not indicies <= set(index_names):
+                return False
+    return True
+
+
+def _index_strides(context, statements, layout):
+    """Estimated stride of each index summed over psi accesses in statements"""
+    strides = collections.Counter()
+    for statement in statements:
+        for name, index_names, is_write in _ordered_accesses(context, statement):
+            if index_names is None:
+                continue
+            dimension = len(index_names)
+            for position, index_name in enumerate(index_names):
+                if index_name is not None:
+                    rank = (dimension - position - 1) if layout == 'C' else position
+                    strides[index_name] += _STRIDE_BASE ** rank
+    return strides
+
+
+def _order_loops(context, loop_nodes, statements, layout):
+    strides = _index_strides(context, statements, layout)
+    return sorted(loop_nodes, key=lambda loop_node: -strides[loop_node.attrib[0]])
+
+
+def _innermost_cost(context, statements, layout):
+    cost = 0
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        if node.symbol == (ast.NodeSymbol.LOOP,):
+            body = node.child[0].child
+            if _contains_loop(body):
+                stack.extend(body)
+            else:
+                cost += _index_strides(context, body, layout)[node.attrib[0]]
+        elif node.symbol == (ast.NodeSymbol.BLOCK,):
+            stack.extend(node.child)
+    return cost
+
+
+def _written_indicies(context, statements):
+    """Index names of each psi write within statements"""
+    return {
+        index_names
+        for statement in statements
+        for name, index_names, is_write in _ordered_accesses(context, statement)
+        if is_write and index_names is not None}
+
+
+def _add_index(context, value):
+    index_name = ast.generate_unique_index_name(context)
+    context = ast.add_symbol(context, index_name, ast.NodeSymbol.INDEX, (), None, value)
+    return context, index_name
+
+
+def _add_scalar(context, value=None):
+    array_name = ast.generate_unique_array_name(context)
+    context = ast.add_symbol(context, array_name, ast.NodeSymbol.ARRAY, (), None, value)
+    return context, ast.Node((ast.NodeSymbol.ARRAY,), (), (array_name,), ())
+
+
+def _element_node(context, element):
+    """Scalar node for loop bound element"""
+    if ast.is_symbolic_element(element):
+        return context, element
+    return _add_scalar(context, (element,))
+
+
+def _assign_sum(context, target_node, node, value):
+    """Statement assigning node + value to target_node"""
+    context, value_node = _add_scalar(context, (value,))
+    return context, ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+        target_node, ast.Node((ast.NodeSymbol.PLUS,), (), (), (node, value_node))))
+
+
+def _block(statements):
+    return ast.Node((ast.NodeSymbol.BLOCK,), (), (), tuple(statements))
+
+
+def _condition(symbol, left_node, right_node, statements):
+    return ast.Node((ast.NodeSymbol.CONDITION,), (), (), (
+        ast.Node((symbol,), (), (), (left_node, right_node)), _block(statements)))
+
+
+def _index_node(index_name):
+    return ast.Node((ast.NodeSymbol.ARRAY,), (), (index_name,), ())
+
+
+# loop tiling
+DEFAULT_TILE_SIZE = 128
+
+
+def tile_loops(context, tile_size=DEFAULT_TILE_SIZE):
+    """Tile reduction loops enclosed by other loops of a loop nest
+
+    tile_size: int
+      number of iterations of the reduction loop within a tile
+
+    In the inner product ``C[i, j] = C[i, j] + A[i, k] * B[k, j]``
+    (ordered ``i, k, j`` by ``interchange_loops``) the rows of ``B``
+    are streamed once for every ``i``. Moving a loop over tiles of
+    ``k`` outermost keeps ``tile_size`` rows of ``B`` in cache for
+    all ``i``. The innermost loop is never tiled so that it keeps
+    a zero based unit stride range.
+    """
+    return _replace_loop_nests(context, lambda context, loop_node: _tile_loop_nest(context, loop_node, tile_size))
+
+
+def _tile_loop_nest(context, loop_node, tile_size):
+    loop_nodes, statements = _perfect_nest(loop_node)
+    indicies = tuple(node.attrib[0] for node in loop_nodes)
+    if _contains_loop(statements) or not _reorderable(context, statements, set(indicies)):
+        return context, (loop_node,)
+
+    written_indicies = _written_indicies(context, statements)
+    tiled_positions = [
+        position for position in range(1, len(indicies) - 1)
+        if written_indicies and not any(indicies[position] in index_names for index_names in written_indicies) and
+        context.symbol_table[indicies[position]].value[0] == 0 and context.symbol_table[indicies[position]].value[2] == 1]
+    if not tiled_positions:
+        return context, (loop_node,)
+
+    block_node = _block(statements)
+    tiles = []
+    for position in tiled_positions:
+        start, stop, step = context.symbol_table[indicies[position]].value
+        context, tile_index = _add_index(context, (start, stop, tile_size))
+        context, tile_stop_node = _add_scalar(context)
+        context, point_index = _add_index(context, (_index_node(tile_index), tile_stop_node, step))
+        context, block_node = rename_index(context, block_node, indicies[position], point_index)
+        loop_nodes[position] = ast.Node(loop_nodes[position].symbol, loop_nodes[position].shape, (point_index,), loop_nodes[position].child)
+
+        # tile stop is min(tile_index + tile_size, stop)
+        context, stop_node = _element_node(context, stop)
+        context, tile_stop_statement = _assign_sum(context, tile_stop_node, _index_node(tile_index), tile_size)
+        tiles.append((loop_nodes[position], tile_index, (
+            tile_stop_statement,
+            _condition(ast.NodeSymbol.LESSTHAN, stop_node, tile_stop_node, (
+                ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (tile_stop_node, stop_node)),)))))
+
+    statements = _build_nest(loop_nodes, block_node.child)
+    for point_loop_node, tile_index, tile_statements in reversed(tiles):
+        statements = (ast.Node(point_loop_node.symbol, point_loop_node.shape, (tile_index,), (
+            ast.Node(point_loop_node.child[0].symbol, point_loop_node.child[0].shape, (), tile_statements + statements),)),)
+    return context, statements
+
+
+# unroll and jam
+DEFAULT_UNROLL = 4
+
+
+def unroll_and_jam(context, unroll=DEFAULT_UNROLL):
+    """Unroll the outer loop of a loop nest and jam the copies into the innermost loop
+
+    unroll: int
+      number of iterations of the outer loop in each unrolled iteration
+
+    Only applied when the copies share reads in the innermost loop. In
+    the inner product each unrolled iteration accumulates ``unroll``
+    rows of ``C`` from a single read of ``B[k, j]``.
+
+    .. code-block:: python
+
+       for _i9 in range(0, n, 2):
+           _a10 = _i9 + 2
+           if _a10 <= n:
+               _a12 = _i9 + 1
+               for _i5 in range(0, m, 1):
+                   for _i3 in range(0, k, 1):
+                       C[_i9, _i3] = C[_i9, _i3] + A[_i9, _i5] * B[_i5, _i3]
+                       C[_a12, _i3] = C[_a12, _i3] + A[_a12, _i5] * B[_i5, _i3]
+           if n < _a10:
+               for _i14 in range(_i9, n, 1):
+                   ...
+    """
+    return _replace_loop_nests(context, lambda context, loop_node: _unroll_loop_nest(context, loop_node, unroll))
+
+
+def _unroll_loop_nest(context, loop_node, unroll):
+    loop_nodes, statements = _perfect_nest(loop_node)
+    if unroll < 2 or len(loop_nodes) < 2 or _contains_loop(statements):
+        return context, (loop_node,)
+
+    index, innermost_index = loop_nodes[0].attrib[0], loop_nodes[-1].attrib[0]
+    start, stop, step = context.symbol_table[index].value
+    written_indicies = _written_indicies(context, statements)
+    if step != 1 or not written_indicies or \
+       not all(index in index_names for index_names in written_indicies) or \
+       not _reorderable(context, statements, {index}):
+        return context, (loop_node,)
+
+    # copies must share a read that varies in the innermost loop
+    if not any(not is_write and index_names is not None and index not in index_names and innermost_index in index_names
+               for statement in statements
+               for name, index_names, is_write in _ordered_accesses(context, statement)):
+        return context, (loop_node,)
+
+    context, unroll_index = _add_index(context, (start, stop, unroll))
+    unroll_index_node = _index_node(unroll_index)
+    context, stop_node = _element_node(context, stop)
+    context, unroll_stop_node = _add_scalar(context)
+    context, unroll_stop_statement = _assign_sum(context, unroll_stop_node, unroll_index_node, unroll)
+
+    offset_statements = ()
+    jammed_statements = ()
+    for offset in range(unroll):
+        if offset == 0:
+            offset_index = unroll_index
+        else:
+            context, offset_node = _add_scalar(context)
+            context, offset_statement = _assign_sum(context, offset_node, unroll_index_node, offset)
+            offset_statements = offset_statements + (offset_statement,)
+            offset_index = offset_node.attrib[0]
+        context, block_node = rename_index(context, _block(statements), index, offset_index)
+        jammed_statements = jammed_statements + block_node.child
+
+    context, remainder_index = _add_index(context, (unroll_index_node, stop, step))
+    context, remainder_block_node = rename_index(context, _block(statements), index, remainder_index)
+    remainder_loop_node = ast.Node(loop_nodes[0].symbol, loop_nodes[0].shape, (remainder_index,), loop_nodes[0].child)
+
+    outer_block_node = loop_nodes[0].child[0]
+    return context, (ast.Node(loop_nodes[0].symbol, loop_nodes[0].shape, (unroll_index,), (
+        ast.Node(outer_block_node.symbol, outer_block_node.shape, outer_block_node.attrib, (
+            unroll_stop_statement,
+            _condition(ast.NodeSymbol.LESSTHANEQUAL, unroll_stop_node, stop_node,
+                       offset_statements + _build_nest(loop_nodes[1:], jammed_statements)),
+            _condition(ast.NodeSymbol.LESSTHAN, stop_node, unroll_stop_node,
+                       _build_nest([remainder_loop_node] + loop_nodes[1:], remainder_block_node.child)))),)),)
+
+
+# full unrolling
+DEFAULT_MAX_UNROLL = 64
+
+
+def unroll_loops(context, max_statements=DEFAULT_MAX_UNROLL):
+    """Fully unroll loops with constant bounds
+
+    max_statements: int
+      maximum number of statements replacing an unrolled loop
+
+    Loops are unrolled from the innermost outwards by substituting the
+    index with each of its values so that small loop nests over
+    shapes known at compile time become straight line code. A loop
+    containing a loop that was not unrolled is kept. Not part of
+    ``DEFAULT_PASSES``, see ``SPECIALIZED_PASSES``.
+
+    .. code-block:: python
+
+       # A.reduce('+') with A of shape (2, 2)
+       _a10[(0,)] = (_a10[(0,)] + A[(0, 0)])
+       _a10[(1,)] = (_a10[(1,)] + A[(0, 1)])
+       _a10[(0,)] = (_a10[(0,)] + A[(1, 0)])
+       _a10[(1,)] = (_a10[(1,)] + A[(1, 1)])
+    """
+    return _replace_loop_nests(context, lambda context, loop_node: _unroll_loop(context, loop_node, max_statements))
+
+
+def _unroll_loop(context, loop_node, max_statements):
+    index = loop_node.attrib[0]
+    statements = loop_node.child[0].child
+    bounds = context.symbol_table[index].value
+    if not all(isinstance(element, int) for element in bounds) or \
+       any(node.symbol == (ast.NodeSymbol.LOOP,) for node in ast.iterate_nodes(statements)):
+        return context, (loop_node,)
+
+    iterations = range(*bounds)
+    if not iterations or len(iterations) * len(statements) > max_statements:
+        return context, (loop_node,)
+
+    unrolled_statements = ()
+    for value in iterations:
+        context, block_node = substitute_index(context, _block(statements), index, value)
+        unrolled_statements = unrolled_statements + block_node.child
+    return context, unrolled_statements
+
+
+# loop invariant code motion
+def hoist_invariants(context):
+    """Move computations that do not depend on a loop before the loop
+
+    A subexpression is invariant when it reads neither the loop index
+    nor any array written within the loop body. Maximal invariant
+    subexpressions are bound to scalar temporaries before the loop,
+    e.g. ``A[(_i2,)]`` in the outer product ``A[(_i2,)] * B[(_i3,)]``
+    is read once per ``_i2``. Scalar assignments with invariant values
+    (such as temporaries hoisted from an inner loop or shape lookups)
+    are moved out entirely. Inner loops are visited first so
+    computations move out as far as they are invariant.
+    """
+    return _replace_loop_nests(context, _hoist_loop_invariants)
+
+
+def _hoist_loop_invariants(context, loop_node):
+    block_node = loop_node.child[0]
+    variant = array_accesses(context, block_node)[1] | {loop_node.attrib[0]}
+    accesses = collections.defaultdict(list)
+    for name, index_names, is_write in _ordered_accesses(context, block_node):
+        accesses[name].append((index_names, is_write))
+
+    hoisted_statements = ()
+    statements = ()
+    for statement in block_node.child:
+        if statement.symbol != (ast.NodeSymbol.ASSIGN,):
+            statements = statements + (statement,)
+            continue
+
+        target_node, expression_node = statement.child
+        target_accesses = accesses[target_node.attrib[0]] if target_node.symbol == (ast.NodeSymbol.ARRAY,) else ()
+        if target_accesses and target_accesses[0] == (None, True) and \
+           sum(is_write for _, is_write in target_accesses) == 1 and \
+           not (set.union(*array_accesses(context, expression_node)) & variant):
+            # only assignment to scalar within the loop and not read before it
+            hoisted_statements = hoisted_statements + (statement,)
+            variant = variant - {target_node.attrib[0]}
+            continue
+
+        context, temporary_statements, expression_node = _hoist_subexpressions(context, expression_node, variant)
+        hoisted_statements = hoisted_statements + temporary_statements
+        if temporary_statements:
+            statement = ast.Node(statement.symbol, statement.shape, statement.attrib, (target_node, expression_node))
+        statements = statements + (statement,)
+
+    if not hoisted_statements:
+        return context, (loop_node,)
+    return context, hoisted_statements + (ast.Node(loop_node.symbol, loop_node.shape, loop_node.attrib, (
+        ast.Node(block_node.symbol, block_node.shape, block_node.attrib, statements),)),)
+
+
+def _hoist_subexpressions(context, node, variant):
+    """Return context, temporary assignments, and expression with invariant subexpressions replaced"""
+    invariant = {}
+    stack = [(node, False)]
+    while stack:
+        _node, visited = stack.pop()
+        if _node in invariant:
+            continue
+        if _node.symbol == (ast.NodeSymbol.ARRAY,):
+            invariant[_node] = not (set.union(*array_accesses(context, _node)) & variant)
+        elif not visited:
+            stack.append((_node, True))
+            stack.extend((child_node, False) for child_node in _node.child)
+        else:
+            invariant[_node] = all(invariant[child_node] for child_node in _node.child)
+
+    statements = ()
+    replacements = {}
+    stack = [(node, False)]
+    while stack:
+        _node, visited = stack.pop()
+        if _node in replacements:
+            continue
+        if invariant[_node] and _node.symbol != (ast.NodeSymbol.ARRAY,) and ast.is_operation(ast.create_context(ast=_node)):
+            context, array_node = _add_scalar(context)
+            statements = statements + (ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (array_node, _node)),)
+            replacements[_node] = array_node
+        elif not visited:
+            stack.append((_node, True))
+            stack.extend((child_node, False) for child_node in reversed(_node.child))
+        else:
+            child = tuple(replacements.get(child_node, child_node) for child_node in _node.child)
+            replacements[_node] = _node if child == _node.child else ast.Node(_node.symbol, _node.shape, _node.attrib, child)
+
+    return context, statements, replacements[node]
+
+
+# parallel loops
+DEFAULT_NUM_PARTIALS = 16
+
+
+def parallelize_loops(context, num_partials=DEFAULT_NUM_PARTIALS):
+    """Mark outer loops whose iterations may run concurrently as parallel
+
+    num_partials: int
+      number of partial accumulators of a parallel reduction
+
+    A loop is parallel when each written array is accessed only at
+    elements owned by the iteration, e.g. ``C[i, j]`` in a loop over
+    ``i`` or ``C[i + 1, j]`` in a loop over ``i`` unrolled by two, and
+    every written scalar is assigned before it is read. Parallel loops
+    become ``(LOOP, PARALLEL)`` nodes. When the outermost loop of a
+    nest only accumulates into arrays (``X[j] = X[j] + e``) the
+    accumulators are privatized: iterations are distributed cyclically
+    over ``num_partials`` partial accumulators updated in a parallel
+    loop and combined afterwards.
+
+    .. code-block:: python
+
+       _a20 = Array((16, m))
+       for _i21 in prange(0, 16, 1):
+           for _i22 in range(_i21, n, 16):
+               for _i3 in range(0, m, 1):
+                   _a20[(_i21, _i3)] = (_a20[(_i21, _i3)] + A[(_i22, _i3)])
+       for _i25 in range(0, 16, 1):
+           for _i26 in range(0, m, 1):
+               _a10[(_i26,)] = (_a10[(_i26,)] + _a20[(_i25, _i26)])
+
+    Otherwise loops nested within the loop are considered. Only the
+    outermost parallel loop of each nest is marked.
+    """
+    function_node = context.ast
+    block_node = function_node.child[0]
+    context, statements = _parallelize_statements(context, block_node.child, num_partials, outermost=True)
+    return ast.create_context(
+        ast=ast.Node(function_node.symbol, function_node.shape, function_node.attrib, (
+            ast.Node(block_node.symbol, block_node.shape, block_node.attrib, statements),)),
+        symbol_table=context.symbol_table)
+
+
+def _parallelize_statements(context, statements, num_partials, outermost):
+    replacement = ()
+    for statement in statements:
+        if statement.symbol == (ast.NodeSymbol.LOOP,):
+            context, loop_statements = _parallelize_loop(context, statement, num_partials, outermost)
+            replacement = replacement + loop_statements
+        elif statement.symbol == (ast.NodeSymbol.CONDITION,):
+            condition_node, block_node = statement.child
+            context, block_statements = _parallelize_statements(context, block_node.child, num_partials, outermost=False)
+            replacement = replacement + (ast.Node(statement.symbol, statement.shape, statement.attrib, (
+                condition_node, ast.Node(block_node.symbol, block_node.shape, block_node.attrib, block_statements))),)
+        else:
+            replacement = replacement + (statement,)
+    return context, replacement
+
+
+def _parallelize_loop(context, loop_node, num_partials, outermost):
+    index = loop_node.attrib[0]
+    block_node = loop_node.child[0]
+    start, stop, step = context.symbol_table[index].value
+    accumulators = _loop_accumulators(context, index, block_node.child)
+    if accumulators == {}:
+        return context, (ast.Node((ast.NodeSymbol.LOOP, ast.NodeSymbol.PARALLEL), loop_node.shape, loop_node.attrib, loop_node.child),)
+    elif accumulators and outermost and start == 0 and step == 1:
+        return _privatize_loop(context, loop_node, accumulators, num_partials)
+
+    context, statements = _parallelize_statements(context, block_node.child, num_partials, outermost=False)
+    return context, (ast.Node(loop_node.symbol, loop_node.shape, loop_node.attrib, (
+        ast.Node(block_node.symbol, block_node.shape, block_node.attrib, statements),)),)
+
+
+def _loop_accumulators(context, index, statements):
+    """Accumulators preventing loop over index from being parallel
+
+    Returns dict of accumulator name to ``PLUS`` (updated with ``+``
+    or ``-``) or ``TIMES`` (updated with ``*`` or ``/``) or None when
+    iterations are dependent otherwise.
+    """
+    owned = _owned_elements(context, index, statements)
+    accessed = collections.defaultdict(list)
+    for name, index_names, is_write in _ordered_accesses(context, _block(statements)):
+        accessed[name].append((index_names, is_write))
+
+    accumulators = {}
+    for name, accesses in accessed.items():
+        if not any(is_write for _, is_write in accesses):
+            continue
+
+        if all(index_names is None for index_names, _ in accesses):
+            if accesses[0][1]:
+                continue # private scalar
+        elif all(index_names is not None for index_names, _ in accesses):
+            dimension = len(accesses[0][0])
+            if any(all(len(index_names) == dimension and index_names[position] in owned for index_names, _ in accesses)
+                   for position in range(dimension)):
+                continue # iterations access disjoint elements
+
+        operation = _accumulation_operation(context, name, statements)
+        if operation is None:
+            return None
+        accumulators[name] = operation
+    return accumulators
+
+
+def _owned_elements(context, index, statements):
+    """Names whose value lies within ``[index, index + step)`` in each iteration
+
+    These are the loop index, scalars assigned ``index + c`` (offsets
+    of unroll and jam) and indicies of loops starting at an owned
+    element that are bounded by ``index + step``.
+    """
+    step = context.symbol_table[index].value[2]
+    offsets, num_assignments = {index: 0}, collections.Counter()
+    for node in ast.iterate_nodes(statements):
+        if node.symbol == (ast.NodeSymbol.ASSIGN,) and node.child[0].symbol == (ast.NodeSymbol.ARRAY,):
+            target_name, value_node = node.child[0].attrib[0], node.child[1]
+            num_assignments[target_name] += 1
+            if value_node.symbol == (ast.NodeSymbol.PLUS,) and value_node.child[0] == _index_node(index) and \
+               value_node.child[1].symbol == (ast.NodeSymbol.ARRAY,):
+                value = context.symbol_table[value_node.child[1].attrib[0]].value
+                if value is not None and len(value) == 1 and isinstance(value[0], int):
+                    offsets[target_name] = value[0]
+    offsets = {name: offset for name, offset in offsets.items() if name == index or num_assignments[name] == 1}
+    owned = {name for name, offset in offsets.items() if 0 <= offset < step}
+    bounds = {name for name, offset in offsets.items() if offset <= step}
+
+    stack = [(statement, False) for statement in statements]
+    while stack:
+        node, bounded = stack.pop()
+        if node.symbol == (ast.NodeSymbol.CONDITION,):
+            condition_node = node.child[0]
+            if condition_node.symbol in {(ast.NodeSymbol.LESSTHAN,), (ast.NodeSymbol.LESSTHANEQUAL,)} and \
+               condition_node.child[1].symbol == (ast.NodeSymbol.ARRAY,) and condition_node.child[1].attrib[0] in bounds:
+                bounded = condition_node.child[0]
+            stack.extend((child_node, bounded) for child_node in node.child[1].child)
+        elif node.symbol == (ast.NodeSymbol.LOOP,):
+            start, stop, step = context.symbol_table[node.attrib[0]].value
+            if ast.is_symbolic_element(start) and start.attrib[0] in owned and step == 1 and (
+                    (ast.is_symbolic_element(stop) and stop.attrib[0] in bounds) or
+                    (bounded and _element_value(context, bounded) == _element_value(context, stop))):
+                owned.add(node.attrib[0])
+            stack.extend((child_node, bounded) for child_node in node.child[0].child)
+    return owned
+
+
+def _element_value(context, element):
+    """Integer value of constant scalar element otherwise element"""
+    if ast.is_symbolic_element(element):
+        value = context.symbol_table[element.attrib[0]].value
+        if value is not None and len(value) == 1 and isinstance(value[0], int):
+            return value[0]
+    return element
+
+
+def _accumulation_operation(context, name, statements):
+    """Operation of accumulations ``X = X op e`` if all accesses of name are such updates"""
+    num_accesses, num_updates, operations = 0, 0, set()
+    for node in ast.iterate_nodes(statements):
+        if node.symbol == (ast.NodeSymbol.ARRAY,) and node.attrib[0] == name:
+            num_accesses += 1
+        elif node.symbol == (ast.NodeSymbol.ASSIGN,):
+            target_node, value_node = node.child
+            if target_node.symbol == (ast.NodeSymbol.PSI,):
+                target_name = target_node.child[1].attrib[0]
+            else:
+                target_name = target_node.attrib[0]
+            if target_name != name:
+                continue
+            if value_node.symbol not in _ACCUMULATION_OPERATIONS or value_node.child[0] != target_node or \
+               name in set.union(*array_accesses(context, value_node.child[1])):
+                return None
+            num_updates += 1
+            operations.add(_ACCUMULATION_OPERATIONS[value_node.symbol])
+
+    if num_accesses != 2 * num_updates or len(operations) != 1:
+        return None
+    return operations.pop()
+
+
+_ACCUMULATION_OPERATIONS = {
+    (ast.NodeSymbol.PLUS,): ast.NodeSymbol.PLUS,
+    (ast.NodeSymbol.MINUS,): ast.NodeSymbol.PLUS,
+    (ast.NodeSymbol.TIMES,): ast.NodeSymbol.TIMES,
+    (ast.NodeSymbol.DIVIDE,): ast.NodeSymbol.TIMES,
+}
+
+
+def _privatize_loop(context, loop_node, accumulators, num_partials):
+    index = loop_node.attrib[0]
+    start, stop, step = context.symbol_table[index].value
+    context, partial_index = _add_index(context, (0, num_partials, 1))
+    context, element_index = _add_index(context, (_index_node(partial_index), stop, num_partials))
+    context, block_node = rename_index(context, loop_node.child[0], index, element_index)
+
+    initialize_statements, combine_statements = (), ()
+    for name, operation in sorted(accumulators.items()):
+        shape = context.symbol_table[name].shape
+        partial_shape = (num_partials,) + shape
+        partial_name = ast.generate_unique_array_name(context)
+        context = ast.add_symbol(context, partial_name, ast.NodeSymbol.ARRAY, partial_shape, None, None)
+        partial_node = ast.Node((ast.NodeSymbol.ARRAY,), partial_shape, (partial_name,), ())
+        array_node = ast.Node((ast.NodeSymbol.ARRAY,), shape, (name,), ())
+        initialize_statements = initialize_statements + (ast.Node((ast.NodeSymbol.INITIALIZE,), partial_shape, (partial_name,), ()),)
+
+        if operation == ast.NodeSymbol.TIMES:
+            # arrays are initialized to zero
+            context, one_node = _add_scalar(context, (1,))
+
+            def _fill(context, index_nodes):
+                context, element_node = _psi_node(context, partial_node, index_nodes)
+                return context, (ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (element_node, one_node)),)
+
+            context, fill_statements = _shape_loop_nest(context, partial_shape, _fill)
+            initialize_statements = initialize_statements + fill_statements
+
+        def _replace_accumulator(context):
+            node = context.ast
+            if node.symbol == (ast.NodeSymbol.PSI,) and node.child[1].attrib[0] == name:
+                value = context.symbol_table[node.child[0].attrib[0]].value
+                context, element_node = _psi_node(context, partial_node, (_index_node(partial_index),) + value)
+            elif node.symbol == (ast.NodeSymbol.ARRAY,) and node.attrib[0] == name:
+                context, element_node = _psi_node(context, partial_node, (_index_node(partial_index),))
+            else:
+                return None
+            return ast.create_context(ast=element_node, symbol_table=context.symbol_table)
+
+        context = ast.node_traversal(ast.create_context(ast=block_node, symbol_table=context.symbol_table), _replace_accumulator, traversal='preorder')
+        block_node = context.ast
+
+        def _combine(context, index_nodes):
+            if shape:
+                context, target_node = _psi_node(context, array_node, index_nodes[1:])
+            else:
+                target_node = array_node
+            context, element_node = _psi_node(context, partial_node, index_nodes)
+            return context, (ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+                target_node, ast.Node((operation,), (), (), (target_node, element_node)))),)
+
+        context, statements = _shape_loop_nest(context, partial_shape, _combine)
+        combine_statements = combine_statements + statements
+
+    element_loop_node = ast.Node(loop_node.symbol, loop_node.shape, (element_index,), (block_node,))
+    parallel_loop_node = ast.Node((ast.NodeSymbol.LOOP, ast.NodeSymbol.PARALLEL), (), (partial_index,), (_block((element_loop_node,)),))
+    return context, initialize_statements + (parallel_loop_node,) + combine_statements
+
+
+def _psi_node(context, array_node, elements):
+    """Psi of array_node at index elements (scalar nodes or integers)"""
+    index_name = ast.generate_unique_array_name(context)
+    context = ast.add_symbol(context, index_name, ast.NodeSymbol.ARRAY, (len(elements),), None, tuple(elements))
+    return context, ast.Node((ast.NodeSymbol.PSI,), (), (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), (len(elements),), (index_name,), ()), array_node))
+
+
+def _shape_loop_nest(context, shape, statement_function):
+    """Loop nest over every element of shape
+
+    statement_function(context, index_nodes) returns context and the
+    statements of the innermost loop.
+    """
+    loop_nodes, index_nodes = [], ()
+    for dimension in shape:
+        context, index_name = _add_index(context, (0, dimension, 1))
+        loop_nodes.append(ast.Node((ast.NodeSymbol.LOOP,), (), (index_name,), (_block(()),)))
+        index_nodes = index_nodes + (_index_node(index_name),)
+    context, statements = statement_function(context, index_nodes)
+    return context, _build_nest(loop_nodes, statements)
+
+
+DEFAULT_PASSES = (fuse_loops, interchange_loops, tile_loops, unroll_and_jam, common_subexpression_elimination, hoist_invariants)
+
+SPECIALIZED_PASSES = (fuse_loops, interchange_loops, unroll_loops, tile_loops, unroll_and_jam, common_subexpression_elimination, hoist_invariants)
+"""Passes for shapes known at compile time fully unrolling small loop nests"""
+
+PYTHON_PASSES = (fuse_loops, common_subexpression_elimination, hoist_invariants)
+"""Passes for interpreted loops
+
+Loop interchange, tiling and unroll and jam improve locality of
+compiled loops. Interpreted loops are dominated by the cost of each
+indexing operation which these passes increase.
+"""
+
+PYTHON_SPECIALIZED_PASSES = (fuse_loops, unroll_loops, common_subexpression_elimination, hoist_invariants)
+"""Passes for interpreted loops over shapes known at compile time"""
@@ -0,0 +1,183 @@
+"""Persistent (immutable, structurally shared) data structures
+
+``PersistentMapping`` is a hash array mapped trie (HAMT). Inserting a
+key copies only the path from the root to the key, at most
+``ceil(64 / 5)`` small nodes, while all other nodes are shared with
+the previous mapping. This makes insertion O(log n) instead of the
+O(n) required to copy a dict while keeping previous mappings intact.
+
+"""
+import collections.abc
+
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_BITS = 64
+
+
+def _hash(key):
+    return hash(key) & ((1 << _HASH_BITS) - 1)
+
+
+if hasattr(int, 'bit_count'): # python >= 3.10
+    _popcount = int.bit_count
+else:
+    def _popcount(value):
+        return bin(value).count('1')
+
+
+class _Leaf:
+    __slots__ = ('hash', 'key', 'value', 'order')
+
+    def __init__(self, hash, key, value, order):
+        self.hash = hash
+        self.key = key
+        self.value = value
+        self.order = order
+
+
+class _BitmapNode:
+    """Trie node with only occupied slots stored in ``array``"""
+    __slots__ = ('bitmap', 'array')
+
+    def __init__(self, bitmap, array):
+        self.bitmap = bitmap
+        self.array = array
+
+
+class _CollisionNode:
+    """Leaves with identical full hashes"""
+    __slots__ = ('hash', 'leaves')
+
+    def __init__(self, hash, leaves):
+        self.hash = hash
+        self.leaves = leaves
+
+
+_EMPTY_NODE = _BitmapNode(0, ())
+
+
+def _node_get(node, shift, hash, key):
+    while True:
+        if isinstance(node, _CollisionNode):
+            for leaf in node.leaves:
+                if leaf.key == key:
+                    return leaf
+            return None
+
+        bit = 1 << ((hash >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return None
+
+        entry = node.array[_popcount(node.bitmap & (bit - 1))]
+        if isinstance(entry, _Leaf):
+            if entry.hash == hash and entry.key == key:
+                return entry
+            return None
+        node = entry
+        shift += _BITS
+
+
+def _merge_leaves(shift, leaf1, leaf2):
+    if shift >= _HASH_BITS:
+        return _CollisionNode(leaf1.hash, (leaf1, leaf2))
+
+    index1 = (leaf1.hash >> shift) & _MASK
+    index2 = (leaf2.hash >> shift) & _MASK
+    if index1 == index2:
+        return _BitmapNode(1 << index1, (_merge_leaves(shift + _BITS, leaf1, leaf2),))
+    elif index1 < index2:
+        return _BitmapNode((1 << index1) | (1 << index2), (leaf1, leaf2))
+    return _BitmapNode((1 << index1) | (1 << index2), (leaf2, leaf1))
+
+
+def _node_set(node, shift, leaf):
+    """Return new node with leaf inserted and whether key was added"""
+    if isinstance(node, _CollisionNode):
+        for i, existing_leaf in enumerate(node.leaves):
+            if existing_leaf.key == leaf.key:
+                leaf.order = existing_leaf.order
+                return _CollisionNode(node.hash, node.leaves[:i] + (leaf,) + node.leaves[i+1:]), False
+        return _CollisionNode(node.hash, node.leaves + (leaf,)), True
+
+    bit = 1 << ((leaf.hash >> shift) & _MASK)
+    index = _popcount(node.bitmap & (bit - 1))
+
+    if not node.bitmap & bit:
+        return _BitmapNode(node.bitmap | bit, node.array[:index] + (leaf,) + node.array[index:]), True
+
+    entry = node.array[index]
+    if isinstance(entry, _Leaf):
+        if entry.hash == leaf.hash and entry.key == leaf.key:
+            leaf.order = entry.order
+            replacement_entry, added = leaf, False
+        else:
+            replacement_entry, added = _merge_leaves(shift + _BITS, entry, leaf), True
+    else:
+        replacement_entry, added = _node_set(entry, shift + _BITS, leaf)
+    return _BitmapNode(node.bitmap, node.array[:index] + (replacement_entry,) + node.array[index+1:]), added
+
+
+def _node_leaves(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, _CollisionNode):
+            yield from node.leaves
+            continue
+
+        for entry in node.array:
+            if isinstance(entry, _Leaf):
+                yield entry
+            else:
+                stack.append(entry)
+
+
+class PersistentMapping(collections.abc.Mapping):
+    """Immutable mapping with O(log n) insertion via ``set``
+
+    Iteration follows insertion order like ``dict``.
+    """
+    __slots__ = ('_root', '_length')
+
+    def __init__(self, mapping=None):
+        self._root = _EMPTY_NODE
+        self._length = 0
+        if mapping:
+            for order, (key, value) in enumerate(mapping.items()):
+                self._root, added = _node_set(self._root, 0, _Leaf(_hash(key), key, value, order))
+                self._length += added
+
+    @classmethod
+    def _create(cls, root, length):
+        mapping = cls.__new__(cls)
+        mapping._root = root
+        mapping._length = length
+        return mapping
+
+    def set(self, key, value):
+        """Return new mapping with key set to value"""
+        root, added = _node_set(self._root, 0, _Leaf(_hash(key), key, value, self._length))
+        return self._create(root, self._length + added)
+
+    def __getitem__(self, key):
+        leaf = _node_get(self._root, 0, _hash(key), key)
+        if leaf is None:
+            raise KeyError(key)
+        return leaf.value
+
+    def __contains__(self, key):
+        return _node_get(self._root, 0, _hash(key), key) is not None
+
+    def __iter__(self):
+        for leaf in sorted(_node_leaves(self._root), key=lambda leaf: leaf.order):
+            yield leaf.key
+
+    def __len__(self):
+        return self._length
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({dict(self)!r})'
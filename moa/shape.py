@@ -1,3 +1,5 @@
+import itertools
+
 from . import ast
 from .exception import MOAException
 
@@ -28,16 +30,17 @@ def is_vector(context, selection=()):
 
 
 # compare tuples
-def compare_tuples(comparison, context, left_tuple, right_tuple, message):
-    comparison_map = {
-        ast.NodeSymbol.EQUAL: lambda e1, e2: e1 == e2,
-        ast.NodeSymbol.NOTEQUAL: lambda e1, e2: e1 != e2,
-        ast.NodeSymbol.LESSTHAN: lambda e1, e2: e1 < e2,
-        ast.NodeSymbol.LESSTHANEQUAL: lambda e1, e2: e1 <= e2,
-        ast.NodeSymbol.GREATERTHAN: lambda e1, e2: e1 > e2,
-        ast.NodeSymbol.GREATERTHANEQUAL: lambda e1, e2: e1 >= e2,
-    }
+_COMPARISON_MAP = {
+    ast.NodeSymbol.EQUAL: lambda e1, e2: e1 == e2,
+    ast.NodeSymbol.NOTEQUAL: lambda e1, e2: e1 != e2,
+    ast.NodeSymbol.LESSTHAN: lambda e1, e2: e1 < e2,
+    ast.NodeSymbol.LESSTHANEQUAL: lambda e1, e2: e1 <= e2,
+    ast.NodeSymbol.GREATERTHAN: lambda e1, e2: e1 > e2,
+    ast.NodeSymbol.GREATERTHANEQUAL: lambda e1, e2: e1 >= e2,
+}
 
+
+def compare_tuples(comparison, context, left_tuple, right_tuple, message):
     conditions = ()
     shape = ()
     for i, (left_element, right_element) in enumerate(zip(left_tuple, right_tuple)):
@@ -57,7 +60,7 @@ def compare_tuples(comparison, context, left_tuple, right_tuple, message):
             conditions = conditions + (ast.Node((comparison,), (), (), (ast.Node((ast.NodeSymbol.ARRAY,), (), (array_name,), ()), right_element)),)
             shape = shape + (left_element,)
         else: # neither symbolic
-            if not comparison_map[comparison](left_element, right_element):
+            if not _COMPARISON_MAP[comparison](left_element, right_element):
                 raise MOAShapeError(element_message)
             shape = shape + (left_element,)
     return context, conditions, shape
@@ -76,51 +79,71 @@ def apply_node_conditions(context, conditions):
 
 
 # shape calculation
-def calculate_shapes(context):
+@ast.interned
+def calculate_shapes(context, callback=None):
     """Postorder traversal to calculate node shapes
 
     """
-    return ast.node_traversal(context, _shape_replacement, traversal='postorder')
+    return ast.node_traversal(context, _shape_replacement, traversal='postorder', callback=callback)
 
 
-def _shape_replacement(context):
-    shape_map = {
-        (ast.NodeSymbol.ARRAY,): _shape_array,
-        (ast.NodeSymbol.TRANSPOSE,): _shape_transpose,
-        (ast.NodeSymbol.TRANSPOSEV,): _shape_transpose_vector,
-        (ast.NodeSymbol.ASSIGN,): _shape_assign,
-        (ast.NodeSymbol.SHAPE,): _shape_shape,
-        (ast.NodeSymbol.PSI,): _shape_psi,
-        (ast.NodeSymbol.PLUS,): _shape_plus_minus_divide_times,
-        (ast.NodeSymbol.MINUS,): _shape_plus_minus_divide_times,
-        (ast.NodeSymbol.TIMES,): _shape_plus_minus_divide_times,
-        (ast.NodeSymbol.DIVIDE,): _shape_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS): _shape_outer_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS): _shape_outer_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES): _shape_outer_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE): _shape_outer_plus_minus_divide_times,
-        (ast.NodeSymbol.REDUCE, ast.NodeSymbol.PLUS): _shape_reduce_plus_minus_divide_times,
-        (ast.NodeSymbol.REDUCE, ast.NodeSymbol.MINUS): _shape_reduce_plus_minus_divide_times,
-        (ast.NodeSymbol.REDUCE, ast.NodeSymbol.TIMES): _shape_reduce_plus_minus_divide_times,
-        (ast.NodeSymbol.REDUCE, ast.NodeSymbol.DIVIDE): _shape_reduce_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS  , ast.NodeSymbol.PLUS):   _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS , ast.NodeSymbol.PLUS):   _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES , ast.NodeSymbol.PLUS):   _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE, ast.NodeSymbol.PLUS):   _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS  , ast.NodeSymbol.MINUS):  _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS , ast.NodeSymbol.MINUS):  _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES , ast.NodeSymbol.MINUS):  _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE, ast.NodeSymbol.MINUS):  _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS  , ast.NodeSymbol.TIMES):  _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS , ast.NodeSymbol.TIMES):  _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES , ast.NodeSymbol.TIMES):  _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE, ast.NodeSymbol.TIMES):  _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.PLUS  , ast.NodeSymbol.DIVIDE): _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.MINUS , ast.NodeSymbol.DIVIDE): _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.TIMES , ast.NodeSymbol.DIVIDE): _shape_inner_plus_minus_divide_times,
-        (ast.NodeSymbol.DOT, ast.NodeSymbol.DIVIDE, ast.NodeSymbol.DIVIDE): _shape_inner_plus_minus_divide_times,
-    }
+def specialize_shapes(context, shapes):
+    """Substitute concrete shapes of arrays into the symbol table
+
+    shapes: Mapping[str, Tuple[int]]
+      concrete shape of arrays by name
 
+    Symbolic shape elements such as ``n`` in ``('n', 'm')`` become
+    scalar constants so that shapes and loop bounds are known when
+    calculating shapes. Returns None when the concrete shapes do not
+    match the declared shapes.
+    """
+    bindings = {}
+    for name, shape in shapes.items():
+        symbol_node = context.symbol_table[name]
+        if symbol_node.shape is None or len(symbol_node.shape) != len(shape):
+            return None
+
+        for element, value in zip(symbol_node.shape, shape):
+            if ast.is_symbolic_element(element):
+                if bindings.setdefault(element.attrib[0], value) != value:
+                    return None
+            elif element != value:
+                return None
+
+    def _substitute(elements):
+        if elements is None:
+            return None
+        return tuple(bindings.get(element.attrib[0], element) if ast.is_symbolic_element(element) else element for element in elements)
+
+    symbol_table = {}
+    for name, symbol_node in context.symbol_table.items():
+        if name in bindings:
+            symbol_table[name] = ast.SymbolNode(symbol_node.symbol, (), symbol_node.type, (bindings[name],))
+        else:
+            symbol_table[name] = ast.SymbolNode(symbol_node.symbol, _substitute(symbol_node.shape), symbol_node.type, _substitute(symbol_node.value))
+    return ast.create_context(ast=context.ast, symbol_table=symbol_table)
+
+
+# shape function registry
+_SHAPE_FUNCTIONS = {}
+
+
+def register_shape_function(symbol, shape_function):
+    """Register shape function for node symbol
+
+    symbol: tuple
+      node symbol e.g. ``(ast.NodeSymbol.PLUS,)``
+    shape_function: function
+      function that takes context with child shapes calculated and
+      returns context with node shape calculated
+    """
+    if symbol in _SHAPE_FUNCTIONS:
+        raise MOAShapeError(f'shape function for symbol {symbol} already registered with {_SHAPE_FUNCTIONS[symbol].__name__}')
+    _SHAPE_FUNCTIONS[symbol] = shape_function
+
+
+def _shape_replacement(context):
     conditions = ()
     for i in range(ast.num_node_children(context)):
         node = ast.select_node(context, (i,)).ast
@@ -128,7 +151,7 @@ def _shape_replacement(context):
             conditions = conditions + (node.child[0],)
             context = ast.replace_node(context, node.child[1], (i,))
 
-    context = shape_map[context.ast.symbol](context)
+    context = _SHAPE_FUNCTIONS[context.ast.symbol](context)
 
     if context.ast.symbol == (ast.NodeSymbol.CONDITION,):
         conditions = conditions + (context.ast.child[0],)
@@ -247,3 +270,21 @@ def _shape_plus_minus_divide_times(context):
 
     context = ast.replace_node_shape(context, shape)
     return apply_node_conditions(context, conditions)
+
+
+# core shape functions
+_BINARY_OPERATIONS = (ast.NodeSymbol.PLUS, ast.NodeSymbol.MINUS, ast.NodeSymbol.TIMES, ast.NodeSymbol.DIVIDE)
+
+register_shape_function((ast.NodeSymbol.ARRAY,), _shape_array)
+register_shape_function((ast.NodeSymbol.TRANSPOSE,), _shape_transpose)
+register_shape_function((ast.NodeSymbol.TRANSPOSEV,), _shape_transpose_vector)
+register_shape_function((ast.NodeSymbol.ASSIGN,), _shape_assign)
+register_shape_function((ast.NodeSymbol.SHAPE,), _shape_shape)
+register_shape_function((ast.NodeSymbol.PSI,), _shape_psi)
+for operation in _BINARY_OPERATIONS:
+    register_shape_function((operation,), _shape_plus_minus_divide_times)
+    register_shape_function((ast.NodeSymbol.DOT, operation), _shape_outer_plus_minus_divide_times)
+    register_shape_function((ast.NodeSymbol.REDUCE, operation), _shape_reduce_plus_minus_divide_times)
+for left_operation, right_operation in itertools.product(_BINARY_OPERATIONS, repeat=2):
+    register_shape_function((ast.NodeSymbol.DOT, left_operation, right_operation), _shape_inner_plus_minus_divide_times)
+del operation, left_operation, right_operation
@@ -0,0 +1,107 @@
+"""Compile pipeline instrumentation
+
+Pass a ``CompileStats`` to ``moa.compiler.compiler`` (or
+``LazyArray.compile``) to record per stage wall time, tree size,
+symbol table size and rule firings. Without it the compiler takes
+exactly the uninstrumented path.
+"""
+import collections
+import time
+
+from . import ast
+
+
+StageStats = collections.namedtuple(
+    'StageStats', ['stage', 'wall_time', 'num_nodes', 'symbol_table_size', 'num_rewrites', 'rule_firings'])
+
+
+def count_nodes(context):
+    """Number of nodes in ast counting shared subtrees once per occurrence"""
+    num_nodes = 0
+    stack = [context.ast]
+    while stack:
+        node = stack.pop()
+        num_nodes += 1
+        stack.extend(child for child in node.child if isinstance(child, ast.Node))
+    return num_nodes
+
+
+def rule_name(context):
+    """Name of rule applied to node e.g. "PSI(ARRAY,PLUS)"
+
+    Compound symbols such as reductions are joined by "_".
+    """
+    def _symbol_name(symbol):
+        return '_'.join(_.name for _ in symbol)
+
+    child_names = ','.join(_symbol_name(child.symbol) for child in context.ast.child if isinstance(child, ast.Node))
+    return f'{_symbol_name(context.ast.symbol)}({child_names})'
+
+
+class CompileStats:
+    """Statistics of each stage of a compile
+
+    stages: OrderedDict[str, StageStats]
+      statistics for each stage run in order e.g. "shape", "dnf",
+      "onf", and "codegen"
+    cache: str
+      "memory" or "disk" when source was found in a cache otherwise None
+    """
+    def __init__(self):
+        self.stages = collections.OrderedDict()
+        self.cache = None
+
+    def __getitem__(self, stage):
+        return self.stages[stage]
+
+    def __contains__(self, stage):
+        return stage in self.stages
+
+    @property
+    def wall_time(self):
+        return sum(stage_stats.wall_time for stage_stats in self.stages.values())
+
+    def run_stage(self, stage, stage_function, context, callback=True):
+        """Run stage_function(context) recording statistics
+
+        callback: bool
+          whether stage_function accepts a ``callback`` passed to
+          ``ast.node_traversal`` to count rule firings
+        """
+        rule_firings = collections.Counter()
+
+        def _callback(context, replacement_context):
+            rule_firings[rule_name(context)] += 1
+
+        start_time = time.perf_counter()
+        if callback:
+            result = stage_function(context, callback=_callback)
+        else:
+            result = stage_function(context)
+        wall_time = time.perf_counter() - start_time
+
+        if isinstance(result, ast.Context):
+            num_nodes, symbol_table_size = count_nodes(result), len(result.symbol_table)
+        else:
+            num_nodes, symbol_table_size = None, None
+
+        self.stages[stage] = StageStats(
+            stage=stage, wall_time=wall_time, num_nodes=num_nodes,
+            symbol_table_size=symbol_table_size, num_rewrites=sum(rule_firings.values()),
+            rule_firings=dict(rule_firings))
+        return result
+
+    def summary(self):
+        lines = [f'{"stage":<10}{"time [s]":>12}{"nodes":>10}{"symbols":>10}{"rewrites":>10}']
+        for stage_stats in self.stages.values():
+            lines.append('{:<10}{:>12.6f}{:>10}{:>10}{:>10}'.format(
+                stage_stats.stage, stage_stats.wall_time,
+                '-' if stage_stats.num_nodes is None else stage_stats.num_nodes,
+                '-' if stage_stats.symbol_table_size is None else stage_stats.symbol_table_size,
+                stage_stats.num_rewrites))
+        if self.cache is not None:
+            lines.append(f'source loaded from {self.cache} cache')
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(stages={list(self.stages.values())!r}, cache={self.cache!r})'
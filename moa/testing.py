@@ -6,6 +6,19 @@ import copy
 from . import ast, visualize
 
 
+def chain_context(num_terms, shape=(3, 4)):
+    """Context of the left deep chain A0 + A1 + ... of arrays with shape
+
+    The tree is built from nodes directly so that expressions deeper
+    than the python recursion limit are cheap to construct.
+    """
+    symbol_table = {f'A{i}': ast.SymbolNode(ast.NodeSymbol.ARRAY, shape, None, None) for i in range(num_terms)}
+    tree = ast.Node((ast.NodeSymbol.ARRAY,), None, ('A0',), ())
+    for i in range(1, num_terms):
+        tree = ast.Node((ast.NodeSymbol.PLUS,), None, (), (tree, ast.Node((ast.NodeSymbol.ARRAY,), None, (f'A{i}',), ())))
+    return ast.create_context(ast=tree, symbol_table=symbol_table)
+
+
 def assert_transformation(tree, symbol_table, expected_tree, expected_symbol_table, operation, debug=False):
     context = ast.create_context(ast=tree, symbol_table=symbol_table)
     expected_context = ast.create_context(ast=expected_tree, symbol_table=expected_symbol_table)
@@ -31,20 +44,26 @@ def assert_context_equal(left_context, right_context):
 
 
 def assert_ast_equal(left_ast, right_ast, index=()):
-    if left_ast.symbol != right_ast.symbol:
-        raise ValueError(f'symbol {left_ast.symbol} != {right_ast.symbol} at node path {index}')
+    stack = [(left_ast, right_ast, index)]
+    while stack:
+        left_ast, right_ast, index = stack.pop()
+        if left_ast is right_ast: # interned nodes are identical
+            continue
+
+        if left_ast.symbol != right_ast.symbol:
+            raise ValueError(f'symbol {left_ast.symbol} != {right_ast.symbol} at node path {index}')
 
-    if left_ast.shape != right_ast.shape:
-        raise ValueError(f'shape {left_ast.shape} != {right_ast.shape} at node path {index}')
+        if left_ast.shape != right_ast.shape:
+            raise ValueError(f'shape {left_ast.shape} != {right_ast.shape} at node path {index}')
 
-    if left_ast.attrib != right_ast.attrib:
-        raise ValueError(f'attrib {left_ast.attrib} != {right_ast.attrib} at node path {index}')
+        if left_ast.attrib != right_ast.attrib:
+            raise ValueError(f'attrib {left_ast.attrib} != {right_ast.attrib} at node path {index}')
 
-    if len(left_ast.child) != len(right_ast.child):
-        raise ValueError(f'left and right node have differing number of children {len(left_ast.child)} != {len(right_ast.child)} at node path {index}')
+        if len(left_ast.child) != len(right_ast.child):
+            raise ValueError(f'left and right node have differing number of children {len(left_ast.child)} != {len(right_ast.child)} at node path {index}')
 
-    for i, (left_child, right_child) in enumerate(zip(left_ast.child, right_ast.child)):
-        assert_ast_equal(left_child, right_child, index + (i,))
+        for i, (left_child, right_child) in reversed(tuple(enumerate(zip(left_ast.child, right_ast.child)))):
+            stack.append((left_child, right_child, index + (i,)))
 
 
 def assert_symbol_table_equal(left_symbol_table, right_symbol_table):
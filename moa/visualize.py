@@ -14,6 +14,7 @@ _NODE_LABEL_MAP = {
     (ast.NodeSymbol.FUNCTION,): "function",
     (ast.NodeSymbol.CONDITION,): "condition",
     (ast.NodeSymbol.LOOP,): "loop",
+    (ast.NodeSymbol.LOOP, ast.NodeSymbol.PARALLEL): "parallel loop",
     (ast.NodeSymbol.INITIALIZE,): 'initialize',
     (ast.NodeSymbol.ERROR,): 'error',
     (ast.NodeSymbol.BLOCK,): 'block',
@@ -109,7 +110,7 @@ def _node_label(context):
         message = context.ast.attrib[0]
         if message is not None:
             node_label['value'] = message
-    elif context.ast.symbol in {(ast.NodeSymbol.LOOP,), (ast.NodeSymbol.INITIALIZE,)}:
+    elif context.ast.symbol in {(ast.NodeSymbol.LOOP,), (ast.NodeSymbol.LOOP, ast.NodeSymbol.PARALLEL), (ast.NodeSymbol.INITIALIZE,)}:
         symbol_node = context.ast.attrib[0]
         if symbol_node is not None:
             node_label['value'] = symbol_node
@@ -137,28 +138,27 @@ def print_ast(context, vector_value=True):
             label += ' {value}'
         return label.format(**node_label)
 
-    def _print_node(context, prefix=""):
-        if ast.num_node_children(context) == 0:
-            return
-
+    def _child_lines(context, prefix):
         # no need to traverse condition node since converted to python source
         if context.ast.symbol == (ast.NodeSymbol.CONDITION,):
-            child_context = ast.select_node(context, (1,))
-            print(prefix + "└──", _print_node_label(child_context))
-            _print_node(child_context, prefix + "    ")
-            return
+            return ((ast.select_node(context, (1,)), prefix, "└──", prefix + "    "),)
 
-        for i in range(ast.num_node_children(context) - 1):
+        num_children = ast.num_node_children(context)
+        lines = []
+        for i in range(num_children):
             child_context = ast.select_node(context, (i,))
-            print(prefix + "├──", _print_node_label(child_context))
-            _print_node(child_context,  prefix + "│   ")
-
-        child_context = ast.select_node(context, (-1,))
-        print(prefix + "└──", _print_node_label(child_context))
-        _print_node(child_context, prefix + "    ")
+            if i < num_children - 1:
+                lines.append((child_context, prefix, "├──", prefix + "│   "))
+            else:
+                lines.append((child_context, prefix, "└──", prefix + "    "))
+        return lines
 
     print(_print_node_label(context))
-    _print_node(context)
+    stack = list(reversed(_child_lines(context, "")))
+    while stack:
+        child_context, prefix, connector, child_prefix = stack.pop()
+        print(prefix + connector, _print_node_label(child_context))
+        stack.extend(reversed(_child_lines(child_context, child_prefix)))
 
 
 def visualize_ast(context, comment='MOA AST', with_attrs=True, vector_value=True):
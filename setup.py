@@ -8,7 +8,7 @@ with open(path.join(here, 'README.md'), encoding='utf-8') as f:
 setup(
     name='python-moa',
     version='0.5.1',
-    python_requires='>=3.6',
+    python_requires='>=3.8',
     description='Python Mathematics of Arrays (MOA)',
     long_description=long_description,
     long_description_content_type='text/markdown',
@@ -21,8 +21,7 @@ setup(
         'Development Status :: 3 - Alpha',
         "License :: OSI Approved :: BSD License",
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3 :: Only',
         'Intended Audience :: Developers',
         'Intended Audience :: Science/Research',
@@ -32,6 +31,7 @@ setup(
     extras_require={
         'moa': ['sly'],
         'viz': ['graphviz'],
+        'llvm': ['llvmlite>=0.44'],
         'test': ['sly', 'pytest', 'pytest-cov'],
         'docs': ['sphinx', 'sphinxcontrib-tikz'],
         'benchmark': ['numpy', 'numba']
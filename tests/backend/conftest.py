@@ -0,0 +1,63 @@
+import os
+import shutil
+
+import pytest
+
+from moa.frontend import LazyArray
+
+
+def _A(shape=('n', 'm')):
+    return LazyArray(name='A', shape=shape)
+
+
+def _B(shape=('n', 'm')):
+    return LazyArray(name='B', shape=shape)
+
+
+@pytest.fixture
+def A():
+    """Factory of LazyArray A by shape"""
+    return _A
+
+
+@pytest.fixture
+def B():
+    """Factory of LazyArray B by shape"""
+    return _B
+
+
+# (expression of A and B factories, equivalent numpy function of A and B)
+EXPRESSIONS = [
+    (lambda A, B: A() + B(), lambda A, B: A + B),
+    (lambda A, B: A().transpose() - B().transpose(), lambda A, B: A.T - B.T),
+    (lambda A, B: A()[1] / B()[2], lambda A, B: A[1] / B[2]),
+    (lambda A, B: A().transpose()[1], lambda A, B: A[:, 1]),
+    (lambda A, B: A().reduce('+'), lambda A, B: A.sum(axis=0)),
+    (lambda A, B: A().reduce('*'), lambda A, B: A.prod(axis=0)),
+    (lambda A, B: A().reduce('-'), lambda A, B: -A.sum(axis=0)),
+    (lambda A, B: A().reduce('+').reduce('+'), lambda A, B: A.sum()),
+    (lambda A, B: A().inner('+', '*', B().transpose()), lambda A, B: A.dot(B.T)),
+    (lambda A, B: A().outer('*', B()), lambda A, B: A[..., None, None] * B),
+    (lambda A, B: (A().transpose() + B().transpose()).reduce('+'), lambda A, B: (A + B).sum(axis=1)),
+    (lambda A, B: (A() + B()) * (A() + B()), lambda A, B: (A + B) * (A + B)),
+]
+
+
+@pytest.fixture(params=EXPRESSIONS)
+def expression(request):
+    """Pair of expression and equivalent numpy function from ``EXPRESSIONS``"""
+    expression_function, numpy_function = request.param
+    return expression_function(_A, _B), numpy_function
+
+
+@pytest.fixture(params=['numpy', 'numba', 'c', 'llvm'])
+def backend(request):
+    """Backends compiling expressions to functions of numpy arrays"""
+    pytest.importorskip('numpy')
+    if request.param == 'numba':
+        pytest.importorskip('numba')
+    elif request.param == 'c' and shutil.which(os.environ.get('CC', 'cc')) is None:
+        pytest.skip('requires a C compiler')
+    elif request.param == 'llvm':
+        pytest.importorskip('llvmlite')
+    return request.param
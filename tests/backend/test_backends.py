@@ -0,0 +1,38 @@
+import pytest
+
+from moa.frontend import LazyArray
+from moa.compiler import compile_function
+
+numpy = pytest.importorskip('numpy')
+
+
+@pytest.mark.parametrize('optimize', [True, False])
+def test_backend(tmp_path, backend, expression, optimize):
+    expression, numpy_function = expression
+    arrays = {'A': numpy.random.random((7, 5)), 'B': numpy.random.random((7, 5))}
+    function = compile_function(expression.context, backend=backend, optimize=optimize, cache_dir=str(tmp_path))
+
+    # positional arguments are sorted by name
+    result = function(*(arrays[name] for name in sorted(arrays) if name in expression.context.symbol_table))
+    expected = numpy_function(**arrays)
+    assert result.shape == expected.shape
+    assert numpy.allclose(result, expected)
+
+
+@pytest.mark.parametrize('index', [1, numpy.int64(1), numpy.array(1), numpy.array(1, dtype=numpy.int32)])
+def test_backend_index(tmp_path, backend, index):
+    expression = (LazyArray(name='A', shape=('n', 'm')) + LazyArray(name='B', shape=('n', 'm'))).transpose()['i']
+    function = compile_function(expression.context, backend=backend, cache_dir=str(tmp_path))
+
+    A, B = numpy.random.random((4, 3)), numpy.random.random((4, 3))
+    assert numpy.allclose(function(A, B, index), (A + B).T[1])
+
+
+@pytest.mark.parametrize('index', [1., numpy.float64(1), numpy.array(1.)])
+def test_backend_index_not_integer(tmp_path, backend, index):
+    expression = (LazyArray(name='A', shape=('n', 'm')) + LazyArray(name='B', shape=('n', 'm'))).transpose()['i']
+    function = compile_function(expression.context, backend=backend, cache_dir=str(tmp_path))
+
+    A, B = numpy.random.random((4, 3)), numpy.random.random((4, 3))
+    with pytest.raises(Exception):
+        function(A, B, index)
@@ -0,0 +1,85 @@
+import array
+import os
+import shutil
+
+import pytest
+
+from moa.frontend import LazyArray
+from moa.backend import generate_c_source, load_c_function
+from moa.backend.c import compile_c_source, MOACompileError
+from moa.cache import default_cache_dir, MOACacheError
+
+numpy = pytest.importorskip('numpy')
+
+pytestmark = pytest.mark.skipif(shutil.which(os.environ.get('CC', 'cc')) is None, reason='requires a C compiler')
+
+
+def test_c_backend_arrays(tmp_path, A, B):
+    function = load_c_function(A().inner('+', '*', B(('m', 'k'))).compile(backend='c', use_cache=False), cache_dir=str(tmp_path))
+    assert function.arguments == ('A', 'B')
+
+    # strided views are passed without copying
+    A = numpy.random.random((12, 10))[::2, 1::2]
+    B = numpy.asfortranarray(numpy.random.random((5, 3)))
+    assert numpy.allclose(function(A, B), A.dot(B))
+    assert numpy.allclose(function(B=B, A=A), A.dot(B))
+
+    # any buffer of doubles
+    A = memoryview(array.array('d', range(6))).cast('B').cast('d', (2, 3))
+    B = memoryview(array.array('d', range(3))).cast('B').cast('d', (3, 1))
+    assert numpy.allclose(function(A, B), numpy.arange(6.).reshape(2, 3).dot(numpy.arange(3.).reshape(3, 1)))
+
+    with pytest.raises(Exception, match='arguments do not match declared shape'):
+        function(numpy.zeros((2, 3)), numpy.zeros((4, 2)))
+    with pytest.raises(Exception, match='arguments have invalid dimension'):
+        function(numpy.zeros((2, 3)), numpy.zeros(3))
+    with pytest.raises(TypeError):
+        function(numpy.zeros((2, 3), dtype=numpy.int64), numpy.zeros((3, 2)))
+    with pytest.raises(TypeError):
+        function(numpy.zeros((2, 3)))
+
+
+def test_c_backend_symbolic_index(tmp_path, A):
+    expression = (A() + LazyArray(name='B', shape=('l', 3))).transpose()['i']
+    function = load_c_function(expression.compile(backend='c', use_cache=False), cache_dir=str(tmp_path))
+    assert function.arguments == ('A', 'B', 'i')
+
+    A = numpy.arange(6.).reshape(2, 3)
+    B = numpy.arange(6., 12.).reshape(2, 3)
+    assert numpy.allclose(function(A, B, numpy.array(1)), (A + B).T[1])
+
+
+def test_c_backend_disk_cache(tmp_path, A):
+    source = generate_c_source(A().reduce('+')._onf())
+    path = compile_c_source(source, cache_dir=str(tmp_path))
+    assert os.path.dirname(path) == str(tmp_path) and path.endswith('.so')
+
+    modified_time = os.stat(path).st_mtime_ns
+    assert compile_c_source(source, cache_dir=str(tmp_path)) == path
+    assert os.stat(path).st_mtime_ns == modified_time
+    assert load_c_function(source, cache_dir=str(tmp_path)) is load_c_function(source, cache_dir=str(tmp_path))
+
+    with pytest.raises(MOACompileError):
+        compile_c_source(source + 'not C', cache_dir=str(tmp_path))
+
+
+def test_c_backend_cache_permissions(tmp_path, monkeypatch, A):
+    monkeypatch.delenv('MOA_CACHE_DIR', raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    assert default_cache_dir() == str(tmp_path / 'moa')
+
+    source = generate_c_source(A().reduce('+')._onf())
+    path = compile_c_source(source)
+    assert os.path.dirname(path) == str(tmp_path / 'moa')
+    assert os.stat(tmp_path / 'moa').st_mode & 0o777 == 0o700
+
+    # shared objects writable by other users may have been planted
+    os.chmod(path, 0o777)
+    with pytest.raises(MOACacheError):
+        compile_c_source(source)
+
+    shared_directory = tmp_path / 'shared'
+    shared_directory.mkdir()
+    os.chmod(shared_directory, 0o777)
+    with pytest.raises(MOACacheError):
+        compile_c_source(source, cache_dir=str(shared_directory))
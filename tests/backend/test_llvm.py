@@ -0,0 +1,65 @@
+import pytest
+
+from moa.frontend import LazyArray
+from moa.backend import generate_llvm_ir, load_llvm_function, LLVMOptions
+from moa.compiler import compile_function
+
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('llvmlite')
+
+
+def test_llvm_backend_arrays(A, B):
+    function = load_llvm_function(A().inner('+', '*', B(('m', 'k'))).compile(backend='llvm', use_cache=False))
+    assert function.arguments == ('A', 'B')
+
+    A = numpy.random.random((12, 10))[::2, 1::2]
+    B = numpy.asfortranarray(numpy.random.random((5, 3)))
+    assert numpy.allclose(function(A, B), A.dot(B))
+
+    with pytest.raises(Exception, match='arguments do not match declared shape'):
+        function(numpy.zeros((2, 3)), numpy.zeros((4, 2)))
+    with pytest.raises(Exception, match='arguments have invalid dimension'):
+        function(numpy.zeros((2, 3)), numpy.zeros(3))
+    with pytest.raises(TypeError, match='LLVM backend requires arrays of doubles'):
+        function(numpy.zeros((2, 3), dtype=numpy.int64), numpy.zeros((3, 2)))
+
+
+def test_llvm_backend_symbolic_index(A):
+    expression = (A() + LazyArray(name='B', shape=('l', 3))).transpose()['i']
+    function = load_llvm_function(expression.compile(backend='llvm', use_cache=False))
+    assert function.arguments == ('A', 'B', 'i')
+
+    A = numpy.arange(6.).reshape(2, 3)
+    B = numpy.arange(6., 12.).reshape(2, 3)
+    assert numpy.allclose(function(A, B, numpy.array(1)), (A + B).T[1])
+
+
+@pytest.mark.parametrize('options', [
+    LLVMOptions(),
+    LLVMOptions(opt_level=0, vectorize=False),
+    LLVMOptions(fastmath=True),
+])
+def test_llvm_backend_options(options, A, B):
+    source = generate_llvm_ir(A().reduce('+')._onf(), options)
+    # the inner loop is a reduction only vectorized with fastmath
+    assert ('llvm.loop.vectorize.enable' in source) == (options.vectorize and options.fastmath)
+    assert ('fadd fast' in source) == options.fastmath
+    assert ('llvm.loop.vectorize.enable' in generate_llvm_ir((A() + B())._onf(), options)) == options.vectorize
+
+    function = load_llvm_function(source, options)
+    assert function is load_llvm_function(source, options)
+    array = numpy.random.random((4, 3))
+    assert numpy.allclose(function(array), array.sum(axis=0))
+
+    # options are part of the compile cache key
+    assert ('fadd fast' in A().reduce('+').compile(backend='llvm', llvm_options=options)) == options.fastmath
+
+
+def test_llvm_backend_vectorize_hints(capfd):
+    # loops marked for vectorization that are not vectorized print warnings
+    expression = LazyArray(name='A', shape=(60, 60)).inner('+', '*', LazyArray(name='B', shape=(60, 60)))
+    function = compile_function(expression.context, backend='llvm', specialize=True)
+    A = numpy.random.random((60, 60))
+    B = numpy.random.random((60, 60))
+    assert numpy.allclose(function(A, B), A.dot(B))
+    assert 'loop not vectorized' not in capfd.readouterr().err
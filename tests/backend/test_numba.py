@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from moa.backend import generate_numba_source, NumbaOptions
+from moa.cache import DiskCache
+
+numpy = pytest.importorskip('numpy')
+numba = pytest.importorskip('numba')
+
+
+def _function(source):
+    namespace = {'numba': numba, 'numpy': numpy}
+    exec(source, namespace)
+    return namespace['f']
+
+
+def test_numba_backend_options(A):
+    source = generate_numba_source(A().reduce('+')._onf(), NumbaOptions(fastmath=True, nogil=True, boundscheck=False))
+    assert source.startswith('\n\n@numba.jit(nopython=True, fastmath=True, parallel=False, nogil=True, cache=False, boundscheck=False)\n')
+
+    source = generate_numba_source(A().reduce('+')._onf())
+    assert '@numba.jit(nopython=True, fastmath=False, parallel=False, nogil=False, cache=False)' in source
+
+    # options are part of the compile cache key
+    assert 'fastmath=False' in A().reduce('+').compile(backend='numba')
+    assert 'fastmath=True' in A().reduce('+').compile(backend='numba', numba_options=NumbaOptions(fastmath=True))
+
+
+@pytest.mark.parametrize('expression_function, dtypes, expected_dtype', [
+    (lambda A, B: A() + B(), ('float32', 'float32'), 'float32'),
+    (lambda A, B: A() + B(), ('int32', 'float64'), 'float64'),
+    (lambda A, B: A() / B(), ('int64', 'int64'), 'float64'),
+    (lambda A, B: A().reduce('+'), ('int64',), 'int64'),
+    (lambda A, B: A().inner('+', '*', B().transpose()), ('float32', 'float32'), 'float32'),
+])
+def test_numba_backend_dtype(expression_function, dtypes, expected_dtype, A, B):
+    expression = expression_function(A, B)
+    arrays = [(numpy.arange(12).reshape(3, 4) + 1).astype(dtype) for dtype in dtypes]
+    function = _function(expression.compile(backend='numba', use_cache=False))
+    result = function(*arrays)
+    assert result.dtype == numpy.dtype(expected_dtype)
+
+    python_function = _function(expression.compile(backend='numba', numba_options=NumbaOptions(dtype='float64'), use_cache=False)).py_func
+    assert numpy.allclose(result, python_function(*arrays))
+
+
+def test_numba_backend_disk_cache(tmp_path, A):
+    key = 'numba_reduce'
+    disk_cache = DiskCache(str(tmp_path))
+    disk_cache.set(key, A().reduce('+').compile(backend='numba', numba_options=NumbaOptions(cache=True), use_cache=False))
+    module = disk_cache.load_module(key, namespace={'numba': numba, 'numpy': numpy})
+
+    A = numpy.random.random((3, 4))
+    assert numpy.allclose(module.f(A), A.sum(axis=0))
+
+
+@pytest.mark.parametrize('expression_function, numpy_function', [
+    (lambda A, B: A() + B(), lambda A, B: A + B),
+    (lambda A, B: A().reduce('+'), lambda A, B: A.sum(axis=0)),
+    (lambda A, B: A().transpose().reduce('*'), lambda A, B: A.prod(axis=1)),
+    (lambda A, B: A().inner('+', '*', B().transpose()), lambda A, B: A.dot(B.T)),
+])
+def test_numba_backend_parallel(expression_function, numpy_function, A, B):
+    source = expression_function(A, B).compile(backend='numba', numba_options=NumbaOptions(parallel=True), use_cache=False)
+    assert 'numba.prange(' in source
+    function = _function(source)
+
+    A, B = numpy.random.random((130, 7)), numpy.random.random((130, 7))
+    arguments = {'A': A, 'B': B}
+    result = function(**{name: arguments[name] for name in function.py_func.__code__.co_varnames[:function.py_func.__code__.co_argcount]})
+    assert numpy.allclose(result, numpy_function(A, B))
+
+
+def test_numba_backend_compile_function_disk_cache(tmp_path):
+    # a second process loads the kernel compiled by the first from disk
+    script = (
+        'import numpy\n'
+        'from moa.frontend import LazyArray\n'
+        'from moa.backend import NumbaOptions\n'
+        'from moa.compiler import compile_function\n'
+        'expression = LazyArray(name="A", shape=("n", "m")).reduce("+")\n'
+        f'function = compile_function(expression.context, backend="numba", numba_options=NumbaOptions(cache=True), cache_dir={str(tmp_path)!r})\n'
+        'A = numpy.random.random((3, 4))\n'
+        'assert numpy.allclose(function(A), A.sum(axis=0))\n'
+        'print(sum(function.stats.cache_hits.values()))\n')
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    cache_hits = [subprocess.run([sys.executable, '-c', script], env=environment, capture_output=True, text=True, check=True).stdout.strip() for _ in range(2)]
+    assert cache_hits == ['0', '1']
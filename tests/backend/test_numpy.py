@@ -0,0 +1,98 @@
+import ast as python_ast_module
+
+import pytest
+
+from moa import ast
+from moa.frontend import LazyArray
+from moa.optimize import optimize
+from moa.backend import generate_numpy_source, generate_python_source
+from moa.backend.numpy import vectorize, MOAVectorizeError
+from moa.backend.python import vectorize_innermost_loops
+
+numpy = pytest.importorskip('numpy')
+
+
+def test_numpy_backend_source(A, B):
+    source = A().inner('+', '*', B(('m', 'k'))).compile(backend='numpy', use_cache=False)
+    assert "numpy.einsum('ab,bc->ac', A, B, optimize=True)" in source
+    assert 'for ' not in source
+
+
+def test_numpy_backend_copy(A):
+    local_dict = {}
+    exec(A().compile(backend='numpy', use_cache=False), {'numpy': numpy}, local_dict)
+    A = numpy.random.random((3, 4))
+    result = local_dict['f'](A=A)
+    assert numpy.array_equal(result, A) and not numpy.shares_memory(result, A)
+
+
+def test_numpy_backend_fallback():
+    # psi with repeated index (diagonal) is not vectorized
+    tree = ast.Node((ast.NodeSymbol.PSI,), (3,), (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), (2,), ('_a1',), ()),
+        ast.Node((ast.NodeSymbol.ARRAY,), (3, 3), ('A',), ())))
+    index_node = ast.Node((ast.NodeSymbol.ARRAY,), (), ('_i0',), ())
+    symbol_table = {
+        '_i0': ast.SymbolNode(ast.NodeSymbol.INDEX, (), None, (0, 3, 1)),
+        '_a1': ast.SymbolNode(ast.NodeSymbol.ARRAY, (2,), None, (index_node, index_node)),
+        'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3, 3), None, None),
+    }
+    context = ast.create_context(ast=tree, symbol_table=symbol_table)
+    with pytest.raises(MOAVectorizeError):
+        vectorize(context, tree)
+    assert generate_numpy_source(None, context) is None
+
+
+def test_python_backend_numpy_arrays(A, B):
+    context = (A() + B())._onf()
+    assert 'numpy.zeros((n, m))' in generate_python_source(context, materialize_scalars=True, use_numpy=True)
+
+
+@pytest.mark.parametrize('expression_function', [
+    lambda A, B: A() + B(),
+    lambda A, B: A().reduce('+'),
+    lambda A, B: A().transpose().reduce('*'),
+    lambda A, B: A().reduce('-'),
+    lambda A, B: A().inner('+', '*', B().transpose()),
+    lambda A, B: A().outer('*', B()),
+    lambda A, B: (LazyArray(name='B', shape=(4,)) + A((3, 4)).reduce('+')) + (A((3, 4)) + A((3, 4))).reduce('*'),
+])
+def test_python_backend_vectorize_innermost(expression_function, A, B):
+    arrays = {'A': numpy.random.random((3, 4)), 'B': numpy.random.random((3, 4))}
+    context = expression_function(A, B)._onf()
+    if context.symbol_table.get('B') is not None and context.symbol_table['B'].shape == (4,):
+        arrays['B'] = numpy.random.random(4)
+
+    results = []
+    for vectorize_innermost in (False, True):
+        local_dict = {}
+        exec(generate_python_source(context, materialize_scalars=True, use_numpy=True, vectorize_innermost=vectorize_innermost), {'numpy': numpy}, local_dict)
+        function = local_dict['f']
+        results.append(function(**{name: arrays[name] for name in function.__code__.co_varnames[:function.__code__.co_argcount]}))
+    assert numpy.allclose(*results)
+
+
+def test_python_backend_vectorize_innermost_source(A, B):
+    source = generate_python_source(A().reduce('+')._onf(), materialize_scalars=True, vectorize_innermost=True)
+    assert source.count('for ') == 1
+    assert '_a12 = (_a12 + numpy.sum(A[(slice(0, n, 1), _i3)]))' in source
+
+    source = generate_python_source(optimize((A() + B())._onf()), materialize_scalars=True, vectorize_innermost=True)
+    assert source.count('for ') == 1
+    assert '_a13[(_i4, slice(0, m, 1))] = (A[(_i4, slice(0, m, 1))] + B[(_i4, slice(0, m, 1))])' in source
+
+
+@pytest.mark.parametrize('source', [
+    # loop carried dependence
+    'for j in range(0, n, 1):\n    A[(j,)] = A[(j + 1,)]',
+    'for j in range(0, n, 1):\n    A[(j,)] = A[(0,)]',
+    # diagonal
+    'for j in range(0, n, 1):\n    B[(j,)] = A[(j, j)]',
+    # scalar read before written
+    'for j in range(0, n, 1):\n    B[(j,)] = t\n    t = A[(j,)]',
+    # accumulator read within loop
+    'for j in range(0, n, 1):\n    t = (t + A[(j,)])\n    B[(j,)] = t',
+])
+def test_python_backend_vectorize_innermost_unchanged(source):
+    python_ast = vectorize_innermost_loops(python_ast_module.parse(source))
+    assert isinstance(python_ast.body[0], python_ast_module.For)
@@ -1,9 +1,10 @@
-import ast
+import ast as python_ast
 
 import astunparse
 import pytest
 
-from moa import ast, backend
+from moa import ast, backend, testing
+from moa.backend import python as python_backend
 
 
 @pytest.mark.parametrize('symbol_table, tree, expected_source', [
@@ -112,3 +113,91 @@ def test_python_backend_materialize_scalar():
 def test_python_backend_integration(symbol_table, tree, expected_source):
     context = ast.create_context(ast=tree, symbol_table=symbol_table)
     assert expected_source == backend.generate_python_source(context)
+
+
+def test_python_backend_register_ast_function(monkeypatch):
+    monkeypatch.setattr(python_backend, '_NODE_AST_MAP', dict(python_backend._NODE_AST_MAP))
+
+    def _ast_rav(context):
+        return ast.create_context(
+            ast=python_ast.Call(func=python_ast.Name(id='ravel', ctx=python_ast.Load()), args=[ast.select_node(context, (0,)).ast], keywords=[]),
+            symbol_table=context.symbol_table)
+
+    python_backend.register_ast_function((ast.NodeSymbol.RAV,), _ast_rav)
+
+    symbol_table = {'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (2, 3), None, None)}
+    tree = ast.Node((ast.NodeSymbol.RAV,), (6,), (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), (2, 3), ('A',), ()),))
+    context = ast.create_context(ast=tree, symbol_table=symbol_table)
+    assert backend.generate_python_source(context) == 'ravel(A)'
+
+    with pytest.raises(ValueError):
+        python_backend.register_ast_function((ast.NodeSymbol.RAV,), _ast_rav)
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_python_backend_function(use_numpy):
+    from moa.frontend import LazyArray
+    from moa.array import Array
+    from moa.optimize import optimize
+
+    expression = LazyArray(name='A', shape=('n', 'm')).inner('+', '*', LazyArray(name='B', shape=('m', 'k')))
+    context = optimize(expression._onf())
+    function = python_backend.generate_python_function(context, use_numpy=use_numpy)
+
+    namespace = python_backend.default_namespace(use_numpy=use_numpy)
+    exec(backend.generate_python_source(context, materialize_scalars=True, use_numpy=use_numpy), namespace)
+    if use_numpy:
+        numpy = pytest.importorskip('numpy')
+        A, B = numpy.arange(6.).reshape(2, 3), numpy.arange(12.).reshape(3, 4)
+        assert numpy.array_equal(function(A, B), namespace['f'](A, B))
+    else:
+        A, B = Array((2, 3), list(range(6))), Array((3, 4), list(range(12)))
+        assert function(A, B).value == namespace['f'](A, B).value
+
+    # source is generated on demand from the compiled python ast
+    source = python_backend.python_function_source(function)
+    assert source.lstrip().startswith('def f(A, B):')
+    assert ('numpy.zeros((n, k))' in source) == use_numpy
+
+    with pytest.raises(Exception, match='arguments do not match declared shape'):
+        function(Array((2, 3)), Array((2, 4)))
+
+
+def test_python_backend_function_index_argument():
+    from moa.frontend import LazyArray
+    from moa.array import Array
+
+    expression = (LazyArray(name='A', shape=('n', 'm')) + LazyArray(name='B', shape=('n', 'm'))).transpose()['i']
+    function = python_backend.generate_python_function(expression._onf())
+    A, B = Array((2, 3), list(range(6))), Array((2, 3), list(range(6, 12)))
+    # index arguments are python integers like in the other backends
+    assert function(A, B, 1).value == [8, 14]
+
+
+def test_python_backend_function_deep_expression():
+    # left deep chain A0 + A1 + ... deeper than python recursion limit
+    from moa.array import Array
+    from moa.onf import reduce_to_onf
+    from moa.dnf import reduce_to_dnf
+    from moa.shape import calculate_shapes
+
+    num_terms = 1500
+    context = reduce_to_onf(reduce_to_dnf(calculate_shapes(testing.chain_context(num_terms, shape=(2,)))))
+
+    function = python_backend.generate_python_function(context)
+    assert function(**{f'A{i}': Array((2,), [1, 2]) for i in range(num_terms)}).value == [num_terms, 2 * num_terms]
+
+
+def test_python_backend_function_without_astunparse():
+    import subprocess
+    import sys
+
+    code = '\n'.join([
+        'import sys',
+        'from moa.frontend import LazyArray',
+        'from moa.backend.python import generate_python_function',
+        "generate_python_function((LazyArray(name='A', shape=(2, 3)) + LazyArray(name='B', shape=(2, 3)))._onf())",
+        "assert 'astunparse' not in sys.modules",
+    ])
+    subprocess.run([sys.executable, '-c', code], check=True)
@@ -1,7 +1,9 @@
 import pytest
 
 from moa.frontend import LazyArray
-from moa import ast, testing, visualize
+from moa import ast, optimize, testing, visualize
+from moa.compiler import function_cache
+from moa.array import Array
 
 
 def test_array_single_array():
@@ -243,3 +245,61 @@ def test_array_index_tuple():
     context = ast.create_context(ast=node, symbol_table=symbol_table)
 
     testing.assert_context_equal(context, expression.context)
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+def test_array_evaluate(backend):
+    numpy = pytest.importorskip('numpy')
+    function_cache.clear()
+
+    expression = LazyArray(name='A', shape=('n', 'm')) + LazyArray(name='B', shape=('n', 'm'))
+    A, B = numpy.random.random((3, 4)), numpy.random.random((3, 4))
+    result = expression.evaluate({'A': A, 'B': B}, backend=backend)
+    assert numpy.allclose(numpy.reshape(getattr(result, 'value', result), result.shape), A + B)
+
+    # callable compiled once per options
+    expression.evaluate({'B': B, 'A': A}, backend=backend)
+    expression.evaluate({'B': B, 'A': A}, backend=backend, optimize=[optimize.fuse_loops])
+    expression.evaluate({'B': B, 'A': A}, backend=backend, optimize=[optimize.fuse_loops])
+    assert function_cache.info().misses == 2
+
+    with pytest.raises(TypeError, match='missing arguments B'):
+        expression.evaluate({'A': A}, backend=backend)
+    with pytest.raises(TypeError, match='unexpected arguments C'):
+        expression.evaluate({'A': A, 'B': B, 'C': B}, backend=backend)
+
+    # modifying the expression compiles a new callable
+    expression = expression.reduce('+')
+    result = expression(A=A, B=B)
+    assert numpy.allclose(result.value, (A + B).sum(axis=0))
+    assert function_cache.info().misses == 3
+
+
+def test_array_deep_expression():
+    # joining symbol tables only rewrites the right operand so building long chains is linear
+    num_terms = 10000
+    expression = LazyArray(name='A0', shape=('n', 3))
+    for i in range(1, num_terms):
+        expression = expression + LazyArray(name=f'A{i}', shape=('n', 3))
+    assert len(expression.context.symbol_table) == num_terms + 1
+
+    node, depth = expression.context.ast, 0
+    while node.child:
+        node, depth = node.child[0], depth + 1
+    assert depth == num_terms - 1
+
+    expression = LazyArray(name='A0', shape=(3, 4))
+    for i in range(1, 1000):
+        expression = expression + LazyArray(name=f'A{i}', shape=(3, 4))
+    testing.assert_context_equal(expression.context, testing.chain_context(1000))
+
+    # generated symbols of the right operands are renamed to unused names
+    num_terms = 20
+    expression = LazyArray(name='A0', shape=(3, 2)).transpose([1, 0])
+    for i in range(1, num_terms):
+        expression = expression + LazyArray(name=f'A{i}', shape=(3, 2)).transpose([1, 0])
+    assert len([name for name in expression.context.symbol_table if name.startswith('_a')]) == num_terms
+
+    arrays = {f'A{i}': Array((3, 2), [i * j for j in range(6)]) for i in range(num_terms)}
+    total = sum(range(num_terms))
+    assert expression(**arrays).value == [total * j for j in (0, 2, 4, 1, 3, 5)]
@@ -242,32 +242,24 @@ def test_join_symbol_tables_simple():
 
     new_symbol_table, new_left_context, new_right_context = ast.join_symbol_tables(left_context, right_context)
 
-    assert new_symbol_table == {
-        'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3, 4), None, None),
-        'B': ast.SymbolNode(ast.NodeSymbol.ARRAY, (2, 4), None, None),
-        'm': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
-        '_a0': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, (1,)),
-        '_a1': ast.SymbolNode(ast.NodeSymbol.ARRAY, (ast.Node((ast.NodeSymbol.ARRAY,), (), ('_a0',), ()), ast.Node((ast.NodeSymbol.ARRAY,), (), ('m',), ())), None, None),
-    }
-
-    expected_left_context = ast.create_context(
-        ast=ast.Node((ast.NodeSymbol.PLUS,), None, (), (
-            ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ()),
-            ast.Node((ast.NodeSymbol.ARRAY,), None, ('B',), ()),)),
-        symbol_table={'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3, 4), None, None),
-                      'B': ast.SymbolNode(ast.NodeSymbol.ARRAY, (2, 4), None, None)})
+    # left context is kept and generated symbols of the right context are renamed to unused names
+    assert new_left_context == left_context
+    array_name = new_right_context.ast.child[1].attrib[0]
+    shape_name = new_right_context.symbol_table[array_name].shape[0].attrib[0]
+    assert array_name.startswith('_a') and shape_name.startswith('_a')
+    assert not {array_name, shape_name} & left_symbol_table.keys()
 
     expected_right_context = ast.create_context(
         ast=ast.Node((ast.NodeSymbol.MINUS,), None, (), (
             ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ()),
-            ast.Node((ast.NodeSymbol.ARRAY,), None, ('_a1',), ()),)),
+            ast.Node((ast.NodeSymbol.ARRAY,), None, (array_name,), ()),)),
         symbol_table={'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3, 4), None, None),
                       'm': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
-                      '_a0': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, (1,)),
-                      '_a1': ast.SymbolNode(ast.NodeSymbol.ARRAY, (ast.Node((ast.NodeSymbol.ARRAY,), (), ('_a0',), ()), ast.Node((ast.NodeSymbol.ARRAY,), (), ('m',), ())), None, None)})
+                      shape_name: ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, (1,)),
+                      array_name: ast.SymbolNode(ast.NodeSymbol.ARRAY, (ast.Node((ast.NodeSymbol.ARRAY,), (), (shape_name,), ()), ast.Node((ast.NodeSymbol.ARRAY,), (), ('m',), ())), None, None)})
 
-    testing.assert_context_equal(new_left_context, expected_left_context)
     testing.assert_context_equal(new_right_context, expected_right_context)
+    assert new_symbol_table == {**left_symbol_table, **expected_right_context.symbol_table}
 
 
 def test_postorder_replacement():
@@ -336,3 +328,143 @@ def test_preorder_replacement():
 
     testing.assert_context_equal(context, context_copy)
     testing.assert_context_equal(new_context, expected_context)
+
+
+def test_traversal_unchanged_subtrees():
+    tree = ast.Node((ast.NodeSymbol.PLUS,), None, (), (
+        ast.Node((ast.NodeSymbol.TRANSPOSE,), None, (), (
+            ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ()),)),
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('B',), ())))
+    context = ast.create_context(ast=tree)
+
+    def replacement_function(context):
+        if context.ast.attrib == ('B',):
+            return ast.replace_node_shape(context, (1,))
+        return context
+
+    new_context = ast.node_traversal(context, replacement_function, traversal='postorder')
+
+    assert new_context.ast is not tree
+    assert new_context.ast.child[0] is tree.child[0]
+    assert new_context.ast.child[1].shape == (1,)
+
+    new_context = ast.node_traversal(context, lambda context: context, traversal='postorder')
+    assert new_context.ast is tree
+
+
+def test_traversal_callback():
+    tree = ast.Node((ast.NodeSymbol.PLUS,), None, (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ()),
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('B',), ())))
+    context = ast.create_context(ast=tree)
+
+    def replacement_function(context):
+        if context.ast.attrib == ('B',):
+            return ast.replace_node_shape(context, (1,))
+        return context
+
+    replacements = []
+    ast.node_traversal(context, replacement_function, traversal='postorder',
+                       callback=lambda context, replacement_context: replacements.append((context.ast, replacement_context.ast)))
+    assert replacements == [
+        (ast.Node((ast.NodeSymbol.ARRAY,), None, ('B',), ()), ast.Node((ast.NodeSymbol.ARRAY,), (1,), ('B',), ())),
+    ]
+
+
+def test_rewrite_to_fixpoint_revisits_parent():
+    tree = ast.Node((ast.NodeSymbol.PLUS,), None, (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ()),
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('B',), ())))
+    context = ast.create_context(ast=tree)
+
+    def replacement_function(context):
+        if context.ast.attrib == ('B',):
+            return ast.replace_node_attributes(context, ('C',))
+        elif context.ast.symbol == (ast.NodeSymbol.PLUS,) and context.ast.child[1].attrib == ('C',):
+            return ast.create_context(ast=ast.Node((ast.NodeSymbol.ARRAY,), None, ('D',), ()), symbol_table=context.symbol_table)
+        return None
+
+    new_context, num_rewrites = ast.rewrite_to_fixpoint(context, replacement_function)
+    assert new_context.ast == ast.Node((ast.NodeSymbol.ARRAY,), None, ('D',), ())
+    assert num_rewrites == 2
+
+    with pytest.raises(ast.MOAReplacementError):
+        ast.rewrite_to_fixpoint(context, replacement_function, max_rewrites=1)
+
+
+def test_rewrite_to_fixpoint_skips_normalized():
+    # PLUS(PLUS(A0, A1), ...) chain rewritten bottom up to MINUS keeping children
+    context = testing.chain_context(100)
+
+    num_calls = 0
+
+    def replacement_function(context):
+        nonlocal num_calls
+        num_calls += 1
+        node = context.ast
+        if node.symbol == (ast.NodeSymbol.PLUS,) and node.child[0].symbol != (ast.NodeSymbol.PLUS,):
+            return ast.create_context(ast=node._replace(symbol=(ast.NodeSymbol.MINUS,)), symbol_table=context.symbol_table)
+        return None
+
+    new_context, num_rewrites = ast.rewrite_to_fixpoint(context, replacement_function)
+    assert new_context.ast.symbol == (ast.NodeSymbol.MINUS,)
+    assert num_rewrites == 99
+    # rewritten subtrees are not traversed again
+    assert num_calls < 4 * 199
+
+
+def test_add_symbol_persistent():
+    context = ast.create_context(symbol_table={'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3,), None, None)})
+    new_context = ast.add_symbol(context, 'B', ast.NodeSymbol.ARRAY, (4,), None, None)
+    newer_context = ast.add_symbol(new_context, 'C', ast.NodeSymbol.ARRAY, (5,), None, None)
+
+    assert context.symbol_table.keys() == {'A'}
+    assert new_context.symbol_table.keys() == {'A', 'B'}
+    assert newer_context.symbol_table.keys() == {'A', 'B', 'C'}
+    assert ast.generate_unique_array_name(newer_context) == '_a3'
+
+    with pytest.raises(ast.MOAException):
+        ast.add_symbol(newer_context, 'B', ast.NodeSymbol.ARRAY, (5,), None, None)
+
+
+def test_node_interning():
+    def _tree():
+        return ast.Node((ast.NodeSymbol.PLUS,), (3,), (), (
+            ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('A',), ()),
+            ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('B',), ())))
+
+    with ast.intern_scope() as scope:
+        assert _tree() is _tree()
+        assert _tree() != _tree()._replace(shape=(4,))
+        assert copy.deepcopy(_tree()) is _tree()
+        node_hash = hash(_tree())
+
+        # nodes with unhashable elements are not interned
+        node = ast.Node((ast.NodeSymbol.BLOCK,), (), (), ([],))
+        assert node == ast.Node((ast.NodeSymbol.BLOCK,), (), (), ([],))
+        assert node is not ast.Node((ast.NodeSymbol.BLOCK,), (), (), ([],))
+
+        with ast.intern_scope() as nested_scope:
+            assert nested_scope is scope
+        with ast.intern_scope(enabled=False):
+            assert _tree() is not _tree()
+
+    # nodes are released with the scope and hashed by structure
+    assert len(scope.nodes) > 0 and ast.current_intern_scope() is None
+    assert _tree() is not _tree()
+    assert hash(_tree()) == node_hash and _tree() == _tree()
+    assert not hasattr(_tree(), '__dict__')
+
+
+def test_node_interning_deep():
+    def _chain(num_terms):
+        return testing.chain_context(num_terms).ast
+
+    # equality and hashing do not walk the tree
+    with ast.intern_scope():
+        left_tree, right_tree = _chain(5000), _chain(5000)
+        assert left_tree is right_tree
+        assert {left_tree: 1}[right_tree] == 1
+
+    # hashing without a scope is not limited by the recursion limit
+    assert hash(_chain(5000)) == hash(left_tree)
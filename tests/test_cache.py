@@ -0,0 +1,148 @@
+import functools
+import os
+import subprocess
+import sys
+
+import pytest
+
+from moa import ast, cache, optimize
+
+
+def test_lru_cache_hits_misses():
+    lru_cache = cache.LRUCache(maxsize=2)
+    assert lru_cache.get('a') is None
+    lru_cache.set('a', 1)
+    assert lru_cache.get('a') == 1
+    assert lru_cache.info() == cache.CacheInfo(hits=1, misses=1, maxsize=2, currsize=1)
+
+
+def test_lru_cache_eviction():
+    lru_cache = cache.LRUCache(maxsize=2)
+    lru_cache.set('a', 1)
+    lru_cache.set('b', 2)
+    lru_cache.get('a')
+    lru_cache.set('c', 3)
+    assert 'a' in lru_cache
+    assert 'b' not in lru_cache
+    assert 'c' in lru_cache
+
+    lru_cache.maxsize = 1
+    assert len(lru_cache) == 1
+    assert 'c' in lru_cache
+
+
+def test_lru_cache_clear():
+    lru_cache = cache.LRUCache(maxsize=2)
+    lru_cache.set('a', 1)
+    lru_cache.get('a')
+    lru_cache.clear()
+    assert lru_cache.info() == cache.CacheInfo(hits=0, misses=0, maxsize=2, currsize=0)
+
+
+def test_context_key_symbol_table_order():
+    tree = ast.Node((ast.NodeSymbol.PLUS,), None, (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ()),
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('B',), ())))
+    left_context = ast.create_context(ast=tree, symbol_table={
+        'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3, 4), None, None),
+        'B': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3, 4), None, None),
+    })
+    right_context = ast.create_context(ast=tree, symbol_table={
+        'B': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3, 4), None, None),
+        'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3, 4), None, None),
+    })
+    assert cache.context_key(left_context) == cache.context_key(right_context)
+    assert hash(cache.context_key(left_context)) == hash(cache.context_key(right_context))
+
+
+def test_disk_cache_get_set(tmp_path):
+    disk_cache = cache.DiskCache(str(tmp_path))
+    assert disk_cache.get('a') is None
+    disk_cache.set('a', 'def f():\n    return 1')
+    assert disk_cache.get('a') == 'def f():\n    return 1'
+    assert disk_cache.info().hits == 1
+    assert disk_cache.info().misses == 1
+
+    # entries are shared between cache instances
+    assert cache.DiskCache(str(tmp_path)).get('a') == 'def f():\n    return 1'
+    assert not [path for path in tmp_path.iterdir() if path.suffix == '.tmp']
+
+
+_DIGEST_SCRIPT = """
+import functools
+from moa import ast, cache, optimize
+key = (ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('A',), ()), (functools.partial(optimize.tile_loops, tile_size=64), optimize.fuse_loops))
+print(cache.DiskCache({directory!r}).digest(key))
+"""
+
+
+def test_disk_cache_digest(tmp_path):
+    disk_cache = cache.DiskCache(str(tmp_path))
+    key = (ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('A',), ()), (functools.partial(optimize.tile_loops, tile_size=64), optimize.fuse_loops))
+
+    # partials of passes are named by function, arguments and keywords
+    digest = subprocess.run([sys.executable, '-c', _DIGEST_SCRIPT.format(directory=str(tmp_path))],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    assert disk_cache.digest(key) == digest
+    assert disk_cache.digest(key) != disk_cache.digest((key[0], (functools.partial(optimize.tile_loops, tile_size=32), optimize.fuse_loops)))
+    assert disk_cache.digest((1,)) != disk_cache.digest(1)
+
+    # deep asts are not limited by the recursion limit
+    node = ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('A',), ())
+    for _ in range(5000):
+        node = ast.Node((ast.NodeSymbol.TRANSPOSE,), (3,), (), (node,))
+    disk_cache.digest(node)
+
+    assert disk_cache.supports(key)
+    assert not disk_cache.supports((lambda context: context,))
+    with pytest.raises(cache.MOACacheError):
+        disk_cache.digest(functools.partial(lambda context: context))
+
+
+def test_disk_cache_eviction(tmp_path):
+    disk_cache = cache.DiskCache(str(tmp_path), maxsize=10)
+    disk_cache.set('a', '#' * 6)
+    os.utime(disk_cache.path('a'), (0, 0))
+    disk_cache.set('b', '#' * 6)
+    assert disk_cache.get('a') is None
+    assert disk_cache.get('b') == '#' * 6
+    assert disk_cache.info().currsize == 6
+
+    disk_cache.clear()
+    assert disk_cache.info().currsize == 0
+
+
+def test_disk_cache_load_module(tmp_path):
+    disk_cache = cache.DiskCache(str(tmp_path))
+    disk_cache.set('a', 'def f():\n    return g()')
+    module = disk_cache.load_module('a', namespace={'g': lambda: 1})
+    assert module.f() == 1
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason='requires posix file ownership')
+def test_disk_cache_permissions(tmp_path, monkeypatch):
+    disk_cache = cache.DiskCache(str(tmp_path / 'moa'))
+    assert os.stat(tmp_path / 'moa').st_mode & 0o777 == 0o700
+    disk_cache.set('a', 'def f():\n    return 1')
+
+    # entries writable by other users may have been planted
+    os.chmod(disk_cache.path('a'), 0o664)
+    with pytest.raises(cache.MOACacheError):
+        disk_cache.get('a')
+    with pytest.raises(cache.MOACacheError):
+        disk_cache.load_module('a')
+
+    shared_directory = tmp_path / 'shared'
+    shared_directory.mkdir()
+    os.chmod(shared_directory, 0o770)
+    with pytest.raises(cache.MOACacheError):
+        cache.DiskCache(str(shared_directory))
+
+    # entries owned by another user
+    os.chmod(disk_cache.path('a'), 0o600)
+    assert disk_cache.get('a') == 'def f():\n    return 1'
+    monkeypatch.setattr(os, 'getuid', lambda: os.stat(disk_cache.path('a')).st_uid + 1)
+    with pytest.raises(cache.MOACacheError):
+        disk_cache.get('a')
+    with pytest.raises(cache.MOACacheError):
+        cache.DiskCache(str(tmp_path / 'moa'))
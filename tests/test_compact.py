@@ -0,0 +1,109 @@
+import tracemalloc
+
+import pytest
+
+from moa import ast, compact, testing
+from moa.frontend import LazyArray
+from moa.shape import calculate_shapes
+from moa.dnf import reduce_to_dnf
+
+
+def _expressions():
+    return [
+        (LazyArray(name='A', shape=(3, 4)) + LazyArray(name='B', shape=(3, 4)))[0],
+        (LazyArray(name='A', shape=('n', 'm')) + LazyArray(name='B', shape=('k', 'l'))).transpose()[0],
+        LazyArray(name='A', shape=(3, 4)).outer('*', LazyArray(name='B', shape=(2,)))[1],
+        LazyArray(name='A', shape=(3, 4)).reduce('+'),
+        LazyArray(name='A', shape=(3, 4)).inner('+', '*', LazyArray(name='B', shape=(4, 5))),
+    ]
+
+
+def test_compact_round_trip():
+    tree = ast.Node((ast.NodeSymbol.PLUS,), None, (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ()),
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ())))
+    symbol_table = {'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (2, 3), None, None)}
+    context = ast.create_context(ast=tree, symbol_table=symbol_table)
+
+    compact_context = compact.from_context(context)
+    assert len(compact_context.ast) == 3
+    assert compact_context.root == 2
+    assert len(compact_context.ast.symbols) == 2
+    assert list(compact_context.ast.node_children(2)) == [0, 1]
+    assert list(compact_context.ast.parents(2)) == [2, 2, -1]
+
+    testing.assert_context_equal(compact.to_context(compact_context), context)
+
+
+@pytest.mark.parametrize('expression', _expressions())
+def test_compact_calculate_shapes(expression):
+    context = expression.context
+    expected_context = calculate_shapes(context)
+
+    compact_context = compact.calculate_shapes(compact.from_context(context))
+    testing.assert_context_equal(compact.to_context(compact_context), expected_context)
+
+
+@pytest.mark.parametrize('expression', _expressions())
+def test_compact_reduce_to_dnf(expression):
+    context = calculate_shapes(expression.context)
+    expected_context = reduce_to_dnf(context)
+
+    compact_context = compact.reduce_to_dnf(compact.from_context(context))
+    testing.assert_context_equal(compact.to_context(compact_context), expected_context)
+
+
+def test_compact_collect():
+    context = calculate_shapes((LazyArray(name='A', shape=(3, 4)) + LazyArray(name='B', shape=(3, 4))).context)
+    compact_context = compact.reduce_to_dnf(compact.from_context(context))
+
+    compact_ast, root = compact_context.ast.collect(compact_context.root)
+    assert len(compact_ast) < len(compact_context.ast)
+    assert root == len(compact_ast) - 1
+    testing.assert_ast_equal(compact_ast.decode(root), compact_context.ast.decode(compact_context.root))
+
+
+def test_compact_deep_expression():
+    context = testing.chain_context(5000)
+
+    compact_context = compact.reduce_to_dnf(compact.calculate_shapes(compact.from_context(context)))
+    expected_context = reduce_to_dnf(calculate_shapes(context))
+    testing.assert_context_equal(compact.to_context(compact_context), expected_context)
+
+
+def _peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_compact_memory():
+    context = testing.chain_context(1000)
+
+    with ast.intern_scope() as scope:
+        compact_context, compact_peak = _peak_memory(
+            lambda context: compact.reduce_to_dnf(compact.calculate_shapes(compact.from_context(context))), context)
+        # windows and rewritten nodes are not interned
+        assert not scope.nodes
+
+    expected_context, peak = _peak_memory(lambda context: reduce_to_dnf(calculate_shapes(context)), context)
+    assert compact_peak < peak / 2
+    testing.assert_context_equal(compact.to_context(compact_context), expected_context)
+
+
+def test_compact_reduce_to_dnf_rewrites_at_node():
+    # every transpose is reduced at the root index node. The former
+    # preorder traversal gave up after 100 rewrites of one node
+    expression = LazyArray(name='A', shape=(3, 4))
+    for i in range(150):
+        expression = expression.transpose()
+    context = calculate_shapes(expression.context)
+
+    compact_context = compact.reduce_to_dnf(compact.from_context(context))
+    testing.assert_context_equal(compact.to_context(compact_context), reduce_to_dnf(context))
+
+    with pytest.raises(ast.MOAReplacementError):
+        compact.reduce_to_dnf(compact.from_context(context), max_rewrites=100)
@@ -1,11 +1,18 @@
 """high level tests
 
 """
+import gc
+import weakref
+
 import pytest
 
 from moa.frontend import LazyArray
-from moa.compiler import compiler
+from moa.compiler import compiler, compiler_cache, compiler_cache_key, compile_function, get_disk_cache
+from moa.shape import calculate_shapes
+from moa import testing
+from moa.stats import CompileStats
 from moa.array import Array
+from moa.backend.python import python_function_source
 
 
 def test_lenore_example_1():
@@ -38,3 +45,159 @@ def test_lenore_example_1_symbols():
     C = local_dict['f'](A=A, B=B, i=i)
     assert C.shape == (2,)
     assert C.value == [8, 14]
+
+
+def test_compiler_cache():
+    compiler_cache.clear()
+
+    _A = LazyArray(name='A', shape=(2, 3))
+    _B = LazyArray(name='B', shape=(2, 3))
+    context = (_A + _B).context
+
+    python_source = compiler(context)
+    assert compiler_cache.info().misses == 1
+    assert compiler(context) == python_source
+    assert compiler_cache.info().hits == 1
+
+    # compiler options are part of the cache key
+    compiler(context, include_conditions=False)
+    assert compiler_cache.info().misses == 2
+
+    # uncached compile produces identical source
+    assert compiler(context, use_cache=False) == python_source
+    assert compiler_cache.info().currsize == 2
+
+
+def test_compiler_disk_cache(tmp_path):
+    compiler_cache.clear()
+
+    _A = LazyArray(name='A', shape=(2, 3))
+    _B = LazyArray(name='B', shape=(2, 3))
+    context = (_A + _B).context
+
+    python_source = compiler(context, cache_dir=str(tmp_path))
+    disk_cache = get_disk_cache(str(tmp_path))
+    assert disk_cache.info().currsize > 0
+
+    # simulate a fresh process with an empty in memory cache
+    compiler_cache.clear()
+    assert compiler(context, cache_dir=str(tmp_path)) == python_source
+
+    module = disk_cache.load_module(compiler_cache_key(context), namespace={'Array': Array})
+    C = module.f(Array((2, 3), (1, 2, 3, 4, 5, 6)), Array((2, 3), (7, 8, 9, 10, 11, 12)))
+    assert C.value == [8, 10, 12, 14, 16, 18]
+
+    # passes without a stable representation are only cached in memory
+    currsize = disk_cache.info().currsize
+    compiler(context, cache_dir=str(tmp_path), optimize=[lambda context: context])
+    assert disk_cache.info().currsize == currsize
+
+
+def test_compiler_cache_key():
+    context = (LazyArray(name='A', shape=(2, 3)) + LazyArray(name='B', shape=(2, 3))).context
+    assert compiler_cache_key(context) == compiler_cache_key(context, backend='python', optimize=True)
+    assert compiler_cache_key(context, optimize=[]) == compiler_cache_key(context, optimize=())
+    assert compiler_cache_key(context, specialize=False) != compiler_cache_key(context)
+    hash(compiler_cache_key(context, optimize=[], specialize=True))
+
+
+def test_compiler_deep_expression():
+    # left deep chain A0 + A1 + ... deeper than python recursion limit
+    num_terms = 1500
+    context = testing.chain_context(num_terms, shape=(2, 3))
+
+    shape_context = calculate_shapes(context)
+    testing.assert_context_equal(shape_context, calculate_shapes(context))
+
+    python_source = compiler(context, use_cache=False)
+    assert f'A{num_terms - 1}[' in python_source
+
+
+def test_compiler_stats():
+    compiler_cache.clear()
+
+    _A = LazyArray(name='A', shape=(2, 3))
+    _B = LazyArray(name='B', shape=(2, 3))
+    expression = (_A + _B)
+
+    stats = CompileStats()
+    python_source = expression.compile(stats=stats)
+    assert list(stats.stages) == ['shape', 'dnf', 'onf', 'optimize', 'codegen']
+    assert stats.cache is None
+    assert stats.wall_time > 0
+
+    assert stats['shape'].num_nodes == 3
+    assert stats['shape'].symbol_table_size == 2
+    assert stats['shape'].rule_firings == {'ARRAY()': 2, 'PLUS(ARRAY,ARRAY)': 1}
+    assert stats['dnf'].rule_firings == {'PSI(ARRAY,PLUS)': 1}
+    assert stats['dnf'].num_rewrites == 1
+    assert stats['codegen'].num_nodes is None
+    assert 'dnf' in stats.summary()
+
+    stats = CompileStats()
+    assert expression.compile(stats=stats) == python_source
+    assert stats.cache == 'memory'
+    assert not stats.stages
+
+
+def test_compile_function():
+    expression = LazyArray(name='A', shape=(2, 3)) + LazyArray(name='B', shape=(2, 3))
+    function = compile_function(expression.context)
+    assert compile_function(expression.context) is function
+    assert compile_function(expression.context, optimize=False) is not function
+
+    A = Array((2, 3), (1, 2, 3, 4, 5, 6))
+    B = Array((2, 3), (7, 8, 9, 10, 11, 12))
+    C = function(A, B)
+    assert C.shape == (2, 3)
+    assert C.value == [8, 10, 12, 14, 16, 18]
+
+
+def test_compile_function_specialize():
+    expression = LazyArray(name='A', shape=('n', 'm')).reduce('+')
+    function = compile_function(expression.context, specialize=True)
+    assert function.arguments == ('A',)
+
+    A = Array((2, 3), (1, 2, 3, 4, 5, 6))
+    assert function(A).value == [5, 7, 9]
+    assert function(Array((1, 2), (1, 2))).value == [1, 2]
+    assert len(function.variants) == 2
+
+    # variant for known shapes is fully unrolled
+    variant = function.variants.get(((A.shape, None),))
+    assert 'for ' not in python_function_source(variant)
+    assert function(A).value == [5, 7, 9]
+    assert len(function.variants) == 2
+
+    function.variants.maxsize = 1
+    assert len(function.variants) == 1
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+def test_compile_function_specialize_release(backend):
+    numpy = pytest.importorskip('numpy')
+    expression = LazyArray(name='A', shape=('n', 'm')).reduce('+')
+    function = compile_function(expression.context, backend=backend, specialize=True)
+    function.variants.maxsize = 1
+
+    function(numpy.ones((2, 3)))
+    variant = weakref.ref(function.variants.get((((2, 3), numpy.dtype('float64')),)))
+    num_sources = len(compiler_cache)
+    function(numpy.ones((3, 2)))
+
+    # variants are not kept alive by the global caches
+    gc.collect()
+    assert variant() is None
+    assert len(compiler_cache) == num_sources
+
+
+def test_compiler_python_backend_passes():
+    # interpreted loops are not interchanged, tiled or unrolled and jammed
+    expression = LazyArray(name='A', shape=('n', 'm')).inner('+', '*', LazyArray(name='B', shape=('m', 'k')))
+    optimized_source = compiler(expression.context, use_cache=False)
+    source = compiler(expression.context, use_cache=False, optimize=False)
+    assert optimized_source.count('for ') == source.count('for ')
+    assert optimized_source.count('[(') <= source.count('[(')
+    assert len(optimized_source.splitlines()) <= len(source.splitlines())
+
+    assert compiler(expression.context, use_cache=False, use_numba=True).count('for ') > source.count('for ')
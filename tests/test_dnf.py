@@ -3,6 +3,7 @@ import copy
 import pytest
 
 from moa import ast, dnf, testing
+from moa.shape import calculate_shapes
 
 
 def test_add_indexing_node():
@@ -60,6 +61,39 @@ def test_not_matches_rule_nested():
     assert not dnf.matches_rule(rule, context)
 
 
+def test_select_reduction_rule():
+    tree = ast.Node((ast.NodeSymbol.PSI,), (), (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), (2,), ('_a1',), ()),
+        ast.Node((ast.NodeSymbol.TRANSPOSE,), (3, 2), (), (
+            ast.Node((ast.NodeSymbol.ARRAY,), (2, 3), ('A',), ()),))))
+    context = ast.create_context(ast=tree)
+    assert dnf.select_reduction_rule(context) is dnf._reduce_psi_transpose
+
+    context = ast.select_node(context, (1,))
+    assert dnf.select_reduction_rule(context) is None
+
+
+def test_register_reduction_rule(monkeypatch):
+    monkeypatch.setattr(dnf, '_REDUCTION_RULES', {key: list(rules) for key, rules in dnf._REDUCTION_RULES.items()})
+
+    def _reduce_psi_cat(context):
+        return context
+
+    rule = ((ast.NodeSymbol.PSI,), (None, ((ast.NodeSymbol.CAT,),)))
+    dnf.register_reduction_rule(rule, _reduce_psi_cat)
+
+    tree = ast.Node((ast.NodeSymbol.PSI,), (), (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), (1,), ('_a1',), ()),
+        ast.Node((ast.NodeSymbol.CAT,), (6,), (), (
+            ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('A',), ()),
+            ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('B',), ())))))
+    context = ast.create_context(ast=tree)
+    assert dnf.select_reduction_rule(context) is _reduce_psi_cat
+
+    with pytest.raises(dnf.MOAReductionError):
+        dnf.register_reduction_rule(rule, _reduce_psi_cat)
+
+
 def test_reduce_psi_psi():
     symbol_table = {
         '_i0': ast.SymbolNode(ast.NodeSymbol.INDEX, (), None, (0, 3, 1)),
@@ -363,3 +397,38 @@ def test_reduce_psi_plus_minus_times_divide_scalar(operation):
 #     assert symbol_table_copy == symbol_table
 #     assert new_tree == expected_tree
 #     assert new_symbol_table == symbol_table
+
+
+def test_reduce_to_dnf_max_rewrites():
+    tree = ast.Node((ast.NodeSymbol.PLUS,), (2, 3), (), (
+        ast.Node((ast.NodeSymbol.PLUS,), (2, 3), (), (
+            ast.Node((ast.NodeSymbol.ARRAY,), (2, 3), ('A',), ()),
+            ast.Node((ast.NodeSymbol.ARRAY,), (2, 3), ('B',), ()))),
+        ast.Node((ast.NodeSymbol.ARRAY,), (2, 3), ('C',), ())))
+    symbol_table = {name: ast.SymbolNode(ast.NodeSymbol.ARRAY, (2, 3), None, None) for name in 'ABC'}
+    context = ast.create_context(ast=tree, symbol_table=symbol_table)
+
+    rewrites = []
+    dnf.reduce_to_dnf(context, callback=lambda context, replacement_context: rewrites.append(context), max_rewrites=2)
+    assert len(rewrites) == 2
+
+    with pytest.raises(ast.MOAReplacementError):
+        dnf.reduce_to_dnf(context, max_rewrites=1)
+
+
+def test_rewrite_to_dnf_num_rewrites():
+    tree = ast.Node((ast.NodeSymbol.PLUS,), (2, 3), (), (
+        ast.Node((ast.NodeSymbol.PLUS,), (2, 3), (), (
+            ast.Node((ast.NodeSymbol.ARRAY,), (2, 3), ('A',), ()),
+            ast.Node((ast.NodeSymbol.ARRAY,), (2, 3), ('B',), ()))),
+        ast.Node((ast.NodeSymbol.ARRAY,), (2, 3), ('C',), ())))
+    symbol_table = {name: ast.SymbolNode(ast.NodeSymbol.ARRAY, (2, 3), None, None) for name in 'ABC'}
+    context = ast.create_context(ast=tree, symbol_table=symbol_table)
+
+    new_context, num_rewrites = dnf.rewrite_to_dnf(context)
+    assert num_rewrites == 2
+    testing.assert_context_equal(new_context, dnf.reduce_to_dnf(context))
+
+    # every (+) of a left deep chain is rewritten once
+    new_context, num_rewrites = dnf.rewrite_to_dnf(calculate_shapes(testing.chain_context(100)))
+    assert num_rewrites == 99
@@ -0,0 +1,354 @@
+import functools
+
+from moa import ast, optimize, testing
+from moa.frontend import LazyArray
+from moa.array import Array
+from moa.backend import generate_python_source
+
+
+def test_common_subexpression_elimination():
+    psi_a = ast.Node((ast.NodeSymbol.PSI,), (), (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), (1,), ('_a1',), ()),
+        ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('A',), ())))
+    psi_b = ast.Node((ast.NodeSymbol.PSI,), (), (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), (1,), ('_a1',), ()),
+        ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('B',), ())))
+    plus = ast.Node((ast.NodeSymbol.PLUS,), (), (), (psi_a, psi_b))
+    result = ast.Node((ast.NodeSymbol.ARRAY,), (), ('C',), ())
+    tree = ast.Node((ast.NodeSymbol.BLOCK,), (), (), (
+        ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+            result, ast.Node((ast.NodeSymbol.TIMES,), (), (), (plus, plus)))),))
+    symbol_table = {
+        '_a1': ast.SymbolNode(ast.NodeSymbol.ARRAY, (1,), None, (0,)),
+        'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3,), None, None),
+        'B': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3,), None, None),
+        'C': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
+    }
+
+    temporary = ast.Node((ast.NodeSymbol.ARRAY,), (), ('_a4',), ())
+    expected_tree = ast.Node((ast.NodeSymbol.BLOCK,), (), (), (
+        ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (temporary, plus)),
+        ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+            result, ast.Node((ast.NodeSymbol.TIMES,), (), (), (temporary, temporary)))),))
+    expected_symbol_table = {**symbol_table, '_a4': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None)}
+
+    testing.assert_transformation(tree, symbol_table, expected_tree, expected_symbol_table, optimize.common_subexpression_elimination)
+
+
+def test_common_subexpression_elimination_unchanged():
+    tree = ast.Node((ast.NodeSymbol.BLOCK,), (), (), (
+        ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+            ast.Node((ast.NodeSymbol.ARRAY,), (), ('C',), ()),
+            ast.Node((ast.NodeSymbol.PLUS,), (), (), (
+                ast.Node((ast.NodeSymbol.ARRAY,), (), ('A',), ()),
+                ast.Node((ast.NodeSymbol.ARRAY,), (), ('A',), ()))))),))
+    context = ast.create_context(ast=tree, symbol_table={})
+    assert optimize.common_subexpression_elimination(context).ast is tree
+
+
+def test_common_subexpression_elimination_compile():
+    _A = LazyArray(name='A', shape=(3, 2))
+    _B = LazyArray(name='B', shape=(3, 2))
+    expression = (_A + _B) * (LazyArray(name='A', shape=(3, 2)) + LazyArray(name='B', shape=(3, 2)))
+
+    python_source = expression.compile(use_cache=False)
+    assert python_source.count(' + ') == 1
+
+    local_dict = {}
+    exec(python_source, globals(), local_dict)
+
+    A = Array(shape=(3, 2), value=(1, 2, 3, 4, 5, 6))
+    B = Array(shape=(3, 2), value=(7, 8, 9, 10, 11, 12))
+    C = local_dict['f'](A=A, B=B)
+    assert C.value == [64, 100, 144, 196, 256, 324]
+
+
+def _roadmap_expression():
+    # (B + +red A) + *red (A + A)
+    _A = LazyArray(name='A', shape=(3, 4))
+    _B = LazyArray(name='B', shape=(4,))
+    return (_B + LazyArray(name='A', shape=(3, 4)).reduce('+')) + (_A + LazyArray(name='A', shape=(3, 4))).reduce('*')
+
+
+def _count_loops(context):
+    num_loops = 0
+    stack = [context.ast]
+    while stack:
+        node = stack.pop()
+        num_loops += node.symbol == (ast.NodeSymbol.LOOP,)
+        stack.extend(child_node for child_node in node.child if isinstance(child_node, ast.Node))
+    return num_loops
+
+
+def test_fuse_loops():
+    context = _roadmap_expression()._onf()
+    assert _count_loops(context) == 3
+
+    fused_context = optimize.fuse_loops(context)
+    assert _count_loops(fused_context) == 2
+
+    local_dict = {}
+    exec(_roadmap_expression().compile(use_cache=False), globals(), local_dict)
+    unoptimized_local_dict = {}
+    exec(_roadmap_expression().compile(use_cache=False, optimize=False), globals(), unoptimized_local_dict)
+
+    A = Array(shape=(3, 4), value=tuple(range(12)))
+    B = Array(shape=(4,), value=(1, 2, 3, 4))
+    assert local_dict['f'](A=A, B=B).value == unoptimized_local_dict['f'](A=A, B=B).value == [13, 377, 981, 1873]
+
+
+def test_fuse_loops_dependent():
+    loop_a = ast.Node((ast.NodeSymbol.LOOP,), (), ('_i1',), (
+        ast.Node((ast.NodeSymbol.BLOCK,), (), (), (
+            ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+                ast.Node((ast.NodeSymbol.ARRAY,), (), ('a',), ()),
+                ast.Node((ast.NodeSymbol.ARRAY,), (), ('_i1',), ()))),)),))
+    loop_b = ast.Node((ast.NodeSymbol.LOOP,), (), ('_i2',), (
+        ast.Node((ast.NodeSymbol.BLOCK,), (), (), (
+            ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+                ast.Node((ast.NodeSymbol.ARRAY,), (), ('b',), ()),
+                ast.Node((ast.NodeSymbol.ARRAY,), (), ('a',), ()))),)),))
+    tree = ast.Node((ast.NodeSymbol.BLOCK,), (), (), (loop_a, loop_b))
+    symbol_table = {
+        '_i1': ast.SymbolNode(ast.NodeSymbol.INDEX, (), None, (0, 3, 1)),
+        '_i2': ast.SymbolNode(ast.NodeSymbol.INDEX, (), None, (0, 3, 1)),
+        'a': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
+        'b': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
+    }
+    context = ast.create_context(ast=tree, symbol_table=symbol_table)
+
+    # second loop reads "a" written by first loop
+    assert optimize.fuse_loops(context).ast is tree
+
+
+def _loop_order(context):
+    """Index of each loop in a preorder traversal"""
+    indicies = []
+    stack = [context.ast]
+    while stack:
+        node = stack.pop()
+        if node.symbol == (ast.NodeSymbol.LOOP,):
+            indicies.append(node.attrib[0])
+        stack.extend(reversed([child_node for child_node in node.child if isinstance(child_node, ast.Node)]))
+    return indicies
+
+
+def test_interchange_loops_addition():
+    context = (LazyArray(name='A', shape=(2, 3)) + LazyArray(name='B', shape=(2, 3)))._onf()
+    assert _loop_order(context) == ['_i3', '_i2']
+
+    # row major: loop over last dimension of A[(_i2, _i3)] innermost
+    assert _loop_order(optimize.interchange_loops(context)) == ['_i2', '_i3']
+    assert _loop_order(optimize.interchange_loops(context, layout='F')) == ['_i3', '_i2']
+
+
+def test_interchange_loops_inner_product():
+    def _expression():
+        return LazyArray(name='A', shape=(2, 3)).inner('+', '*', LazyArray(name='B', shape=(3, 4)))
+
+    context = optimize.interchange_loops(_expression()._onf())
+    # initialization of output followed by i, k, j accumulation
+    assert _loop_order(context) == ['_i2', '_i3', '_i2', '_i5', '_i3']
+
+    local_dict = {}
+    exec(_expression().compile(use_cache=False), globals(), local_dict)
+
+    A = Array(shape=(2, 3), value=tuple(range(6)))
+    B = Array(shape=(3, 4), value=tuple(range(12)))
+    assert local_dict['f'](A=A, B=B).value == [20, 23, 26, 29, 56, 68, 80, 92]
+
+
+def test_interchange_loops_unchanged():
+    # reduction over last dimension already has unit stride
+    context = LazyArray(name='A', shape=(2, 3)).transpose().reduce('+')._onf()
+    assert optimize.interchange_loops(context).ast is context.ast
+
+
+def _inner_product_expression():
+    return LazyArray(name='A', shape=('n', 'm')).inner('+', '*', LazyArray(name='B', shape=('m', 'k')))
+
+
+def _inner_product(A, B):
+    n, m = A.shape
+    k = B.shape[1]
+    return [sum(A[i, l] * B[l, j] for l in range(m)) for i in range(n) for j in range(k)]
+
+
+def test_tile_loops():
+    context = optimize.tile_loops(optimize.interchange_loops(_inner_product_expression()._onf()), tile_size=2)
+    # loop over tiles of reduction moved outside of loops over "i" and "j"
+    assert _loop_order(context)[2:] == ['_i21', '_i5', '_i23', '_i6']
+    assert context.symbol_table['_i21'].value[2] == 2
+
+
+def test_unroll_and_jam():
+    context = optimize.unroll_and_jam(optimize.interchange_loops(_inner_product_expression()._onf()), unroll=3)
+    assert _loop_order(context)[2:] == ['_i21', '_i8', '_i6', '_i34', '_i8', '_i6']
+    assert _count_loops(optimize.unroll_and_jam(_roadmap_expression()._onf())) == 3
+
+
+def test_tile_loops_unroll_and_jam_compile():
+    passes = (optimize.interchange_loops,
+              functools.partial(optimize.tile_loops, tile_size=2),
+              functools.partial(optimize.unroll_and_jam, unroll=3))
+    local_dict = {}
+    exec(_inner_product_expression().compile(use_cache=False, optimize=passes), globals(), local_dict)
+
+    # shapes not divisible by tile size or unroll
+    for n, m, k in [(1, 1, 1), (4, 5, 2), (7, 3, 6)]:
+        A = Array(shape=(n, m), value=tuple(range(1, n * m + 1)))
+        B = Array(shape=(m, k), value=tuple(range(2, m * k + 2)))
+        assert local_dict['f'](A=A, B=B).value == _inner_product(A, B)
+
+
+def test_hoist_invariants():
+    def _expression():
+        return LazyArray(name='A', shape=('n',)).outer('*', LazyArray(name='B', shape=('m',)))
+
+    context = optimize.hoist_invariants(_expression()._onf())
+    python_source = generate_python_source(context, materialize_scalars=True)
+    # read of B[(j,)] before loop over i
+    assert python_source.index('= B[') < python_source.index('for _i4')
+
+    local_dict = {}
+    exec(_expression().compile(use_cache=False), globals(), local_dict)
+
+    A = Array(shape=(5,), value=(1, 2, 3, 4, 5))
+    B = Array(shape=(2,), value=(6, 7))
+    assert local_dict['f'](A=A, B=B).value == [6, 7, 12, 14, 18, 21, 24, 28, 30, 35]
+
+
+def test_hoist_invariants_scalar_assignment():
+    loop = ast.Node((ast.NodeSymbol.LOOP,), (), ('_i1',), (
+        ast.Node((ast.NodeSymbol.BLOCK,), (), (), (
+            ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+                ast.Node((ast.NodeSymbol.ARRAY,), (), ('a',), ()),
+                ast.Node((ast.NodeSymbol.ARRAY,), (), ('c',), ()))),
+            ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+                ast.Node((ast.NodeSymbol.ARRAY,), (), ('b',), ()),
+                ast.Node((ast.NodeSymbol.PLUS,), (), (), (
+                    ast.Node((ast.NodeSymbol.ARRAY,), (), ('b',), ()),
+                    ast.Node((ast.NodeSymbol.ARRAY,), (), ('a',), ()))))),)),))
+    tree = ast.Node((ast.NodeSymbol.BLOCK,), (), (), (loop,))
+    symbol_table = {
+        '_i1': ast.SymbolNode(ast.NodeSymbol.INDEX, (), None, (0, 3, 1)),
+        'a': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
+        'b': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
+        'c': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
+    }
+
+    # "a = c" is invariant while accumulation "b = b + a" is not
+    expected_tree = ast.Node((ast.NodeSymbol.BLOCK,), (), (), (
+        loop.child[0].child[0],
+        ast.Node((ast.NodeSymbol.LOOP,), (), ('_i1',), (
+            ast.Node((ast.NodeSymbol.BLOCK,), (), (), (loop.child[0].child[1],)),))))
+    testing.assert_transformation(tree, symbol_table, expected_tree, symbol_table, optimize.hoist_invariants)
+
+
+def _parallel_loops(context):
+    indicies = []
+    stack = [context.ast]
+    while stack:
+        node = stack.pop()
+        if node.symbol == (ast.NodeSymbol.LOOP, ast.NodeSymbol.PARALLEL):
+            indicies.append(node.attrib[0])
+        stack.extend(reversed([child_node for child_node in node.child if isinstance(child_node, ast.Node)]))
+    return indicies
+
+
+def _evaluate(context, **arrays):
+    local_dict = {}
+    exec(generate_python_source(context, materialize_scalars=True), globals(), local_dict)
+    return local_dict['f'](**arrays).value
+
+
+def test_parallelize_loops_addition():
+    context = optimize.parallelize_loops(optimize.optimize(
+        (LazyArray(name='A', shape=(2, 3)) + LazyArray(name='B', shape=(2, 3)))._onf()))
+    # outermost loop only
+    assert _parallel_loops(context) == ['_i2']
+    assert _loop_order(context) == ['_i3']
+    assert 'prange(' in generate_python_source(context)
+
+    A = Array(shape=(2, 3), value=tuple(range(6)))
+    B = Array(shape=(2, 3), value=tuple(range(6, 12)))
+    assert _evaluate(context, A=A, B=B) == [6, 8, 10, 12, 14, 16]
+
+
+def test_parallelize_loops_reduction():
+    for operation, expected in [('+', [9, 12]), ('-', [-9, -12]), ('*', [15, 48])]:
+        context = optimize.optimize(LazyArray(name='A', shape=('n', 'm')).reduce(operation)._onf())
+        context = optimize.parallelize_loops(context, num_partials=2)
+        # accumulation over rows is distributed over two partial accumulators
+        assert [context.symbol_table[index].value for index in _parallel_loops(context)][-1] == (0, 2, 1)
+
+        A = Array(shape=(3, 2), value=(1, 2, 3, 4, 5, 6))
+        assert _evaluate(context, A=A) == expected
+
+
+def test_parallelize_loops_unroll_and_jam():
+    passes = (optimize.interchange_loops,
+              functools.partial(optimize.tile_loops, tile_size=2),
+              functools.partial(optimize.unroll_and_jam, unroll=3),
+              optimize.hoist_invariants)
+    context = optimize.optimize(_inner_product_expression()._onf(), passes=passes)
+    context = optimize.parallelize_loops(context)
+    # rows of output within a tile of the reduction are independent
+    parallel_loops = _parallel_loops(context)
+    assert len(parallel_loops) == 2
+    assert context.symbol_table[parallel_loops[1]].value[2] == 3
+
+    for n, m, k in [(1, 1, 1), (4, 5, 2), (7, 3, 6)]:
+        A = Array(shape=(n, m), value=tuple(range(1, n * m + 1)))
+        B = Array(shape=(m, k), value=tuple(range(2, m * k + 2)))
+        assert _evaluate(context, A=A, B=B) == _inner_product(A, B)
+
+
+def test_parallelize_loops_unchanged():
+    # "b" is read by a statement other than its accumulation
+    index_node = ast.Node((ast.NodeSymbol.ARRAY,), (), ('_i1',), ())
+    b_node = ast.Node((ast.NodeSymbol.ARRAY,), (), ('b',), ())
+    loop = ast.Node((ast.NodeSymbol.LOOP,), (), ('_i1',), (
+        ast.Node((ast.NodeSymbol.BLOCK,), (), (), (
+            ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+                b_node, ast.Node((ast.NodeSymbol.PLUS,), (), (), (b_node, index_node)))),
+            ast.Node((ast.NodeSymbol.ASSIGN,), (), (), (
+                ast.Node((ast.NodeSymbol.PSI,), (), (), (
+                    ast.Node((ast.NodeSymbol.ARRAY,), (1,), ('_a2',), ()),
+                    ast.Node((ast.NodeSymbol.ARRAY,), (3,), ('c',), ()))),
+                b_node)))),))
+    tree = ast.Node((ast.NodeSymbol.FUNCTION,), (), ((), 'c'), (ast.Node((ast.NodeSymbol.BLOCK,), (), (), (loop,)),))
+    symbol_table = {
+        '_i1': ast.SymbolNode(ast.NodeSymbol.INDEX, (), None, (0, 3, 1)),
+        '_a2': ast.SymbolNode(ast.NodeSymbol.ARRAY, (1,), None, (index_node,)),
+        'b': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
+        'c': ast.SymbolNode(ast.NodeSymbol.ARRAY, (3,), None, None),
+    }
+    testing.assert_transformation(tree, symbol_table, tree, symbol_table, optimize.parallelize_loops)
+
+
+def test_unroll_loops():
+    context = optimize.unroll_loops(LazyArray(name='A', shape=(2, 3)).reduce('+')._onf())
+    assert _count_loops(context) == 0
+    assert _evaluate(context, A=Array(shape=(2, 3), value=tuple(range(6)))) == [3, 5, 7]
+
+    # loops exceeding max_statements and loops with symbolic bounds are kept
+    assert _count_loops(optimize.unroll_loops(LazyArray(name='A', shape=(2, 3)).reduce('+')._onf(), max_statements=4)) == 1
+    assert _count_loops(optimize.unroll_loops(LazyArray(name='A', shape=('n', 3)).reduce('+')._onf())) == 2
+
+
+def test_substitute_index():
+    index = ast.Node((ast.NodeSymbol.ARRAY,), (), ('_i1',), ())
+    node = ast.Node((ast.NodeSymbol.PSI,), (), (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), (2,), ('_a1',), ()),
+        ast.Node((ast.NodeSymbol.PLUS,), (), (), (index, index))))
+    symbol_table = {
+        '_i1': ast.SymbolNode(ast.NodeSymbol.INDEX, (), None, (0, 3, 1)),
+        '_a1': ast.SymbolNode(ast.NodeSymbol.ARRAY, (2,), None, (index, 1)),
+    }
+    context, node = optimize.substitute_index(ast.create_context(symbol_table=symbol_table), node, '_i1', 2)
+
+    array_name, value_name = node.child[0].attrib[0], node.child[1].child[0].attrib[0]
+    assert node.child[1].child[1].attrib[0] == value_name
+    assert context.symbol_table[array_name].value == (2, 1)
+    assert context.symbol_table[value_name] == ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, (2,))
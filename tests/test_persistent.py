@@ -0,0 +1,69 @@
+import copy
+import pickle
+
+import pytest
+
+from moa.persistent import PersistentMapping
+
+
+class CollidingKey:
+    def __init__(self, name):
+        self.name = name
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.name == other.name
+
+
+def test_persistent_mapping_set():
+    mapping = PersistentMapping()
+    new_mapping = mapping.set('a', 1)
+    assert len(mapping) == 0
+    assert 'a' not in mapping
+    assert new_mapping['a'] == 1
+    assert new_mapping == {'a': 1}
+
+    replaced_mapping = new_mapping.set('a', 2)
+    assert new_mapping['a'] == 1
+    assert replaced_mapping['a'] == 2
+    assert len(replaced_mapping) == 1
+
+    with pytest.raises(KeyError):
+        mapping['a']
+
+
+def test_persistent_mapping_many_keys():
+    keys = [f'_a{i}' for i in range(5000)]
+    mapping = PersistentMapping()
+    for i, key in enumerate(keys):
+        mapping = mapping.set(key, i)
+
+    assert len(mapping) == len(keys)
+    assert list(mapping) == keys
+    assert all(mapping[key] == i for i, key in enumerate(keys))
+    assert mapping == dict(zip(keys, range(len(keys))))
+
+
+def test_persistent_mapping_insertion_order():
+    mapping = PersistentMapping({'b': 1, 'a': 2}).set('c', 3).set('b', 4)
+    assert list(mapping.items()) == [('b', 4), ('a', 2), ('c', 3)]
+
+
+def test_persistent_mapping_hash_collisions():
+    mapping = PersistentMapping()
+    for name in 'abc':
+        mapping = mapping.set(CollidingKey(name), name)
+    mapping = mapping.set(CollidingKey('b'), 'd')
+
+    assert len(mapping) == 3
+    assert [mapping[CollidingKey(name)] for name in 'abc'] == ['a', 'd', 'c']
+    assert CollidingKey('e') not in mapping
+
+
+def test_persistent_mapping_copy():
+    mapping = PersistentMapping({'a': (1, 2), 'b': (3,)})
+    assert copy.deepcopy(mapping) == mapping
+    assert pickle.loads(pickle.dumps(mapping)) == mapping
+    assert list(copy.deepcopy(mapping)) == ['a', 'b']
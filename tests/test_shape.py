@@ -301,3 +301,47 @@ def test_shape_unit_plus_symbolic(left_shape, right_shape):
     print(new_context.symbol_table)
     testing.assert_context_equal(context, context_copy)
     testing.assert_context_equal(expected_context, exclude_condition_node)
+
+
+def test_register_shape_function(monkeypatch):
+    monkeypatch.setattr(shape, '_SHAPE_FUNCTIONS', dict(shape._SHAPE_FUNCTIONS))
+
+    def _shape_rav(context):
+        total = 1
+        for element in ast.select_node_shape(context, (0,)):
+            total *= element
+        return ast.replace_node_shape(context, (total,))
+
+    shape.register_shape_function((ast.NodeSymbol.RAV,), _shape_rav)
+
+    symbol_table = {'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (2, 3), None, None)}
+    tree = ast.Node((ast.NodeSymbol.RAV,), None, (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ()),))
+    expected_tree = ast.Node((ast.NodeSymbol.RAV,), (6,), (), (
+        ast.Node((ast.NodeSymbol.ARRAY,), (2, 3), ('A',), ()),))
+
+    testing.assert_transformation(tree, symbol_table, expected_tree, symbol_table, shape.calculate_shapes)
+
+    with pytest.raises(shape.MOAShapeError):
+        shape.register_shape_function((ast.NodeSymbol.RAV,), _shape_rav)
+
+
+def test_specialize_shapes():
+    n = ast.Node((ast.NodeSymbol.ARRAY,), (), ('n',), ())
+    m = ast.Node((ast.NodeSymbol.ARRAY,), (), ('m',), ())
+    symbol_table = {
+        'A': ast.SymbolNode(ast.NodeSymbol.ARRAY, (n, m), None, None),
+        'B': ast.SymbolNode(ast.NodeSymbol.ARRAY, (m,), None, None),
+        'n': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
+        'm': ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, None),
+    }
+    context = ast.create_context(ast=ast.Node((ast.NodeSymbol.ARRAY,), None, ('A',), ()), symbol_table=symbol_table)
+
+    specialized_context = shape.specialize_shapes(context, {'A': (2, 3), 'B': (3,)})
+    assert specialized_context.symbol_table['A'] == ast.SymbolNode(ast.NodeSymbol.ARRAY, (2, 3), None, None)
+    assert specialized_context.symbol_table['B'] == ast.SymbolNode(ast.NodeSymbol.ARRAY, (3,), None, None)
+    assert specialized_context.symbol_table['n'] == ast.SymbolNode(ast.NodeSymbol.ARRAY, (), None, (2,))
+
+    # inconsistent "m" and invalid dimension
+    assert shape.specialize_shapes(context, {'A': (2, 3), 'B': (4,)}) is None
+    assert shape.specialize_shapes(context, {'A': (2,)}) is None